@@ -46,6 +46,8 @@ class BaseConfig():
     SCALES : list of floats, Optional (Default: None)
         expected variance of joint angles and velocities. Expected value for
         each joint. Only used for adaptation
+    dtype : string, optional (Default: 'float32')
+        the data type of the arrays returned by g, dJ, J, M, R, and C
 
     Attributes
     ----------
@@ -79,12 +81,13 @@ class BaseConfig():
     """
 
     def __init__(self, N_JOINTS, N_LINKS, ROBOT_NAME="robot",
-                 use_cython=False, MEANS=None, SCALES=None):
+                 use_cython=False, MEANS=None, SCALES=None, dtype='float32'):
 
         self.N_JOINTS = N_JOINTS
         self.N_LINKS = N_LINKS
         self.ROBOT_NAME = ROBOT_NAME
         self.use_cython = use_cython
+        self.dtype = dtype
         # dictionaries set by the sub-config, used for scaling input into
         # neural systems. Calculate by recording data from movement of interest
         self.MEANS = MEANS  # expected mean of joints angles / velocities
@@ -220,7 +223,7 @@ class BaseConfig():
         if self._g is None:
             self._g = self._calc_g()
         parameters = tuple(q)
-        return np.array(self._g(*parameters), dtype='float32').flatten()
+        return np.array(self._g(*parameters), dtype=self.dtype).flatten()
 
     def dJ(self, name, q, dq, x=None):
         """ Loads or calculates the derivative of the Jacobian wrt time
@@ -244,7 +247,7 @@ class BaseConfig():
         if self._dJ.get(funcname, None) is None:
             self._dJ[funcname] = self._calc_dJ(name=name, x=x)
         parameters = tuple(q) + tuple(dq) + tuple(x)
-        return np.array(self._dJ[funcname](*parameters), dtype='float32')
+        return np.array(self._dJ[funcname](*parameters), dtype=self.dtype)
 
     def J(self, name, q, x=None):
         """ Loads or calculates the Jacobian for a joint or link
@@ -267,7 +270,7 @@ class BaseConfig():
         if self._J.get(funcname, None) is None:
             self._J[funcname] = self._calc_J(name=name, x=x)
         parameters = tuple(q) + tuple(x)
-        return np.array(self._J[funcname](*parameters), dtype='float32')
+        return np.array(self._J[funcname](*parameters), dtype=self.dtype)
 
     def M(self, q):
         """ Loads or calculates the joint space inertia matrix
@@ -282,7 +285,7 @@ class BaseConfig():
         if self._M is None:
             self._M = self._calc_M()
         parameters = tuple(q)
-        return np.array(self._M(*parameters), dtype='float32')
+        return np.array(self._M(*parameters), dtype=self.dtype)
 
     def R(self, name, q):
         """ Loads or calculates the rotation matrix
@@ -296,7 +299,7 @@ class BaseConfig():
         if self._R.get(name, None) is None:
             self._R[name] = self._calc_R(name)
         parameters = tuple(q)
-        return np.array(self._R[name](*parameters), dtype='float32')
+        return np.array(self._R[name](*parameters), dtype=self.dtype)
 
     def C(self, q, dq):
         """ Loads or calculates the centrifugal and Coriolis forces matrix
@@ -314,7 +317,7 @@ class BaseConfig():
         if self._C is None:
             self._C = self._calc_C()
         parameters = tuple(q) + tuple(dq)
-        return np.array(self._C(*parameters), dtype='float32')
+        return np.array(self._C(*parameters), dtype=self.dtype)
 
     def scaledown(self, name, x):
         """ Scales down the input to the -1 to 1 range, based on the
@@ -0,0 +1,357 @@
+import itertools
+import multiprocessing
+import os
+
+import numpy as np
+
+import abr_control.utils.os_utils
+
+
+# the config being tabulated, set before forking worker processes so that
+# the children inherit the already generated functions instead of pickling
+_WORKER_CONFIG = None
+
+
+def _fill_chunk(args):
+    """ Evaluates one quantity at a contiguous chunk of grid points and
+    writes the result straight into the memory-mapped table
+
+    Parameters
+    ----------
+    args : tuple
+        (filename, quantity, name, start, stop, grid), see
+        TabulatedConfig.evaluate for quantity and name
+    """
+    filename, quantity, name, start, stop, grid = args
+    table = np.load(filename, mmap_mode='r+')
+    for index in range(start, stop):
+        q = TabulatedConfig.grid_point(index, grid)
+        table[index] = TabulatedConfig.evaluate(
+            _WORKER_CONFIG, quantity, name, q).flatten()
+    table.flush()
+    del table
+
+
+class TabulatedConfig():
+    """ Replaces M, g, J and Tx of a robot config with table lookups
+
+    For arms with only a few joints the joint space is small enough to
+    evaluate the inertia matrix, gravity term, Jacobians and transforms
+    once on a dense grid, and interpolate between grid points at run time,
+    which is much cheaper than calling the lambdified expressions.
+
+    The grid is built in parallel and stored as memory-mapped arrays in the
+    config folder of the wrapped robot_config, so it is only generated once.
+    Joints are assumed to be revolute, the grid spans [0, 2pi) and wraps
+    around. Any other attribute or function is passed through to the
+    wrapped robot_config, as are J and Tx calls with a non-zero offset
+    or for a frame that is not tabulated.
+
+    Parameters
+    ----------
+    robot_config : class instance
+        contains all relevant information about the arm
+        such as: number of joints, number of links, mass information etc.
+    resolution : int, optional (Default: 32)
+        number of grid points along each joint
+    names : list of strings, optional (Default: ['EE'])
+        the joints, links, or end-effector to tabulate J and Tx for
+    interpolation : string, optional (Default: 'linear')
+        {'linear', 'cubic'} multilinear or Catmull-Rom cubic interpolation
+    error_bound : float, optional (Default: None)
+        the maximum absolute interpolation error allowed. After building, the
+        tables are checked against the exact functions at random joint
+        angles, and the resolution is doubled until the bound is met or
+        max_resolution is reached. If None, no check is done.
+    max_resolution : int, optional (Default: 256)
+        upper limit on the resolution when refining to meet error_bound
+    n_validation : int, optional (Default: 100)
+        number of random joint angles used to estimate interpolation error
+    n_processes : int, optional (Default: None)
+        number of worker processes used to build the grid, if None
+        uses the number of cores available
+    seed : int, optional (Default: None)
+        the seed used for generating the validation joint angles
+
+    Attributes
+    ----------
+    max_error : dictionary
+        largest absolute error found for each table during validation
+    tables : dictionary
+        memory-mapped arrays holding the values at each grid point
+    """
+
+    QUANTITIES = ('M', 'g', 'J', 'Tx')
+
+    def __init__(self, robot_config, resolution=32, names=None,
+                 interpolation='linear', error_bound=None, max_resolution=256,
+                 n_validation=100, n_processes=None, seed=None):
+
+        if interpolation not in ('linear', 'cubic'):
+            raise Exception('Invalid interpolation specified: %s'
+                            % interpolation)
+
+        self.robot_config = robot_config
+        self.names = ['EE'] if names is None else list(names)
+        self.interpolation = interpolation
+        self.error_bound = error_bound
+        self.n_processes = (os.cpu_count() if n_processes is None
+                            else n_processes)
+        self.max_error = {}
+
+        rng = np.random.RandomState(seed)
+        self._validation_q = rng.uniform(
+            0, 2 * np.pi, size=(n_validation, robot_config.N_JOINTS))
+
+        self._build(resolution)
+        while (error_bound is not None and
+               max(self.max_error.values()) > error_bound and
+               self.resolution * 2 <= max_resolution):
+            self._build(self.resolution * 2)
+
+        if error_bound is not None and max(
+                self.max_error.values()) > error_bound:
+            print('Tabulated functions exceed the error bound of %g at '
+                  'the max resolution of %i, largest error: %g'
+                  % (error_bound, self.resolution,
+                     max(self.max_error.values())))
+
+    def __getattr__(self, attr):
+        # only called if attr isn't found on this instance,
+        # so pass everything else through to the wrapped config
+        if attr == 'robot_config':
+            raise AttributeError(attr)
+        return getattr(self.robot_config, attr)
+
+    @staticmethod
+    def grid_point(index, grid):
+        """ Returns the joint angles at a flat index into the grid
+
+        Parameters
+        ----------
+        index : int
+            flat index into the grid
+        grid : tuple of ints
+            number of grid points along each joint
+        """
+        return (np.array(np.unravel_index(index, grid), dtype='float') *
+                2 * np.pi / np.array(grid))
+
+    @staticmethod
+    def evaluate(robot_config, quantity, name, q):
+        """ Calls the exact robot_config function for a quantity
+
+        Parameters
+        ----------
+        robot_config : class instance
+            the config to evaluate
+        quantity : string
+            one of QUANTITIES
+        name : string
+            name of the joint, link, or end-effector for J and Tx
+        q : numpy.array
+            joint angles [radians]
+        """
+        if quantity == 'M':
+            return robot_config.M(q)
+        elif quantity == 'g':
+            return robot_config.g(q)
+        elif quantity == 'J':
+            return robot_config.J(name, q)
+        return robot_config.Tx(name, q)
+
+    def _build(self, resolution):
+        """ Loads the tables at the given resolution, generating any
+        that have not been saved to file yet
+
+        Parameters
+        ----------
+        resolution : int
+            number of grid points along each joint
+        """
+        global _WORKER_CONFIG  # pylint: disable=global-statement
+
+        self.resolution = resolution
+        self.grid = (resolution,) * self.robot_config.N_JOINTS
+        self.spacing = 2 * np.pi / resolution
+        n_points = resolution ** self.robot_config.N_JOINTS
+
+        # every combination of neighbouring grid points used to interpolate,
+        # as an index into the interpolation weights and a grid offset
+        offsets = np.array([0, 1] if self.interpolation == 'linear'
+                           else [-1, 0, 1, 2])
+        self._corners = np.array(list(itertools.product(
+            range(len(offsets)), repeat=self.robot_config.N_JOINTS)))
+        self._corner_offsets = offsets[self._corners]
+        self._dims = np.arange(self.robot_config.N_JOINTS)
+        self._strides = resolution ** self._dims[::-1]
+
+        folder = '%s/tabulated/%s/resolution%i' % (
+            self.robot_config.config_folder, self.robot_config.dtype,
+            resolution)
+        abr_control.utils.os_utils.makedirs(folder)
+
+        zeros = np.zeros(self.robot_config.N_JOINTS)
+        self.tables = {}
+        self._shapes = {}
+        self._dtypes = {}
+        jobs = []
+        for quantity, name in self._table_keys():
+            key = self._key(quantity, name)
+            # evaluate once so the function is generated before forking
+            sample = np.asarray(
+                self.evaluate(self.robot_config, quantity, name, zeros))
+            self._shapes[key] = sample.shape
+            self._dtypes[key] = sample.dtype
+
+            filename = '%s/%s.npy' % (folder, key)
+            if not os.path.isfile(filename):
+                print('Generating lookup table for %s' % key)
+                # write to a temporary file and rename when done, so that
+                # interrupted builds aren't loaded in later
+                tmp_filename = filename[:-4] + '.tmp.npy'
+                np.lib.format.open_memmap(
+                    tmp_filename, mode='w+', dtype=sample.dtype,
+                    shape=(n_points, sample.size)).flush()
+                jobs.append((tmp_filename, filename, quantity, name))
+
+        if jobs:
+            n_chunks = max(1, self.n_processes) * 4
+            bounds = np.linspace(0, n_points, n_chunks + 1).astype(int)
+            chunks = [(tmp_filename, quantity, name, start, stop, self.grid)
+                      for tmp_filename, _, quantity, name in jobs
+                      for start, stop in zip(bounds[:-1], bounds[1:])
+                      if stop > start]
+
+            _WORKER_CONFIG = self.robot_config
+            if (self.n_processes > 1 and
+                    'fork' in multiprocessing.get_all_start_methods()):
+                # forked workers share the generated functions for free
+                with multiprocessing.get_context('fork').Pool(
+                        self.n_processes) as pool:
+                    pool.map(_fill_chunk, chunks)
+            else:
+                for chunk in chunks:
+                    _fill_chunk(chunk)
+            _WORKER_CONFIG = None
+
+            for tmp_filename, filename, _, _ in jobs:
+                os.rename(tmp_filename, filename)
+
+        for quantity, name in self._table_keys():
+            key = self._key(quantity, name)
+            # plain ndarray view of the memory map, skips the
+            # np.memmap indexing overhead on every lookup
+            self.tables[key] = np.asarray(np.load(
+                '%s/%s.npy' % (folder, key), mmap_mode='r'))
+
+        self._validate()
+
+    def _table_keys(self):
+        """ Returns the (quantity, name) pairs being tabulated """
+        keys = [('M', None), ('g', None)]
+        for name in self.names:
+            keys += [('J', name), ('Tx', name)]
+        return keys
+
+    @staticmethod
+    def _key(quantity, name):
+        return quantity if name is None else '%s_%s' % (quantity, name)
+
+    def _validate(self):
+        """ Finds the largest interpolation error of each table at the
+        validation joint angles """
+        for quantity, name in self._table_keys():
+            key = self._key(quantity, name)
+            self.max_error[key] = max(
+                np.max(np.abs(
+                    self._interpolate(key, q) -
+                    self.evaluate(self.robot_config, quantity, name, q)))
+                for q in self._validation_q)
+
+    def _interpolate(self, key, q):
+        """ Interpolates a table at the given joint angles
+
+        Parameters
+        ----------
+        key : string
+            the table to look up
+        q : numpy.array
+            joint angles [radians]
+        """
+        u = np.mod(np.asarray(q, dtype='float'), 2 * np.pi) / self.spacing
+        base = np.floor(u)
+        frac = u - base
+
+        if self.interpolation == 'linear':
+            weights = [1.0 - frac, frac]
+        else:
+            # Catmull-Rom spline weights for the points at -1, 0, 1, 2
+            frac2 = frac * frac
+            frac3 = frac2 * frac
+            weights = [0.5 * (-frac3 + 2 * frac2 - frac),
+                       0.5 * (3 * frac3 - 5 * frac2 + 2),
+                       0.5 * (-3 * frac3 + 4 * frac2 + frac),
+                       0.5 * (frac3 - frac2)]
+        corner_weights = np.prod(
+            np.array(weights)[self._corners, self._dims], axis=1)
+        # flat indices of the neighbouring grid points, wrapped around
+        flat = np.dot(np.mod(base.astype(int) + self._corner_offsets,
+                             self.resolution), self._strides)
+
+        value = np.dot(corner_weights, self.tables[key][flat])
+        return value.astype(self._dtypes[key]).reshape(self._shapes[key])
+
+    def g(self, q):
+        """ Looks up the force of gravity in joint space
+
+        Parameters
+        ----------
+        q : numpy.array
+            joint angles [radians]
+        """
+        return self._interpolate('g', q)
+
+    def J(self, name, q, x=None):
+        """ Looks up the Jacobian for a joint or link
+
+        Parameters
+        ----------
+        name : string
+            name of the joint, link, or end-effector
+        q : numpy.array
+            joint angles [radians]
+        x : numpy.array, optional (Default: [0,0,0])
+            the [x,y,z] offset inside reference frame of 'name' [meters]
+            if non-zero, the exact function is used
+        """
+        if name not in self.names or (x is not None and not np.allclose(x, 0)):
+            return self.robot_config.J(name, q, x=x)
+        return self._interpolate('J_%s' % name, q)
+
+    def M(self, q):
+        """ Looks up the joint space inertia matrix
+
+        Parameters
+        ----------
+        q : numpy.array
+            joint angles [radians]
+        """
+        return self._interpolate('M', q)
+
+    def Tx(self, name, q, x=None):
+        """ Looks up the position of a joint or link
+
+        Parameters
+        ----------
+        name : string
+            name of the joint, link, or end-effector
+        q : numpy.array
+            joint angles [radians]
+        x : numpy.array, optional (Default: [0,0,0])
+            the [x,y,z] offset inside reference frame of 'name' [meters]
+            if non-zero, the exact function is used
+        """
+        if name not in self.names or (x is not None and not np.allclose(x, 0)):
+            return self.robot_config.Tx(name, q, x=x)
+        return self._interpolate('Tx_%s' % name, q)
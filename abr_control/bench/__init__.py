@@ -0,0 +1,13 @@
+""" Benchmarks for tracking the performance of abr_control
+
+Run from the command line with::
+
+    python -m abr_control.bench micro --arms twojoint --output results.json
+
+which writes the latency of each robot config function and controller to
+a JSON file, or to stdout if no output file is specified. The example
+control loops can be run headlessly on the simulated arms with::
+
+    python -m abr_control.bench scenarios --arms twojoint threejoint
+"""
+from . import micro, scenarios
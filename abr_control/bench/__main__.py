@@ -0,0 +1,80 @@
+import argparse
+import contextlib
+import datetime
+import json
+import platform
+import sys
+
+import numpy as np
+
+import abr_control
+from abr_control.bench import micro, scenarios
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m abr_control.bench',
+        description='Benchmark abr_control and output the results as JSON')
+    subparsers = parser.add_subparsers(dest='benchmark')
+    subparsers.required = True
+
+    micro_parser = subparsers.add_parser(
+        'micro', help='time each robot config function and controller')
+    micro_parser.add_argument(
+        '--arms', nargs='+', default=micro.ARMS, choices=micro.ARMS)
+    micro_parser.add_argument(
+        '--backends', nargs='+', default=list(micro.BACKENDS),
+        choices=list(micro.BACKENDS))
+    micro_parser.add_argument(
+        '--dtypes', nargs='+', default=micro.DTYPES, choices=micro.DTYPES)
+    micro_parser.add_argument('--n-samples', type=int, default=1000)
+    micro_parser.add_argument('--seed', type=int, default=0)
+
+    scenarios_parser = subparsers.add_parser(
+        'scenarios', help='run the example control loops headlessly')
+    scenarios_parser.add_argument(
+        '--scenarios', nargs='+', default=list(scenarios.SCENARIOS),
+        choices=list(scenarios.SCENARIOS))
+    scenarios_parser.add_argument(
+        '--arms', nargs='+', default=['twojoint'], choices=scenarios.ARMS)
+    scenarios_parser.add_argument('--n-steps', type=int, default=5000)
+    scenarios_parser.add_argument('--seed', type=int, default=0)
+
+    for subparser in subparsers.choices.values():
+        subparser.add_argument(
+            '--output', default=None,
+            help='file to write the JSON results to, defaults to stdout')
+
+    args = parser.parse_args(argv)
+
+    # keep stdout clean for the results, function generation and
+    # loading messages are printed to stderr instead
+    with contextlib.redirect_stdout(sys.stderr):
+        if args.benchmark == 'micro':
+            results = micro.run(
+                arms=args.arms, backends=args.backends, dtypes=args.dtypes,
+                n_samples=args.n_samples, seed=args.seed)
+        elif args.benchmark == 'scenarios':
+            results = scenarios.run(
+                scenarios=args.scenarios, arms=args.arms,
+                n_steps=args.n_steps, seed=args.seed)
+
+    results['meta'] = {
+        'benchmark': args.benchmark,
+        'abr_control': abr_control.__version__,
+        'numpy': np.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.datetime.now().isoformat(),
+    }
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
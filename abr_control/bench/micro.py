@@ -0,0 +1,217 @@
+""" Micro-benchmarks of the robot config functions and controllers
+
+Times every kinematic and dynamic quantity provided by the robot configs,
+and the generate function of each controller, for each of the shipped arms
+and each combination of function generation backend and dtype.
+"""
+import importlib
+import time
+
+import numpy as np
+
+from abr_control.controllers import Floating, Joint, OSC, Sliding
+
+
+ARMS = ['onelink', 'twojoint', 'threejoint', 'ur5', 'jaco2']
+# keyword arguments passed in to the robot config for each backend,
+# 'tabulated' wraps the lambdified config in a TabulatedConfig
+BACKENDS = {
+    'lambdify': {'use_cython': False},
+    'cython': {'use_cython': True},
+    'tabulated': {'use_cython': False},
+}
+DTYPES = ['float32', 'float64']
+# only arms with this many joints or fewer are tabulated
+MAX_TABULATED_JOINTS = 3
+
+
+def load_config(arm, backend='lambdify', dtype='float32'):
+    """ Creates the robot config for an arm with the given backend and dtype
+
+    Parameters
+    ----------
+    arm : string
+        name of the folder in abr_control.arms
+    backend : string, optional (Default: 'lambdify')
+        one of the keys in BACKENDS
+    dtype : string, optional (Default: 'float32')
+        the data type returned by the config functions
+    """
+    module = importlib.import_module('abr_control.arms.%s' % arm)
+    robot_config = module.Config(dtype=dtype, **BACKENDS[backend])
+    if backend == 'tabulated':
+        if robot_config.N_JOINTS > MAX_TABULATED_JOINTS:
+            raise Exception('Too many joints to tabulate %s' % arm)
+        from abr_control.arms.tabulated_config import TabulatedConfig
+        robot_config = TabulatedConfig(robot_config)
+    return robot_config
+
+
+def time_function(function, args, n_warmup=10):
+    """ Times a function call for each set of arguments
+
+    Returns the 50th and 99th percentile and mean latency in microseconds,
+    or the error raised if the function fails during the warm up calls
+
+    Parameters
+    ----------
+    function : callable
+        the function to time
+    args : list of tuples
+        the arguments to call the function with, one call per tuple
+    n_warmup : int, optional (Default: 10)
+        number of untimed calls made first, also triggers
+        generating or loading the function if required
+    """
+    try:
+        for ii in range(n_warmup):
+            function(*args[ii % len(args)])
+    except Exception as e:  # pylint: disable=broad-except
+        # e.g. a singular inertia matrix for some arm models
+        return {'error': repr(e)}
+
+    times = np.zeros(len(args))
+    for ii, arg in enumerate(args):
+        start = time.perf_counter()
+        function(*arg)
+        times[ii] = time.perf_counter() - start
+    times *= 1e6
+
+    return {
+        'p50_us': float(np.percentile(times, 50)),
+        'p99_us': float(np.percentile(times, 99)),
+        'mean_us': float(np.mean(times)),
+        'n_samples': len(args),
+    }
+
+
+def benchmark_config(robot_config, n_samples=1000, seed=None):
+    """ Times each of the robot config functions
+
+    Parameters
+    ----------
+    robot_config : class instance
+        contains all relevant information about the arm
+        such as: number of joints, number of links, mass information etc.
+    n_samples : int, optional (Default: 1000)
+        number of random joint states to time each function at
+    seed : int, optional (Default: None)
+        the seed used for generating joint states
+    """
+    rng = np.random.RandomState(seed)
+    qs = rng.uniform(-np.pi, np.pi, (n_samples, robot_config.N_JOINTS))
+    dqs = rng.uniform(-1, 1, (n_samples, robot_config.N_JOINTS))
+
+    functions = {
+        'Tx': (lambda q, dq: robot_config.Tx('EE', q)),
+        'J': (lambda q, dq: robot_config.J('EE', q)),
+        'dJ': (lambda q, dq: robot_config.dJ('EE', q, dq)),
+        'M': (lambda q, dq: robot_config.M(q)),
+        'g': (lambda q, dq: robot_config.g(q)),
+        'C': (lambda q, dq: robot_config.C(q, dq)),
+        'R': (lambda q, dq: robot_config.R('EE', q)),
+        'T_inv': (lambda q, dq: robot_config.T_inv('EE', q)),
+    }
+    args = list(zip(qs, dqs))
+    return {name: time_function(function, args)
+            for name, function in functions.items()}
+
+
+def benchmark_controllers(robot_config, n_samples=1000, seed=None):
+    """ Times the generate function of each controller
+
+    Parameters
+    ----------
+    robot_config : class instance
+        contains all relevant information about the arm
+        such as: number of joints, number of links, mass information etc.
+    n_samples : int, optional (Default: 1000)
+        number of random joint states to time each controller at
+    seed : int, optional (Default: None)
+        the seed used for generating joint states and targets
+    """
+    rng = np.random.RandomState(seed)
+    qs = rng.uniform(-np.pi, np.pi, (n_samples, robot_config.N_JOINTS))
+    dqs = rng.uniform(-1, 1, (n_samples, robot_config.N_JOINTS))
+    # reachable targets, found from the forward kinematics
+    targets = np.array([robot_config.Tx('EE', q) for q in
+                        rng.uniform(-np.pi, np.pi, qs.shape)])
+    target_qs = rng.uniform(-np.pi, np.pi, qs.shape)
+
+    osc = OSC(robot_config)
+    sliding = Sliding(robot_config)
+    joint = Joint(robot_config)
+    floating = Floating(robot_config, dynamic=True)
+
+    functions = {
+        'OSC.generate': (lambda q, dq, target, target_q:
+                         osc.generate(q, dq, target)),
+        'Sliding.generate': (lambda q, dq, target, target_q:
+                             sliding.generate(q, dq, target)),
+        'Joint.generate': (lambda q, dq, target, target_q:
+                           joint.generate(q, dq, target_q)),
+        'Floating.generate': (lambda q, dq, target, target_q:
+                              floating.generate(q, dq)),
+    }
+    args = list(zip(qs, dqs, targets, target_qs))
+    return {name: time_function(function, args)
+            for name, function in functions.items()}
+
+
+def run(arms=None, backends=None, dtypes=None, n_samples=1000, seed=0):
+    """ Runs the micro-benchmarks for each arm, backend and dtype
+
+    Returns a list of results, one for each function timed, and the
+    fastest backend and dtype for each arm. Configurations that can't
+    be created (e.g. no compiler available for the cython backend) are
+    recorded in the errors list and skipped.
+
+    Parameters
+    ----------
+    arms : list of strings, optional (Default: ARMS)
+        the arms to benchmark
+    backends : list of strings, optional (Default: all BACKENDS)
+        the function generation backends to compare
+    dtypes : list of strings, optional (Default: DTYPES)
+        the dtypes to compare
+    n_samples : int, optional (Default: 1000)
+        number of calls timed for each function
+    seed : int, optional (Default: 0)
+        the seed used for generating joint states and targets
+    """
+    arms = ARMS if arms is None else arms
+    backends = list(BACKENDS) if backends is None else backends
+    dtypes = DTYPES if dtypes is None else dtypes
+
+    results = []
+    errors = []
+    fastest = {}
+    for arm in arms:
+        for backend in backends:
+            for dtype in dtypes:
+                setup = {'arm': arm, 'backend': backend, 'dtype': dtype}
+                print('Benchmarking %s' % setup)
+                try:
+                    robot_config = load_config(arm, backend, dtype)
+                    timings = benchmark_config(
+                        robot_config, n_samples=n_samples, seed=seed)
+                    timings.update(benchmark_controllers(
+                        robot_config, n_samples=n_samples, seed=seed))
+                except Exception as e:  # pylint: disable=broad-except
+                    errors.append(dict(setup, error=repr(e)))
+                    continue
+
+                for function, timing in timings.items():
+                    if 'error' in timing:
+                        errors.append(dict(setup, function=function, **timing))
+                    else:
+                        results.append(
+                            dict(setup, function=function, **timing))
+
+                total = sum(timing['p50_us'] for timing in timings.values()
+                            if 'error' not in timing)
+                if arm not in fastest or total < fastest[arm]['total_p50_us']:
+                    fastest[arm] = {'backend': backend, 'dtype': dtype,
+                                    'total_p50_us': total}
+
+    return {'results': results, 'fastest': fastest, 'errors': errors}
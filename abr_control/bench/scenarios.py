@@ -0,0 +1,317 @@
+""" Closed-loop benchmarks replaying the example scripts headlessly
+
+Each scenario recreates the control loop of one of the PyGame / VREP
+examples on a software simulation of the arm, without any display, and
+with targets and obstacles drawn from a seeded random number generator so
+that runs are reproducible. The time spent in each phase of the control
+loop is recorded along with the tracking error of the end-effector.
+"""
+import importlib
+import time
+
+import numpy as np
+
+from abr_control.controllers import OSC, Sliding, signals
+
+
+# arms with a software simulation available
+ARMS = ['twojoint', 'threejoint']
+PHASES = ['feedback', 'control', 'signals', 'simulation']
+
+
+class Scenario():
+    """ Base class for a benchmarked control loop
+
+    Parameters
+    ----------
+    robot_config : class instance
+        contains all relevant information about the arm
+        such as: number of joints, number of links, mass information etc.
+    rng : numpy.random.RandomState
+        used for generating targets and obstacles
+    """
+
+    # the initial joint angles, if None the arm's REST_ANGLES are used
+    q_init = None
+
+    def __init__(self, robot_config, rng):
+        self.robot_config = robot_config
+        self.rng = rng
+        self.target = None
+
+    def new_target(self):
+        """ Returns a random reachable target, found by passing random
+        joint angles through the forward kinematics """
+        q = self.rng.uniform(0, np.pi / 2.0, self.robot_config.N_JOINTS)
+        return self.robot_config.Tx('EE', q)
+
+    def control(self, q, dq):
+        """ Returns the control signal from the main controller """
+        raise NotImplementedError
+
+    def signals(self, q, dq):
+        """ Returns the sum of any additional control signals """
+        return 0.0
+
+    def update(self, hand_xyz, step):
+        """ Updates the target (and any obstacles), called every step
+
+        Parameters
+        ----------
+        hand_xyz : numpy.array
+            the current position of the end-effector [meters]
+        step : int
+            the current time step
+        """
+        # move the target once the hand is within 5mm, or every 2 seconds
+        if self.target is None or step % 2000 == 0 or np.sqrt(
+                np.sum((self.target - hand_xyz)**2)) < .005:
+            self.target = self.new_target()
+
+
+class ReachingOSC(Scenario):
+    """ examples/PyGame/reaching_osc.py """
+
+    def __init__(self, robot_config, rng):
+        super(ReachingOSC, self).__init__(robot_config, rng)
+        self.ctrlr = OSC(robot_config, kp=20, vmax=None,
+                         use_C=True, use_g=False)
+
+    def control(self, q, dq):
+        return self.ctrlr.generate(
+            q=q, dq=dq, target_pos=self.target, target_vel=np.zeros(3))
+
+
+class ReachingSliding(Scenario):
+    """ examples/PyGame/reaching_sliding.py """
+
+    def __init__(self, robot_config, rng):
+        super(ReachingSliding, self).__init__(robot_config, rng)
+        self.ctrlr = Sliding(robot_config)
+
+    def control(self, q, dq):
+        return self.ctrlr.generate(q=q, dq=dq, target_pos=self.target)
+
+
+class AvoidObstacles(Scenario):
+    """ examples/PyGame/avoid_obstacles.py, with the obstacle moved
+    to a random point along the line between the hand and the target
+    whenever a new target is chosen """
+
+    def __init__(self, robot_config, rng):
+        super(AvoidObstacles, self).__init__(robot_config, rng)
+        self.ctrlr = OSC(robot_config, kp=20, vmax=10)
+        self.avoid = signals.AvoidObstacles(robot_config, threshold=1)
+
+    def control(self, q, dq):
+        return self.ctrlr.generate(q=q, dq=dq, target_pos=self.target)
+
+    def signals(self, q, dq):
+        return self.avoid.generate(q=q)
+
+    def update(self, hand_xyz, step):
+        target = self.target
+        super(AvoidObstacles, self).update(hand_xyz, step)
+        if self.target is not target:
+            obstacle = hand_xyz + (
+                self.rng.uniform(.25, .75) * (self.target - hand_xyz))
+            self.avoid.set_obstacles([list(obstacle[:3]) + [.2]])
+
+
+class AvoidJointLimits(Scenario):
+    """ examples/PyGame/avoid_joint_limits.py """
+
+    q_init = [np.pi/4, np.pi/2, np.pi/2]
+
+    def __init__(self, robot_config, rng):
+        super(AvoidJointLimits, self).__init__(robot_config, rng)
+        self.q_init = self.q_init[:robot_config.N_JOINTS]
+        self.ctrlr = OSC(robot_config, kp=100, vmax=10)
+        self.avoid = signals.AvoidJointLimits(
+            robot_config,
+            min_joint_angles=[np.pi/5.0]*robot_config.N_JOINTS,
+            max_joint_angles=[np.pi/2.0]*robot_config.N_JOINTS,
+            max_torque=[100.0]*robot_config.N_JOINTS)
+
+    def control(self, q, dq):
+        return self.ctrlr.generate(q=q, dq=dq, target_pos=self.target)
+
+    def signals(self, q, dq):
+        return self.avoid.generate(q)
+
+
+class DynamicsAdaptationOSC(Scenario):
+    """ examples/PyGame/dynamics_adaptation_osc.py, with adaptation
+    turned on from the start and the same unexpected external force """
+
+    def __init__(self, robot_config, rng):
+        super(DynamicsAdaptationOSC, self).__init__(robot_config, rng)
+        self.ctrlr = OSC(robot_config, kp=50, vmax=10)
+        self.adapt = self.make_adaptation(
+            robot_config.N_JOINTS, seed=int(rng.randint(2**31)))
+        self.fake_gravity = np.array([0, -9.81, 0, 0, 0, 0]) * 10.0
+
+    def make_adaptation(self, n_joints, seed):
+        """ Returns the adaptive signal """
+        return signals.DynamicsAdaptation(
+            n_input=n_joints, n_output=n_joints,
+            pes_learning_rate=1e-4, backend='nengo', seed=seed)
+
+    def control(self, q, dq):
+        u = self.ctrlr.generate(q=q, dq=dq, target_pos=self.target)
+        # the unexpected external force, part of the simulated world
+        for ii in range(self.robot_config.N_LINKS):
+            u += np.dot(self.robot_config.J('link%i' % ii, q).T,
+                        self.fake_gravity)
+        return u
+
+    def signals(self, q, dq):
+        return self.adapt.generate(
+            input_signal=self.robot_config.scaledown('q', q),
+            training_signal=self.ctrlr.training_signal)
+
+
+class DynamicsAdaptationRFF(DynamicsAdaptationOSC):
+    """ DynamicsAdaptationOSC, with random Fourier features learned
+    with normalized least mean squares in place of the neurons """
+
+    def make_adaptation(self, n_joints, seed):
+        return signals.FeatureAdaptation(
+            n_input=n_joints, n_output=n_joints, n_features=200,
+            features='rff', update='nlms', learning_rate=1e-2, seed=seed)
+
+
+class DynamicsAdaptationRLS(DynamicsAdaptationOSC):
+    """ DynamicsAdaptationOSC, with radial basis functions learned
+    with recursive least squares in place of the neurons """
+
+    def make_adaptation(self, n_joints, seed):
+        return signals.FeatureAdaptation(
+            n_input=n_joints, n_output=n_joints, n_features=100,
+            features='rbf', update='rls', learning_rate=1e-1,
+            forgetting=.999, seed=seed)
+
+
+class DynamicsAdaptationTiled(DynamicsAdaptationOSC):
+    """ DynamicsAdaptationOSC, with the joint space split into tiles
+    that each have a small population of neurons """
+
+    def make_adaptation(self, n_joints, seed):
+        return signals.TiledAdaptation(
+            n_input=n_joints, n_output=n_joints, n_tiles=2, overlap=0.1,
+            n_neurons=200, pes_learning_rate=1e-3, seed=seed)
+
+
+SCENARIOS = {
+    'reaching_osc': ReachingOSC,
+    'reaching_sliding': ReachingSliding,
+    'avoid_obstacles': AvoidObstacles,
+    'avoid_joint_limits': AvoidJointLimits,
+    'dynamics_adaptation_osc': DynamicsAdaptationOSC,
+    'dynamics_adaptation_rff': DynamicsAdaptationRFF,
+    'dynamics_adaptation_rls': DynamicsAdaptationRLS,
+    'dynamics_adaptation_tiled': DynamicsAdaptationTiled,
+}
+
+
+def run_scenario(scenario, arm='twojoint', n_steps=5000, seed=0):
+    """ Runs one scenario and returns its throughput and tracking error
+
+    Parameters
+    ----------
+    scenario : string
+        one of the keys in SCENARIOS
+    arm : string, optional (Default: 'twojoint')
+        one of ARMS, the simulated arm
+    n_steps : int, optional (Default: 5000)
+        number of control loop iterations to run, at 1ms per step
+    seed : int, optional (Default: 0)
+        the seed used for generating targets and obstacles
+    """
+    rng = np.random.RandomState(seed)
+    arm_module = importlib.import_module('abr_control.arms.%s' % arm)
+    robot_config = arm_module.Config()
+    loop = SCENARIOS[scenario](robot_config, rng)
+    arm_sim = arm_module.ArmSim(robot_config, dt=.001, q_init=loop.q_init)
+    arm_sim.connect()
+
+    # run once to generate or load all of the functions
+    feedback = arm_sim.get_feedback()
+    loop.update(robot_config.Tx('EE', feedback['q']), step=1)
+    loop.control(feedback['q'], feedback['dq'])
+    loop.signals(feedback['q'], feedback['dq'])
+    loop.target = None
+
+    phase_times = dict((phase, 0.0) for phase in PHASES)
+    errors = np.zeros(n_steps)
+    start = time.perf_counter()
+    for step in range(n_steps):
+        t0 = time.perf_counter()
+        feedback = arm_sim.get_feedback()
+        hand_xyz = robot_config.Tx('EE', feedback['q'])
+        loop.update(hand_xyz, step)
+        t1 = time.perf_counter()
+        u = loop.control(feedback['q'], feedback['dq'])
+        t2 = time.perf_counter()
+        u = u + loop.signals(feedback['q'], feedback['dq'])
+        t3 = time.perf_counter()
+        arm_sim.send_forces(u)
+        t4 = time.perf_counter()
+
+        phase_times['feedback'] += t1 - t0
+        phase_times['control'] += t2 - t1
+        phase_times['signals'] += t3 - t2
+        phase_times['simulation'] += t4 - t3
+        errors[step] = np.sqrt(np.sum((loop.target - hand_xyz)**2))
+    total_time = time.perf_counter() - start
+    arm_sim.disconnect()
+
+    return {
+        'scenario': scenario,
+        'arm': arm,
+        'n_steps': n_steps,
+        'seed': seed,
+        'steps_per_second': n_steps / total_time,
+        'phase_fraction': dict(
+            (phase, phase_times[phase] / total_time) for phase in PHASES),
+        'phase_us_per_step': dict(
+            (phase, phase_times[phase] / n_steps * 1e6) for phase in PHASES),
+        'tracking_error_mean': float(np.mean(errors)),
+        'tracking_error_final': float(errors[-1]),
+        'diverged': bool(not np.all(np.isfinite(errors))),
+    }
+
+
+def run(scenarios=None, arms=None, n_steps=5000, seed=0):
+    """ Runs each scenario on each arm
+
+    Scenarios that can't be run (e.g. Nengo isn't installed for the
+    adaptive scenarios) are recorded in the errors list and skipped.
+
+    Parameters
+    ----------
+    scenarios : list of strings, optional (Default: all SCENARIOS)
+        the scenarios to run
+    arms : list of strings, optional (Default: ['twojoint'])
+        the simulated arms to run the scenarios on
+    n_steps : int, optional (Default: 5000)
+        number of control loop iterations to run for each scenario
+    seed : int, optional (Default: 0)
+        the seed used for generating targets and obstacles
+    """
+    scenarios = list(SCENARIOS) if scenarios is None else scenarios
+    arms = ['twojoint'] if arms is None else arms
+
+    results = []
+    errors = []
+    for arm in arms:
+        for scenario in scenarios:
+            print('Running %s on %s' % (scenario, arm))
+            try:
+                results.append(run_scenario(
+                    scenario, arm=arm, n_steps=n_steps, seed=seed))
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append({'scenario': scenario, 'arm': arm,
+                               'error': repr(e)})
+
+    return {'results': results, 'errors': errors}
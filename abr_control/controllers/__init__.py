@@ -2,3 +2,4 @@ from .floating import Floating
 from .osc import OSC
 from .joint import Joint
 from .sliding import Sliding
+from .ilqr import ILQR
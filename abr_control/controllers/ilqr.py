@@ -0,0 +1,435 @@
+import os
+
+import cloudpickle
+import numpy as np
+import sympy as sp
+
+import abr_control.utils.os_utils
+
+from . import controller
+
+
+class ILQR(controller.Controller):
+    """ Implements an iterative linear quadratic regulator (iLQR) as a
+    receding horizon model predictive controller
+
+    Optimizes the sequence of joint torques over a finite horizon to move
+    the arm to a set of target joint angles, using the forward dynamics
+    M(q) ddq = u + g(q) - C(q, dq) dq of the robot config. The dynamics and
+    their derivatives are generated from the config's symbolic M, g, and C
+    and evaluated for every point along the horizon in a single batched
+    call, and the line search rolls out every step size at once. Each call
+    to generate warm-starts from the previous solution, shifted forward in
+    time, so only a few iterations are needed per control step.
+
+    Parameters
+    ----------
+    robot_config : class instance
+        contains all relevant information about the arm
+        such as: number of joints, number of links, mass information etc.
+    horizon : int, optional (Default: 50)
+        number of time steps optimized over
+    dt : float, optional (Default: 0.01)
+        the time step of the planned trajectory [seconds]
+    control_dt : float, optional (Default: 0.001)
+        the time between calls to generate [seconds], used to shift the
+        previous solution forward for warm-starting
+    n_iterations : int, optional (Default: 1)
+        number of iLQR iterations run in each call to generate
+    kp : float, optional (Default: 100)
+        cost on the joint angle error
+    kv : float, optional (Default: 1)
+        cost on the joint velocity error
+    ku : float, optional (Default: 1e-3)
+        cost on the joint torques
+    terminal_scale : float, optional (Default: 10)
+        the joint angle and velocity costs are scaled by this term at
+        the end of the horizon
+    step_sizes : list of floats, optional (Default: [1, .5, .25, .1])
+        the step sizes tried in the line search
+    simplify : boolean, optional (Default: True)
+        simplify the dynamics expressions before generating functions,
+        this is slow for arms with many joints, but the resulting
+        functions are much faster to evaluate
+
+    Attributes
+    ----------
+    U : numpy.array
+        the optimized torque sequence, shape (horizon, N_JOINTS)
+    X : numpy.array
+        the predicted trajectory of [q, dq], shape (horizon+1, 2*N_JOINTS)
+    K : numpy.array
+        the feedback gains along the trajectory
+    cost : float
+        the cost of the current solution
+    """
+
+    def __init__(self, robot_config, horizon=50, dt=0.01, control_dt=0.001,
+                 n_iterations=1, kp=100.0, kv=1.0, ku=1e-3,
+                 terminal_scale=10.0, step_sizes=None, simplify=True):
+
+        super(ILQR, self).__init__(robot_config)
+
+        self.horizon = horizon
+        self.dt = dt
+        self.control_dt = control_dt
+        self.n_iterations = n_iterations
+        self.simplify = simplify
+        if step_sizes is None:
+            step_sizes = [1.0, 0.5, 0.25, 0.1]
+        # a step size of 0 keeps the previous solution as a candidate
+        self.step_sizes = np.hstack([step_sizes, 0.0])
+
+        N = robot_config.N_JOINTS
+        self.Q = np.diag(np.hstack([np.ones(N) * kp, np.ones(N) * kv]))
+        self.Qf = self.Q * terminal_scale
+        self.R = np.eye(N) * ku
+        self.IDENTITY_N_JOINTS = np.eye(N)
+
+        self.mu = 1e-6  # regularization of the backward pass
+        self.U = np.zeros((horizon, N))
+        self.X = None
+        self.K = np.zeros((horizon, N, 2 * N))
+        self.cost = np.inf
+        self._elapsed = 0.0  # time since the solution was last shifted
+
+        self._dynamics = self._calc_dynamics()
+
+    def _calc_dynamics(self):
+        """ Generates the batched dynamics functions
+
+        Creates a function returning the inertia matrix M and bias forces
+        h = C dq - g, used for rollouts, and one that also returns the
+        derivatives of M wrt q and of h wrt q and dq, used for
+        linearizing the dynamics. The expressions are saved to file in
+        the robot config's folder.
+        """
+        rc = self.robot_config
+        N = rc.N_JOINTS
+        filename = '%s/ilqr/ilqr%s' % (
+            rc.config_folder, '_simplified' if self.simplify else '')
+
+        if os.path.isfile(filename):
+            print('Loading expression from ilqr ...')
+            expressions = cloudpickle.load(open(filename, 'rb'))
+        else:
+            print('Generating iLQR dynamics derivatives function')
+            M = rc._calc_M(lambdify=False)
+            h = (rc._calc_C(lambdify=False) * sp.Matrix(rc.dq) -
+                 rc._calc_g(lambdify=False))
+            if self.simplify:
+                M = M.applyfunc(sp.simplify)
+                h = h.applyfunc(sp.simplify)
+
+            dM = [M.diff(rc.q[ii]) for ii in range(N)]
+            expressions = (list(M) + list(h) +
+                           [term for dMdq in dM for term in list(dMdq)] +
+                           list(h.jacobian(rc.q)) + list(h.jacobian(rc.dq)))
+
+            abr_control.utils.os_utils.makedirs(
+                '%s/ilqr' % rc.config_folder)
+            cloudpickle.dump(expressions, open(filename, 'wb'))
+
+        # offsets of each quantity in the flat list of expressions
+        bounds = np.cumsum([0, N * N, N, N * N * N, N * N, N * N])
+
+        def batch_function(expressions):
+            """ Lambdifies a flat list of expressions, so that constant
+            entries can be broadcast to the batch size """
+            function = sp.lambdify(
+                rc.q + rc.dq, expressions, 'numpy', cse=True)
+
+            def batched(q, dq):
+                values = function(*np.hstack([q, dq]).T)
+                out = np.empty((len(values), q.shape[0]))
+                for ii, value in enumerate(values):
+                    out[ii] = value
+                return out.T
+            return batched
+
+        forward = batch_function(expressions[:bounds[2]])
+        linearized = batch_function(expressions)
+
+        def dynamics(q, dq, derivatives=False):
+            """ Returns M, h, and if derivatives is True dM/dq, dh/dq and
+            dh/ddq, for a batch of states
+
+            Parameters
+            ----------
+            q : numpy.array
+                joint angles, shape (batch, N_JOINTS) [radians]
+            dq : numpy.array
+                joint velocities, shape (batch, N_JOINTS) [radians/second]
+            derivatives : boolean, optional (Default: False)
+                if True also return the derivatives
+            """
+            if not derivatives:
+                out = forward(q, dq)
+                return (out[:, bounds[0]:bounds[1]].reshape(-1, N, N),
+                        out[:, bounds[1]:bounds[2]])
+            out = linearized(q, dq)
+            return (
+                out[:, bounds[0]:bounds[1]].reshape(-1, N, N),
+                out[:, bounds[1]:bounds[2]],
+                # dM[:, kk] is the derivative of M wrt q[kk]
+                out[:, bounds[2]:bounds[3]].reshape(-1, N, N, N),
+                out[:, bounds[3]:bounds[4]].reshape(-1, N, N),
+                out[:, bounds[4]:bounds[5]].reshape(-1, N, N))
+
+        return dynamics
+
+    def _step(self, x, u):
+        """ Moves a batch of states forward one time step
+
+        Parameters
+        ----------
+        x : numpy.array
+            the [q, dq] states, shape (batch, 2*N_JOINTS)
+        u : numpy.array
+            the joint torques, shape (batch, N_JOINTS)
+        """
+        N = self.robot_config.N_JOINTS
+        q = x[:, :N]
+        dq = x[:, N:]
+        M, h = self._dynamics(q, dq)
+        ddq = np.linalg.solve(M, (u - h)[..., None])[..., 0]
+        # semi-implicit Euler integration
+        dq = dq + ddq * self.dt
+        q = q + dq * self.dt
+        return np.hstack([q, dq])
+
+    def _error(self, x):
+        """ The state error, with the joint angle error wrapped to -pi..pi
+
+        Parameters
+        ----------
+        x : numpy.array
+            states, shape (..., 2*N_JOINTS)
+        """
+        N = self.robot_config.N_JOINTS
+        error = x - self.x_target
+        error[..., :N] = (error[..., :N] + np.pi) % (np.pi * 2) - np.pi
+        return error
+
+    def _cost(self, X, U):
+        """ The total cost of a batch of trajectories
+
+        Parameters
+        ----------
+        X : numpy.array
+            states, shape (batch, horizon+1, 2*N_JOINTS)
+        U : numpy.array
+            joint torques, shape (batch, horizon, N_JOINTS)
+        """
+        error = self._error(X)
+        return 0.5 * (
+            np.einsum('...ti,ij,...tj->...', error[..., :-1, :], self.Q,
+                      error[..., :-1, :]) +
+            np.einsum('...i,ij,...j->...', error[..., -1, :], self.Qf,
+                      error[..., -1, :]) +
+            np.einsum('...ti,ij,...tj->...', U, self.R, U))
+
+    def _rollout(self, x0, k=None, K=None, step_sizes=None):
+        """ Simulates the trajectory under the current policy for each of
+        the step sizes at once
+
+        u_t = U_t + step_size * k_t + K_t (x_t - X_t)
+
+        Parameters
+        ----------
+        x0 : numpy.array
+            the starting state [q, dq]
+        k : numpy.array, optional (Default: None)
+            feedforward update from the backward pass, if None
+            the current U is rolled out without feedback
+        K : numpy.array, optional (Default: None)
+            feedback gains from the backward pass
+        step_sizes : numpy.array, optional (Default: None)
+            the step sizes to try
+        """
+        step_sizes = np.ones(1) if step_sizes is None else step_sizes
+        n_batch = len(step_sizes)
+        X = np.zeros((n_batch, self.horizon + 1, x0.shape[0]))
+        U = np.zeros((n_batch,) + self.U.shape)
+        X[:, 0] = x0
+        for t in range(self.horizon):
+            U[:, t] = self.U[t]
+            if k is not None:
+                U[:, t] += (step_sizes[:, None] * k[t] +
+                            np.dot(X[:, t] - self.X[t], K[t].T))
+            X[:, t + 1] = self._step(X[:, t], U[:, t])
+        return X, U
+
+    def _linearize(self, X, U):
+        """ Returns the state and control Jacobians of the discrete
+        dynamics at every point along the trajectory
+
+        Parameters
+        ----------
+        X : numpy.array
+            states, shape (horizon+1, 2*N_JOINTS)
+        U : numpy.array
+            joint torques, shape (horizon, N_JOINTS)
+        """
+        N = self.robot_config.N_JOINTS
+        dt = self.dt
+        M, h, dM, dhdq, dhddq = self._dynamics(
+            X[:-1, :N], X[:-1, N:], derivatives=True)
+        M_inv = np.linalg.inv(M)
+        ddq = np.einsum('tij,tj->ti', M_inv, U - h)
+
+        # d(ddq)/dq[k] = M^-1 (-dM/dq[k] ddq - dh/dq[k])
+        dMddq = np.einsum('tkij,tj->tik', dM, ddq)
+        Dq = -np.matmul(M_inv, dMddq + dhdq)
+        Ddq = -np.matmul(M_inv, dhddq)
+
+        I = self.IDENTITY_N_JOINTS
+        A = np.empty((self.horizon, 2 * N, 2 * N))
+        A[:, :N, :N] = I + dt**2 * Dq
+        A[:, :N, N:] = dt * I + dt**2 * Ddq
+        A[:, N:, :N] = dt * Dq
+        A[:, N:, N:] = I + dt * Ddq
+        B = np.concatenate([dt**2 * M_inv, dt * M_inv], axis=1)
+        return A, B
+
+    def _backward_pass(self, A, B, X, U):
+        """ Computes the feedforward updates and feedback gains
+
+        Returns the feedforward terms k and feedback gains K, or None
+        if Q_uu isn't positive definite
+
+        Parameters
+        ----------
+        A : numpy.array
+            state Jacobians, shape (horizon, 2*N_JOINTS, 2*N_JOINTS)
+        B : numpy.array
+            control Jacobians, shape (horizon, 2*N_JOINTS, N_JOINTS)
+        X : numpy.array
+            states, shape (horizon+1, 2*N_JOINTS)
+        U : numpy.array
+            joint torques, shape (horizon, N_JOINTS)
+        """
+        error = self._error(X)
+        # cost gradients are computed for the whole horizon at once
+        l_x = np.dot(error, self.Q)
+        l_u = np.dot(U, self.R)
+
+        V_x = np.dot(self.Qf, error[-1])
+        V_xx = self.Qf
+        k = np.zeros_like(U)
+        K = np.zeros_like(self.K)
+        regularization = self.mu * self.IDENTITY_N_JOINTS
+        for t in range(self.horizon - 1, -1, -1):
+            At = A[t]
+            Bt = B[t]
+            VxxA = np.dot(V_xx, At)
+            VxxB = np.dot(V_xx, Bt)
+            Q_x = l_x[t] + np.dot(At.T, V_x)
+            Q_u = l_u[t] + np.dot(Bt.T, V_x)
+            Q_xx = self.Q + np.dot(At.T, VxxA)
+            Q_ux = np.dot(Bt.T, VxxA)
+            Q_uu = self.R + np.dot(Bt.T, VxxB) + regularization
+
+            try:
+                # check Q_uu is positive definite
+                np.linalg.cholesky(Q_uu)
+            except np.linalg.LinAlgError:
+                return None, None
+            # solve for the feedforward and feedback terms together
+            kK = -np.linalg.solve(Q_uu, np.column_stack([Q_u, Q_ux]))
+            k[t] = kK[:, 0]
+            K[t] = kK[:, 1:]
+
+            V_x = Q_x + np.dot(Q_ux.T, k[t])
+            V_xx = Q_xx + np.dot(Q_ux.T, K[t])
+            V_xx = 0.5 * (V_xx + V_xx.T)
+
+        return k, K
+
+    def _iterate(self, x0):
+        """ Runs one iteration of iLQR from the current solution
+
+        The dynamics are linearized about the previous trajectory, and
+        the line search includes a step size of 0, which rolls out the
+        previous torques from the current state with feedback, so that
+        the solution never gets worse.
+
+        Parameters
+        ----------
+        x0 : numpy.array
+            the current state [q, dq]
+        """
+        A, B = self._linearize(self.X, self.U)
+        k, K = self._backward_pass(A, B, self.X, self.U)
+        if k is None:
+            self.mu = min(self.mu * 10, 1e6)
+            return
+
+        X, U = self._rollout(x0, k, K, self.step_sizes)
+        costs = self._cost(X, U)
+        costs[~np.isfinite(costs)] = np.inf
+        best = np.argmin(costs)
+        self.X = X[best]
+        self.U = U[best]
+        self.K = K
+        self.cost = costs[best]
+        if self.step_sizes[best] > 0:
+            self.mu = max(self.mu / 10, 1e-6)
+        else:
+            # no improvement, increase regularization for the next pass
+            self.mu = min(self.mu * 10, 1e6)
+
+    def generate(self, q, dq, target_pos, target_vel=None):
+        """ Generates the control signal to move the joints to a target
+
+        Parameters
+        ----------
+        q : float numpy.array
+            current joint angles [radians]
+        dq : float numpy.array
+            current joint velocities [radians/second]
+        target_pos : float numpy.array
+            desired joint angles [radians]
+        target_vel : float numpy.array, optional (Default: numpy.zeros)
+            desired joint velocities [radians/sec]
+        """
+        if target_vel is None:
+            target_vel = np.zeros(self.robot_config.N_JOINTS)
+        self.x_target = np.hstack([target_pos, target_vel])
+        x0 = np.hstack([q, dq]).astype('float')
+
+        if self.X is None:
+            # first call, roll out the initial torques from the current state
+            X, U = self._rollout(x0)
+            self.X = X[0]
+            self.cost = self._cost(X, U)[0]
+        else:
+            # shift the previous solution forward in time to warm-start
+            self._elapsed += self.control_dt
+            n_shift = min(int(self._elapsed / self.dt + 1e-9), self.horizon)
+            if n_shift > 0:
+                self._elapsed -= n_shift * self.dt
+                self.U = self._shift(self.U, n_shift)
+                self.X = self._shift(self.X, n_shift)
+                self.K = self._shift(self.K, n_shift)
+
+        for _ in range(self.n_iterations):
+            self._iterate(x0)
+
+        return np.copy(self.U[0])
+
+    @staticmethod
+    def _shift(trajectory, n_shift):
+        """ Drops the first n_shift steps of a trajectory, repeating the
+        last step to keep the same length
+
+        Parameters
+        ----------
+        trajectory : numpy.array
+            the trajectory to shift, time along the first axis
+        n_shift : int
+            number of time steps to move forward
+        """
+        return np.concatenate(
+            [trajectory[n_shift:],
+             np.repeat(trajectory[-1:], n_shift, axis=0)])
@@ -6,6 +6,11 @@ from .path_planner import PathPlanner
 class Linear(PathPlanner):
     """ Creates a linear trajectory from current to target state
 
+    The path is not stored, the target at any time is found directly
+    from the start and target states, so generating a new path is as
+    cheap as storing them. The whole trajectory is only built when the
+    trajectory attribute is used.
+
     Parameters
     ----------
     robot_config : class instance
@@ -16,7 +21,8 @@ class Linear(PathPlanner):
     def __init__(self):
         self.n = 0
         self.n_timesteps = None
-        self.trajectory = None
+        self.dt = None
+        self._trajectory = None
 
     def generate_path(self, state, target, n_timesteps=200,
                       dt=0.001, plot=False):
@@ -37,19 +43,18 @@ class Linear(PathPlanner):
         """
 
         n_states = len(state)
-        self.trajectory = np.zeros((n_timesteps, n_states*2))
-        for ii in range(n_states):
-            # calculate target states
-            self.trajectory[:, ii] = np.linspace(state[ii],
-                                                 target[ii],
-                                                 n_timesteps)
-            # calculate target velocities
-            self.trajectory[:-1, ii+n_states] = (
-                np.diff(self.trajectory[:, ii]) / dt)
+        self.start = np.array(state, dtype='float')
+        self.end = np.array(target, dtype='float')
+        # the time taken to reach the target
+        self.duration = (n_timesteps - 1) * dt
+        self.velocity = ((self.end - self.start) / self.duration
+                         if n_timesteps > 1 else np.zeros(n_states))
+        self._trajectory = None
 
         # reset trajectory index
         self.n = 0
         self.n_timesteps = n_timesteps
+        self.dt = dt
 
         if plot:
             import matplotlib.pyplot as plt
@@ -76,12 +81,80 @@ class Linear(PathPlanner):
 
             plt.show()
 
+    @property
+    def trajectory(self):
+        """ The (n_timesteps, 2 * n_states) target positions and
+        velocities at each time step """
+        if self._trajectory is None and self.n_timesteps is not None:
+            self._trajectory = self.evaluate(
+                np.arange(self.n_timesteps) * self.dt)
+        return self._trajectory
+
+    def evaluate(self, t):
+        """ Return the target position and velocity at time t, holding
+        the target position once it is reached
+
+        Parameters
+        ----------
+        t : float or numpy.array
+            the time since the start of the path [seconds]
+        """
+        t = np.asarray(t, dtype='float')[..., None]
+        return self._interpolate(
+            self.start, self.end, self.velocity, self.duration, t)
+
+    @staticmethod
+    def _interpolate(start, end, velocity, duration, t):
+        """ Returns the positions and velocities at times t, broadcasting
+        the start and end positions and velocities against the times
+
+        Parameters
+        ----------
+        start : numpy.array
+            the start positions
+        end : numpy.array
+            the target positions
+        velocity : numpy.array
+            the velocity from start to end
+        duration : float
+            the time taken to reach the target [seconds]
+        t : numpy.array
+            the times, with a trailing dimension of 1 [seconds]
+        """
+        # a path of a single time step is the start, as with np.linspace
+        moving = t < duration if duration > 0 else t <= 0
+        position = np.where(moving, start + velocity * t, end)
+        return np.concatenate(
+            [position, np.where(moving, velocity, 0.0)], axis=-1)
+
+    def _generate_paths(self, states, targets, n_timesteps=200, dt=0.001):
+        """ Returns linear trajectories from a batch of states to their
+        targets, see generate_paths
+
+        Parameters
+        ----------
+        states : numpy.array
+            the (n_paths, n_states) start positions
+        targets : numpy.array
+            the (n_paths, n_states) target positions
+        n_timesteps : int, optional (Default: 200)
+            the number of time steps to reach the target
+        dt : float, optional (Default: 0.001)
+            the time step for calculating desired velocities [seconds]
+        """
+        duration = (n_timesteps - 1) * dt
+        velocity = ((targets - states) / duration if n_timesteps > 1
+                    else np.zeros(states.shape))
+        t = (np.arange(n_timesteps) * dt)[None, :, None]
+        return self._interpolate(states[:, None], targets[:, None],
+                                 velocity[:, None], duration, t)
+
     def next_target(self):
         """ Return the next target point along the generated trajectory """
 
         # get the next target state if we're not at the end of the trajectory
-        self.target = (self.trajectory[self.n]
-                       if self.n < self.n_timesteps else self.target)
+        self.target = self.evaluate(
+            min(self.n, self.n_timesteps - 1) * self.dt)
         self.n += 1
 
         return self.target
@@ -1,3 +1,10 @@
+import os
+
+import numpy as np
+
+import abr_control.utils.os_utils
+
+
 class PathPlanner():
     """ Super class for any trajectory planners.
 
@@ -22,6 +29,90 @@ class PathPlanner():
         """
         raise NotImplementedError
 
+    def generate_paths(self, states, targets, filename=None,
+                       batch_size=100, **kwargs):
+        """ Generate a path from each of a set of states to a target
+
+        The paths are found for a batch of states and targets at a time,
+        with the same vectorized operations used for a single path.
+        Returns an (n_paths, n_timesteps, 2 * n_states) array of the
+        target positions and velocities of each path, written to a
+        memory-mapped .npy file if filename is set, so that sets of paths
+        larger than memory can be generated.
+
+        Parameters
+        ----------
+        states : numpy.array
+            the (n_paths, n_states) start positions, or the
+            (n_paths, 2 * n_states) start positions and velocities
+            for planners that use them
+        targets : numpy.array
+            the (n_paths, n_states) target positions
+        filename : string, optional (Default: None)
+            .npy file to write the paths to, if None they are kept
+            in memory
+        batch_size : int, optional (Default: 100)
+            the number of paths found at once
+        kwargs : dict
+            planner specific parameters passed to each batch, Linear takes
+            n_timesteps and dt, SecondOrder takes none and uses the
+            n_timesteps and dt it was created with
+        """
+        states = np.atleast_2d(np.asarray(states, dtype='float'))
+        targets = np.atleast_2d(np.asarray(targets, dtype='float'))
+        if len(states) != len(targets):
+            raise Exception('The number of states and targets must match')
+
+        paths = None
+        for ii in range(0, len(states), batch_size):
+            batch = self._generate_paths(states[ii:ii + batch_size],
+                                         targets[ii:ii + batch_size],
+                                         **kwargs)
+            if paths is None:
+                shape = (len(states),) + batch.shape[1:]
+                if filename is None:
+                    paths = np.zeros(shape)
+                else:
+                    folder = os.path.dirname(filename)
+                    if folder:
+                        abr_control.utils.os_utils.makedirs(folder)
+                    paths = np.lib.format.open_memmap(
+                        filename, mode='w+', dtype='float64', shape=shape)
+            paths[ii:ii + len(batch)] = batch
+
+        if filename is not None:
+            paths.flush()
+        return paths
+
+    def _generate_paths(self, states, targets, **kwargs):
+        """ Returns the (n_paths, n_timesteps, 2 * n_states) paths from a
+        batch of states to their targets, see generate_paths
+
+        Parameters
+        ----------
+        states : numpy.array
+            the start states
+        targets : numpy.array
+            the target positions
+        """
+        raise NotImplementedError
+
     def next_target(self):
         """ Return the next target point along the path """
         raise NotImplementedError
+
+    def evaluate(self, t):
+        """ Return the target point at time t along the path
+
+        Parameters
+        ----------
+        t : float or numpy.array
+            the time since the start of the path [seconds]
+        """
+        raise NotImplementedError
+
+    def stream(self):
+        """ Yield each target point along the path in turn, without
+        storing the whole path """
+        for ii in range(self.n_timesteps):
+            yield self.evaluate(ii * self.dt)
@@ -15,6 +15,16 @@ class SecondOrder(PathPlanner):
 
     returns target in form [positions, velocities]
 
+    The filter is linear, so each step multiplies the distance to the
+    target and the velocity of each dimension by the same 2x2 transition
+    matrix, whose powers give the path after any number of steps. The
+    path is found with these powers, without stepping through it in a
+    loop, and only splits into separately computed segments where the
+    threshold switches the filter gain. generate_path only keeps the
+    state at the start of each segment, and any point along the path is
+    found from it with evaluate. Paths for many start and target states
+    can be found at once with generate_paths.
+
     Parameters
     ----------
     n_timesteps : int, optional (Default: 100)
@@ -38,6 +48,8 @@ class SecondOrder(PathPlanner):
         self.zeta = zeta
         self.w = w/n_timesteps # gain to converge in the desired time
         self.threshold = threshold
+        self._trajectory = None
+        self._segment_starts = None
 
     def step(self, state, target_pos, dt=0.001):
         """ Calculates the next state given the current state and
@@ -83,13 +95,13 @@ class SecondOrder(PathPlanner):
             plot the path after generating if True
         """
 
-        n_states = int(len(state)/2)
-
-        self.trajectory = []
-        for _ in range(self.n_timesteps):
-            self.trajectory.append(np.copy(state))
-            state = self.step(state, target_pos, dt=self.dt)
-        self.trajectory = np.array(self.trajectory)
+        self.target_pos = np.array(target_pos, dtype='float')
+        n_states = len(self.target_pos)
+        state = np.asarray(state, dtype='float')
+        if len(state) == n_states:
+            state = np.hstack([state, np.zeros(n_states)])
+        self._find_segments(state)
+        self._trajectory = None
 
         # reset trajectory index
         self.n = 0
@@ -119,12 +131,194 @@ class SecondOrder(PathPlanner):
 
             plt.show()
 
+    def _find_segments(self, state):
+        """ Finds the steps where the threshold switches the filter gain
+        along the path from a state, and the distance to the target and
+        velocity of each dimension at each of them
+
+        Parameters
+        ----------
+        state : numpy.array
+            the start positions and velocities
+        """
+        n_states = len(self.target_pos)
+        # the powers for the gain far from and near the target
+        self._powers = np.array([
+            self.transition_powers(self.w, self.n_timesteps),
+            self.transition_powers(3 * self.w, self.n_timesteps)])
+
+        x = state.reshape(2, n_states).copy()
+        x[0] -= self.target_pos
+        starts = []
+        self._segment_states = []
+        self._segment_near = []
+        start = 0
+        while True:
+            near = int(np.linalg.norm(x[0]) < self.threshold)
+            starts.append(start)
+            self._segment_states.append(x)
+            self._segment_near.append(near)
+
+            # the distance to the target along the rest of the path,
+            # up to the first step that switches the gain
+            powers = self._powers[near, :self.n_timesteps - start]
+            distance = (powers[:, 0, 0, None] * x[0] +
+                        powers[:, 0, 1, None] * x[1])
+            switched = (np.linalg.norm(distance, axis=1) <
+                        self.threshold) != near
+            switched[0] = False
+            if not np.any(switched):
+                break
+            offset = np.argmax(switched)
+            x = np.dot(powers[offset], x)
+            start += offset
+        self._segment_starts = np.array(starts)
+        self._segment_states = np.array(self._segment_states)
+        self._segment_near = np.array(self._segment_near)
+
+    def _generate_paths(self, states, targets):
+        """ Returns the filtered paths from a batch of states to their
+        targets, see generate_paths
+
+        Each path is found with the transition matrix powers of its
+        current gain until the first step where the threshold switches
+        the gain, and then the rest of it again from that step, until
+        the gains of all paths stay the same to the end.
+
+        Parameters
+        ----------
+        states : numpy.array
+            the (n_paths, 2 * n_states) start positions and velocities,
+            or (n_paths, n_states) start positions, starting at rest
+        targets : numpy.array
+            the (n_paths, n_states) target positions
+        """
+        n_paths, n_states = targets.shape
+        if states.shape[1] == n_states:
+            states = np.hstack([states, np.zeros(states.shape)])
+        n_timesteps = self.n_timesteps
+        # the powers for the gain far from and near the target
+        powers = np.array([
+            self.transition_powers(self.w, n_timesteps),
+            self.transition_powers(3 * self.w, n_timesteps)])
+
+        # the distance to the target and velocity of each dimension
+        x = states.reshape(n_paths, 2, n_states).copy()
+        x[:, 0] -= targets
+        paths = np.zeros((n_paths, n_timesteps, 2, n_states))
+        # the step the current segment of each path starts on
+        start = np.zeros(n_paths, dtype=int)
+        pending = np.arange(n_paths)
+        while len(pending) > 0:
+            first_step = np.min(start[pending])
+            steps = np.arange(first_step, n_timesteps)
+            near = np.linalg.norm(x[pending, 0], axis=1) < self.threshold
+            offset = steps[None, :] - start[pending, None]
+            # the transition from the start of each path's segment, with
+            # a trailing axis to broadcast along the dimensions
+            transition = powers[near.astype(int)[:, None],
+                                np.maximum(offset, 0), :, :, None]
+            distance = x[pending, None, 0]
+            velocity = x[pending, None, 1]
+            segments = np.stack([
+                transition[:, :, 0, 0] * distance +
+                transition[:, :, 0, 1] * velocity,
+                transition[:, :, 1, 0] * distance +
+                transition[:, :, 1, 1] * velocity], axis=2)
+
+            # the segments are valid up to the first state that
+            # switches gain, which starts the next segment
+            switched = (offset > 0) & (
+                (np.linalg.norm(segments[:, :, 0], axis=2) <
+                 self.threshold) != near[:, None])
+            has_switched = np.any(switched, axis=1)
+            last = np.where(has_switched, np.argmax(switched, axis=1),
+                            len(steps) - 1)
+            valid = (offset >= 0) & (np.arange(len(steps)) <= last[:, None])
+            paths[pending, first_step:] = np.where(
+                valid[:, :, None, None], segments,
+                paths[pending, first_step:])
+
+            pending_paths = np.flatnonzero(
+                has_switched & (last < len(steps) - 1))
+            x[pending[pending_paths]] = segments[
+                pending_paths, last[pending_paths]]
+            start[pending[pending_paths]] = steps[last[pending_paths]]
+            pending = pending[pending_paths]
+
+        paths[:, :, 0] += targets[:, None]
+        paths = paths.reshape(n_paths, n_timesteps, 2 * n_states)
+        paths[:, 0] = states
+        return paths
+
+    def transition_powers(self, w, n_powers):
+        """ Returns the first n_powers powers of the transition matrix of
+        one step of the filter, for the distance to the target and the
+        velocity of a dimension
+
+        Parameters
+        ----------
+        w : float
+            the gain of the filter
+        n_powers : int
+            the number of powers, starting from the identity
+        """
+        dt = self.dt
+        damping = 1 - self.zeta * w * dt
+        # the velocity is updated first, and then used for the position
+        transition = np.array([[1 - w**2 * dt**2, dt * damping],
+                               [-w**2 * dt, damping]])
+
+        powers = np.zeros((n_powers, 2, 2))
+        powers[0] = np.eye(2)
+        size = 1
+        # transition**(size + ii) = transition**ii transition**size
+        while size < n_powers:
+            n_new = min(size, n_powers - size)
+            np.matmul(powers[:n_new], transition,
+                      out=powers[size:size + n_new])
+            transition = np.dot(transition, transition)
+            size += n_new
+        return powers
+
+    @property
+    def trajectory(self):
+        """ The (n_timesteps, 2 * n_states) target positions and
+        velocities at each time step """
+        if self._trajectory is None and self._segment_starts is not None:
+            self._trajectory = self.evaluate(
+                np.arange(self.n_timesteps) * self.dt)
+        return self._trajectory
+
+    def evaluate(self, t):
+        """ Return the target point at time t along the generated path,
+        holding the last point once it is reached
+
+        The point is found from the start of the segment of the path
+        containing it, with the power of the transition matrix for the
+        number of steps since then.
+
+        Parameters
+        ----------
+        t : float or numpy.array
+            the time since the start of the path [seconds]
+        """
+        index = np.clip(np.round(np.asarray(t) / self.dt).astype(int),
+                        0, self.n_timesteps - 1)
+        segment = np.searchsorted(
+            self._segment_starts, index, side='right') - 1
+        transition = self._powers[self._segment_near[segment],
+                                  index - self._segment_starts[segment]]
+        x = np.matmul(transition, self._segment_states[segment])
+        x[..., 0, :] += self.target_pos
+        return x.reshape(x.shape[:-2] + (-1,))
+
     def next_target(self):
         """ Return the next target point along the generated trajectory """
 
         # get the next target state if we're not at the end of the trajectory
-        self.target = (self.trajectory[self.n]
-                       if self.n < self.n_timesteps else self.target)
+        self.target = self.evaluate(
+            min(self.n, self.n_timesteps - 1) * self.dt)
         self.n += 1
 
         return self.target
@@ -1,3 +1,9 @@
 from .avoid_obstacles import AvoidObstacles
 from .avoid_joint_limits import AvoidJointLimits
 from .dynamics_adaptation import DynamicsAdaptation
+from .avoid_distance_field import AvoidDistanceField
+from .avoid_self_collision import AvoidSelfCollision
+from .async_adaptation import AsyncAdaptation
+from .offline_trainer import OfflineTrainer
+from .feature_adaptation import FeatureAdaptation
+from .tiled_adaptation import TiledAdaptation
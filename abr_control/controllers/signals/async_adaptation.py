@@ -0,0 +1,201 @@
+import threading
+import time
+
+import numpy as np
+
+
+class SharedSlot():
+    """ Holds the most recent value written, without locks
+
+    A sequence counter is incremented before and after each write, so it
+    is odd while a write is in progress. Readers copy the values and
+    check the counter didn't change while they did, trying again if it
+    did, so a reader never sees a half written value and never blocks the
+    writer. Only one thread should write to a slot.
+
+    Parameters
+    ----------
+    size : int
+        the number of values stored
+    buffer : writable buffer, optional (Default: None)
+        memory to store the slot in, such as a
+        multiprocessing.shared_memory.SharedMemory.buf, so that the slot
+        can be shared with another process. Needs space for size + 1
+        64 bit values. If None, memory is allocated
+    """
+
+    def __init__(self, size, buffer=None):
+        if buffer is None:
+            data = np.zeros(size + 1)
+        else:
+            data = np.frombuffer(buffer, dtype='float64', count=size + 1)
+        self.size = size
+        self._sequence = data[:1].view('int64')
+        self._values = data[1:]
+
+    @property
+    def sequence(self):
+        """ The number of writes made to the slot """
+        return int(self._sequence[0]) // 2
+
+    def write(self, values):
+        """ Replaces the stored values
+
+        Parameters
+        ----------
+        values : np.array
+            the new values
+        """
+        self._sequence[0] += 1
+        self._values[:] = values
+        self._sequence[0] += 1
+
+    def read(self, out=None):
+        """ Returns a copy of the most recent values, and the number of
+        writes made before them
+
+        Parameters
+        ----------
+        out : np.array, optional (Default: None)
+            array to copy the values into
+        """
+        if out is None:
+            out = np.zeros(self.size)
+        while True:
+            sequence = int(self._sequence[0])
+            if sequence % 2 == 0:
+                out[:] = self._values
+                if int(self._sequence[0]) == sequence:
+                    return out, sequence // 2
+            # a write is in progress, let the writer finish
+            time.sleep(0)
+
+
+class AsyncAdaptation():
+    """ Runs an adaptive signal in a background thread, so that a slow
+    learning step never delays the control loop
+
+    Each call to generate stores the input and training signal in a
+    shared slot and returns the most recent adaptive output right away.
+    The worker thread repeatedly runs the adaptation on the newest input
+    it finds, skipping any it was too slow to get to, and stores the
+    result in an output slot.
+
+    The output returned lags behind the input, how far is available as
+    staleness, the number of generate calls since the input that the
+    output was found from, and as age, the time since it was found.
+
+    Parameters
+    ----------
+    adaptation : class instance
+        the adaptive signal to run, such as DynamicsAdaptation, with a
+        generate(input_signal, training_signal) function
+    n_input : int
+        the number of inputs going into the adaptive signal
+    n_output : int
+        the number of outputs expected from the adaptive signal
+    start : boolean, optional (Default: True)
+        True to start the worker thread right away
+    """
+
+    def __init__(self, adaptation, n_input, n_output, start=True):
+        self.adaptation = adaptation
+        self.n_input = n_input
+        self.n_output = n_output
+
+        # the input signal and training signal
+        self._input_slot = SharedSlot(n_input + n_output)
+        # the output, the input sequence number it was found from,
+        # and the time it was found
+        self._output_slot = SharedSlot(n_output + 2)
+        self._inputs = np.zeros(n_input + n_output)
+        self._outputs = np.zeros(n_output + 2)
+        self._outputs[-1] = np.nan
+        self._output_slot.write(self._outputs)
+
+        self._new_input = threading.Event()
+        self._running = False
+        self._thread = None
+        self._error = None
+
+        if start:
+            self.start()
+
+    def start(self):
+        """ Starts the worker thread """
+        if self._running:
+            return
+        self._running = True
+        self._error = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stops the worker thread, after it finishes its current step,
+        so that the adaptation can be used, for example to save weights
+        """
+        self._running = False
+        self._new_input.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """ Runs the adaptation on the newest input until stopped """
+        inputs = np.zeros(self.n_input + self.n_output)
+        outputs = np.zeros(self.n_output + 2)
+        last_sequence = 0
+        try:
+            while self._running:
+                inputs, sequence = self._input_slot.read(out=inputs)
+                if sequence == last_sequence:
+                    # wait for a new input
+                    self._new_input.wait()
+                    self._new_input.clear()
+                    continue
+                last_sequence = sequence
+
+                outputs[:-2] = self.adaptation.generate(
+                    inputs[:self.n_input], inputs[self.n_input:])
+                outputs[-2] = sequence
+                outputs[-1] = time.time()
+                self._output_slot.write(outputs)
+        except Exception as e:
+            self._error = e
+            self._running = False
+
+    def generate(self, input_signal, training_signal):
+        """ Stores the signals for the worker, and returns the most recent
+        adaptive output, zeros until the first is found
+
+        Parameters
+        ----------
+        input_signal : numpy.array
+            the current desired input signal, typical joint positions and
+            velocities in [rad] and [rad/sec] respectively
+        training_signal : numpy.array
+            the learning signal to drive adaptation
+        """
+        if self._error is not None:
+            raise Exception('Adaptation worker failed: %s' % self._error)
+
+        self._inputs[:self.n_input] = input_signal
+        self._inputs[self.n_input:] = training_signal
+        self._input_slot.write(self._inputs)
+        self._new_input.set()
+
+        self._output_slot.read(out=self._outputs)
+        return np.copy(self._outputs[:-2])
+
+    @property
+    def staleness(self):
+        """ The number of generate calls made since the input used to
+        find the last output returned """
+        return self._input_slot.sequence - int(self._outputs[-2])
+
+    @property
+    def age(self):
+        """ The time since the last output returned was found [seconds],
+        nan if there is no output yet """
+        return time.time() - self._outputs[-1]
@@ -0,0 +1,317 @@
+import hashlib
+import os
+
+import numpy as np
+from scipy import ndimage
+
+import abr_control.utils.os_utils
+from abr_control.utils.paths import cache_dir
+from .signal import Signal
+
+
+class AvoidDistanceField(Signal):
+    """ Avoids obstacles described by a voxel grid or point cloud
+
+    A signed distance field, and its gradient, is found once for the whole
+    environment and stored as a memory-mapped array in the cache folder,
+    which keeps the most recently used fields.
+    Each step the arm segments are sampled at evenly spaced points, and the
+    distance to the nearest obstacle and the direction away from it are
+    found by trilinear interpolation of the field. The closest point of
+    each segment is pushed away as in (Khatib, 1987), so the cost per step
+    does not depend on the number of obstacles.
+
+    Voxel (i, j, k) is centered at origin + voxel_size * (i, j, k). Points
+    outside of the grid are treated as being far from any obstacle.
+
+    Parameters
+    ----------
+    robot_config : class instance
+        contains all relevant information about the arm
+        such as: number of joints, number of links, mass information etc.
+    shape : tuple of ints
+        the number of voxels along the x, y, and z axes
+    origin : np.array, optional (Default: [0, 0, 0])
+        the (x, y, z) center of the first voxel [meters]
+    voxel_size : float, optional (Default: 0.05)
+        the length of each side of a voxel [meters]
+    occupancy : np.array, optional (Default: None)
+        boolean array of the given shape, True where there is an obstacle
+    points : np.array, optional (Default: None)
+        (x, y, z) points on the surface of obstacles, such as a point
+        cloud, the voxels containing them are marked as occupied
+    threshold : float, optional (Default: 0.2)
+        how close is the system allowed to get to obstacles
+    n_samples : int, optional (Default: 5)
+        number of points checked along each arm segment
+    n_cached : int, optional (Default: 8)
+        the number of distance fields kept in the cache folder, the least
+        recently used are deleted. If 0 the field is generated in memory
+        and not saved to file
+    """
+
+    def __init__(self, robot_config, shape, origin=None, voxel_size=.05,
+                 occupancy=None, points=None, threshold=.2, n_samples=5,
+                 n_cached=8):
+
+        super(AvoidDistanceField, self).__init__(robot_config)
+
+        self.shape = tuple(int(n) for n in shape)
+        self.origin = (np.zeros(3) if origin is None
+                       else np.array(origin, dtype='float'))
+        self.voxel_size = float(voxel_size)
+        self.threshold = threshold
+        self.n_cached = n_cached
+
+        if occupancy is None:
+            occupancy = np.zeros(self.shape, dtype=bool)
+        elif occupancy.shape != self.shape:
+            raise Exception('Occupancy grid shape %s does not match %s'
+                            % (occupancy.shape, self.shape))
+        self.occupancy = np.array(occupancy, dtype=bool)
+        if points is not None:
+            self.occupancy[self._voxels(points)] = True
+
+        # fraction of the way along each segment of each sampled point
+        self._t = np.linspace(0, 1, n_samples)[None, :, None]
+        # offsets to the 8 neighbouring voxels used for interpolation
+        self._corners = np.array(
+            [[ii, jj, kk] for ii in (0, 1) for jj in (0, 1) for kk in (0, 1)])
+
+        self.field = self._load_field()
+
+    def _voxels(self, points):
+        """ Returns the index of the voxels containing each point that is
+        inside the grid, as a tuple of x, y, and z indices
+
+        Parameters
+        ----------
+        points : np.array
+            the (x, y, z) points [meters]
+        """
+        index = np.round((np.asarray(points, dtype='float').reshape(-1, 3) -
+                          self.origin) / self.voxel_size).astype(int)
+        inside = np.all((index >= 0) & (index < self.shape), axis=1)
+        return tuple(index[inside].T)
+
+    def _load_field(self):
+        """ Loads the signed distance field from file, generating and
+        saving it to file if it hasn't been already """
+
+        if self.n_cached == 0:
+            print('Generating distance field for %i occupied voxels'
+                  % np.sum(self.occupancy))
+            return self._signed_distance(self.occupancy).astype('float32')
+
+        key = hashlib.sha1(np.packbits(self.occupancy).tobytes())
+        key.update(repr((self.shape, tuple(self.origin),
+                         self.voxel_size)).encode())
+        folder = os.path.join(cache_dir, 'distance_fields')
+        filename = os.path.join(folder, '%s.npy' % key.hexdigest())
+
+        if not os.path.isfile(filename):
+            print('Generating distance field for %i occupied voxels'
+                  % np.sum(self.occupancy))
+            abr_control.utils.os_utils.makedirs(folder)
+            # write to a temporary file and rename when done, so that
+            # interrupted builds aren't loaded in later
+            tmp_filename = filename[:-4] + '.tmp.npy'
+            field = np.lib.format.open_memmap(
+                tmp_filename, mode='w+', dtype='float32',
+                shape=self.shape + (4,))
+            field[...] = self._signed_distance(self.occupancy)
+            field.flush()
+            del field
+            os.rename(tmp_filename, filename)
+            self._trim_cache(folder)
+        else:
+            # mark the field as recently used
+            os.utime(filename, None)
+
+        # copy-on-write, so that added points don't change the saved field
+        return np.load(filename, mmap_mode='c')
+
+    def _trim_cache(self, folder):
+        """ Deletes the least recently used distance fields, keeping
+        n_cached of them
+
+        Parameters
+        ----------
+        folder : string
+            the folder the distance fields are saved in
+        """
+        filenames = [
+            os.path.join(folder, name) for name in os.listdir(folder)
+            if name.endswith('.npy') and not name.endswith('.tmp.npy')]
+        filenames.sort(key=os.path.getmtime, reverse=True)
+        for filename in filenames[self.n_cached:]:
+            try:
+                os.remove(filename)
+            except OSError:
+                # removed by another process
+                pass
+
+    def _signed_distance(self, occupancy):
+        """ Returns the signed distance to the surface of the obstacles,
+        negative inside obstacles, and its gradient, stacked along the
+        last axis
+
+        Parameters
+        ----------
+        occupancy : np.array
+            boolean array, True where there is an obstacle
+        """
+        if not np.any(occupancy):
+            # further away than any point in the grid
+            distance = np.ones(occupancy.shape) * self.voxel_size * np.sqrt(
+                np.sum(np.array(self.shape)**2))
+        else:
+            distance = (ndimage.distance_transform_edt(~occupancy) -
+                        ndimage.distance_transform_edt(occupancy))
+            distance *= self.voxel_size
+
+        field = np.zeros(occupancy.shape + (4,))
+        field[..., 0] = distance
+        field[..., 1:] = self._gradient(distance)
+        return field
+
+    def _gradient(self, distance):
+        """ Returns the gradient of the distance field, stacked along
+        the last axis
+
+        Parameters
+        ----------
+        distance : np.array
+            the signed distance at each voxel
+        """
+        gradient = np.zeros(distance.shape + (3,))
+        for ii in range(3):
+            # np.gradient needs at least 2 voxels along an axis
+            if distance.shape[ii] > 1:
+                gradient[..., ii] = np.gradient(
+                    distance, self.voxel_size, axis=ii)
+        return gradient
+
+    def add_points(self, points):
+        """ Marks the voxels containing points as occupied, and updates
+        the distance field around them
+
+        Only a window around the new points, out to the threshold, is
+        recalculated. Distances outside of obstacles are exact inside the
+        window, distances inside obstacles can be overestimated near the
+        edges of the window.
+
+        Parameters
+        ----------
+        points : np.array
+            (x, y, z) points on the surface of obstacles [meters]
+        """
+        voxels = self._voxels(points)
+        if len(voxels[0]) == 0:
+            return
+        self.occupancy[voxels] = True
+
+        # the window, plus 1 voxel on each side to find the gradient
+        pad = int(np.ceil(self.threshold / self.voxel_size)) + 2
+        lower = np.maximum(np.min(voxels, axis=1) - pad, 0)
+        upper = np.minimum(np.max(voxels, axis=1) + pad + 1, self.shape)
+        window = tuple(slice(lo, hi) for lo, hi in zip(lower, upper))
+
+        field = self._signed_distance(self.occupancy[window])
+        old = np.asarray(self.field[window][..., 0])
+        # outside of obstacles the distance can only decrease, and any
+        # obstacle closer than the new distance is already in old
+        free = ~self.occupancy[window]
+        field[..., 0][free] = np.minimum(old[free], field[..., 0][free])
+        distance = field[..., 0]
+        field[..., 1:] = self._gradient(distance)
+
+        # don't write the gradient on the edges of the window,
+        # unless it's also the edge of the grid
+        inner = tuple(
+            slice(0 if lo == 0 else 1, None if hi == n else -1)
+            for lo, hi, n in zip(lower, upper, self.shape))
+        self.field[window][..., 0] = distance
+        self.field[window][inner + (slice(1, None),)] = (
+            field[inner + (slice(1, None),)])
+
+    def lookup(self, points):
+        """ Returns the signed distance to the nearest obstacle and its
+        gradient at each point, found by trilinear interpolation
+
+        Parameters
+        ----------
+        points : np.array
+            the (x, y, z) points [meters]
+        """
+        points = np.asarray(points, dtype='float').reshape(-1, 3)
+        u = (points - self.origin) / self.voxel_size
+        upper = np.array(self.shape) - 1
+        # points on the upper faces of the grid interpolate from the
+        # last pair of voxels, with frac = 1
+        base = np.minimum(np.floor(u).astype(int), upper - 1)
+        frac = u - base
+
+        result = np.zeros((len(points), 4))
+        result[:, 0] = np.inf
+        inside = np.all((u >= 0) & (u <= upper), axis=1)
+        if not np.any(inside):
+            return result[:, 0], result[:, 1:]
+
+        base = base[inside]
+        frac = frac[inside]
+        # (n_points, 8, 3) indices of the neighbouring voxels
+        index = base[:, None, :] + self._corners
+        weights = np.prod(
+            np.where(self._corners, frac[:, None, :], 1 - frac[:, None, :]),
+            axis=2)
+        values = self.field[index[..., 0], index[..., 1], index[..., 2]]
+        result[inside] = np.sum(weights[:, :, None] * values, axis=1)
+        return result[:, 0], result[:, 1:]
+
+    def generate(self, q):
+        """ Generates the control signal
+
+        Parameters
+        ----------
+        q : np.array
+            the current joint angles [radians]
+        """
+
+        u_psp = np.zeros(self.robot_config.N_JOINTS, dtype='float32')
+
+        # sample points along each arm segment
+        joints = self._joint_positions(q)
+        points = joints[:-1, None] + self._t * (joints[1:] - joints[:-1])[
+            :, None]
+        distance, gradient = self.lookup(points.reshape(-1, 3))
+        distance = distance.reshape(points.shape[:2])
+        gradient = gradient.reshape(points.shape)
+
+        # use the closest sampled point of each segment
+        closest = np.argmin(distance, axis=1)
+        segments = np.arange(len(points))
+        # set a minimum distance so the control signal
+        # doesn't grow unbounded, value chosen empirically
+        rho = np.maximum(distance[segments, closest], self.threshold/50)
+        segments = segments[rho < self.threshold]
+        if len(segments) == 0:
+            return u_psp
+
+        closest = closest[segments]
+        rho = rho[segments][:, None]
+        # the gradient points away from the obstacle, drhodx points
+        # towards it as in AvoidObstacles, _project_forces pushes against it
+        drhodx = -gradient[segments, closest]
+        norm = np.sqrt(np.sum(drhodx**2, axis=1))[:, None]
+        drhodx = drhodx / np.maximum(norm, 1e-8)
+
+        eta = .02
+        Fpsp = (eta * (1.0/rho - 1.0/self.threshold) *
+                1.0/rho**1.5 * drhodx)
+
+        M_inv = np.linalg.inv(self.robot_config.M(q))
+        u_psp += self._project_forces(
+            q, segments, points[segments, closest], Fpsp, M_inv)
+
+        return u_psp
@@ -1,5 +1,6 @@
 import numpy as np
 
+from abr_control.utils.spatial_grid import SpatialGrid
 from .signal import Signal
 
 
@@ -17,20 +18,35 @@ class AvoidObstacles(Signal):
         ex: obstacles = [obs1, obs2, obs3] where obs1 = [x1, y1, z1, radius]
     threshold : float, optional (Default: 0.2)
         how close is the system allowed to get to obstacles
+    broadphase : boolean, optional (Default: False)
+        if True, the obstacles are stored in a uniform spatial grid and
+        only obstacles near the bounding box of each arm segment are
+        checked, recommended for large numbers of obstacles
+    cell_size : float, optional (Default: None)
+        the size of the broadphase grid cells [meters],
+        if None the threshold is used
     """
 
-    def __init__(self, robot_config, obstacles=None, threshold=.2):
+    def __init__(self, robot_config, obstacles=None, threshold=.2,
+                 broadphase=False, cell_size=None):
 
         super(AvoidObstacles, self).__init__(robot_config)
 
         self.threshold = threshold
+        self.grid = None
+        if broadphase:
+            self.grid = SpatialGrid(
+                threshold if cell_size is None else cell_size)
         obstacles = [] if obstacles is None else obstacles
-        self.obstacles = np.array(obstacles)
+        self.set_obstacles(obstacles)
 
-
-    def generate(self, q):  # noqa901
+    def generate(self, q):
         """ Generates the control signal
 
+        The distance from every obstacle to every arm segment is found at
+        once, and only the obstacle and segment pairs closer than the
+        threshold go through the Jacobian calculations.
+
         Parameters
         ----------
         q : np.array
@@ -38,70 +54,50 @@ class AvoidObstacles(Signal):
         """
 
         u_psp = np.zeros(self.robot_config.N_JOINTS, dtype='float32')
+        if len(self.obstacles) == 0:
+            return u_psp
+
+        # the start and end-points of each arm segment
+        joints = self._joint_positions(q)
+        obstacles = self.obstacles
+        if self.grid is not None:
+            obstacles = obstacles[self._candidates(joints)]
+            if len(obstacles) == 0:
+                return u_psp
+        p1 = joints[:-1]
+        vec_line = joints[1:] - p1
+        length2 = np.sum(vec_line**2, axis=1)
+        # treat segments of zero length as a point
+        length2[length2 == 0] = np.inf
+
+        # our vertex of interest is the center point of the obstacle
+        v = obstacles[:, None, :3]
+        # calculate the projection normalized by length of arm segment,
+        # clipped so the closest point is on the segment
+        projection = np.clip(
+            np.sum((v - p1) * vec_line, axis=2) / length2, 0, 1)
+        closest = p1 + projection[:, :, None] * vec_line
+        # calculate distance from obstacle vertex to the closest point
+        dist = np.sqrt(np.sum((v - closest)**2, axis=2))
+        # account for size of obstacle
+        # also set a minimum distance so the control signal
+        # doesn't grow unbounded, value chosen empirically
+        rho = np.maximum(dist - obstacles[:, 3:4], self.threshold/50)
+
+        obstacle_index, segments = np.nonzero(rho < self.threshold)
+        if len(segments) == 0:
+            return u_psp
+
+        closest = closest[obstacle_index, segments]
+        rho = rho[obstacle_index, segments][:, None]
+        eta = .02  # feel like i saw 4 somewhere in the paper
+        drhodx = (obstacles[obstacle_index, :3] - closest) / rho
+        Fpsp = (eta * (1.0/rho - 1.0/self.threshold) *
+                1.0/rho**1.5 * drhodx)
 
         # calculate the inertia matrix in joint space
-        M = self.robot_config.M(q)
-
-        # add in obstacle avoidance
-        for obstacle in self.obstacles:
-            # our vertex of interest is the center point of the obstacle
-            v = np.array(obstacle[:3], dtype='float32')
-
-            # find the closest point of each link to the obstacle
-            for ii in range(self.robot_config.N_JOINTS):
-                # get the start and end-points of the arm segment
-                p1 = self.robot_config.Tx('joint%i' % ii, q=q)
-                if ii == self.robot_config.N_JOINTS - 1:
-                    p2 = self.robot_config.Tx('EE', q=q)
-                else:
-                    p2 = self.robot_config.Tx('joint%i' % (ii + 1), q=q)
-
-                # calculate minimum distance from arm segment to obstacle
-                # the vector of our line
-                vec_line = p2 - p1
-                # the vector from the obstacle to the first line point
-                vec_ob_line = v - p1
-                # calculate the projection normalized by length of arm segment
-                projection = (np.dot(vec_ob_line, vec_line)
-                              / np.sum((vec_line)**2))
-                if projection < 0:
-                    # then closest point is the start of the segment
-                    closest = p1
-                elif projection > 1:
-                    # then closest point is the end of the segment
-                    closest = p2
-                else:
-                    closest = p1 + projection * vec_line
-                # calculate distance from obstacle vertex to the closest point
-                dist = np.sqrt(np.sum((v - closest)**2))
-                # account for size of obstacle
-                # also set a minimum distance so the control signal
-                # doesn't grow unbounded, value chosen empirically
-                rho = max(dist - obstacle[3], self.threshold/50)
-
-                if rho < self.threshold:
-
-                    eta = .02  # feel like i saw 4 somewhere in the paper
-                    drhodx = (v - closest) / rho
-                    Fpsp = (eta * (1.0/rho - 1.0/self.threshold) *
-                            1.0/rho**1.5 * drhodx)
-
-                    # get offset of closest point from link's reference frame
-                    # NOTE: the relevant link is i+1, because the configuration
-                    # scripts are set up so link 0 is from origin to joint 0
-                    T_inv = self.robot_config.T_inv('link%i' % (ii+1), q=q)
-                    m = np.dot(T_inv, np.hstack([closest, [1]]))[:-1]
-                    # calculate the Jacobian for this point
-                    Jpsp = self.robot_config.J('link%i' % (ii+1), x=m, q=q)[:3]
-
-                    # calculate the inertia matrix for the
-                    # point subjected to the potential space
-                    Mxpsp_inv = np.dot(Jpsp, np.dot(np.linalg.inv(M), Jpsp.T))
-                    # using the rcond to set singular values < thresh to 0
-                    # is slightly faster than doing it manually with svd
-                    Mxpsp = np.linalg.pinv(Mxpsp_inv, rcond=.01)
-
-                    u_psp += -np.dot(Jpsp.T, np.dot(Mxpsp, Fpsp))
+        M_inv = np.linalg.inv(self.robot_config.M(q))
+        u_psp += self._project_forces(q, segments, closest, Fpsp, M_inv)
 
         return u_psp
 
@@ -116,4 +112,42 @@ class AvoidObstacles(Signal):
             ex: ostacles = [obs1, obs2, obs3] where obs1 = [x1, y1, z1, radius]
         """
 
-        self.obstacles = np.copy(obstacles)
+        self.obstacles = np.array(obstacles, dtype='float').reshape(-1, 4)
+        if self.grid is not None:
+            self.grid.build(self.obstacles[:, :3], self.obstacles[:, 3])
+
+    def update_obstacles(self, indices, obstacles):
+        """ Changes the location and size of some of the obstacles
+
+        Only the moved obstacles are updated in the broadphase grid, which
+        is much faster than set_obstacles for large numbers of obstacles.
+
+        Parameters
+        ----------
+        indices : list of ints
+            the index of each obstacle to change
+        obstacles : list of list of floats
+            the new Cartesian coordinates and radius of each obstacle
+            ex: obstacles = [obs1, obs2] where obs1 = [x1, y1, z1, radius]
+        """
+
+        obstacles = np.array(obstacles, dtype='float').reshape(-1, 4)
+        self.obstacles[indices] = obstacles
+        if self.grid is not None:
+            self.grid.update(indices, obstacles[:, :3], obstacles[:, 3])
+
+    def _candidates(self, joints):
+        """ Returns the indices of the obstacles that may be within the
+        threshold of any arm segment, from the broadphase grid
+
+        Parameters
+        ----------
+        joints : np.array
+            the position of each joint and the end-effector
+        """
+
+        candidates = [
+            self.grid.query(np.minimum(p1, p2) - self.threshold,
+                            np.maximum(p1, p2) + self.threshold)
+            for p1, p2 in zip(joints[:-1], joints[1:])]
+        return np.unique(np.hstack(candidates)).astype(int)
@@ -0,0 +1,152 @@
+import numpy as np
+
+from .signal import Signal
+
+
+class AvoidSelfCollision(Signal):
+    """ Keeps the arm segments from colliding with each other
+
+    Each arm segment, from joint ii to joint ii+1 (or the end-effector),
+    is modelled as a capsule. The closest points between every pair of
+    capsules that are not next to each other are found at once, and pairs
+    closer than the threshold are pushed apart as in (Khatib, 1987).
+
+    Parameters
+    ----------
+    robot_config : class instance
+        contains all relevant information about the arm
+        such as: number of joints, number of links, mass information etc.
+    radii : list of floats, optional (Default: 0.05 for each segment)
+        the radius of each capsule [meters]
+    threshold : float, optional (Default: 0.1)
+        how close the surfaces of the capsules are allowed to get [meters]
+    pairs : list of tuples of ints, optional (Default: None)
+        the segment pairs to check, if None every pair of segments that
+        are far enough apart along the arm to be pushed away from each
+        other are checked, i.e. the segments between them are longer than
+        the threshold plus the radii of the pair. This skips neighbouring
+        segments, and segments on either side of a short wrist
+    """
+
+    def __init__(self, robot_config, radii=None, threshold=.1, pairs=None):
+
+        super(AvoidSelfCollision, self).__init__(robot_config)
+
+        n_segments = robot_config.N_JOINTS
+        if radii is None:
+            radii = [.05] * n_segments
+        self.radii = np.array(radii, dtype='float')
+        self.threshold = threshold
+
+        if pairs is None:
+            # segment lengths don't change, so find them at any position
+            joints = self._joint_positions(np.zeros(n_segments))
+            length = np.sqrt(np.sum(np.diff(joints, axis=0)**2, axis=1))
+            pairs = [(ii, jj) for ii in range(n_segments)
+                     for jj in range(ii + 2, n_segments)
+                     if np.sum(length[ii+1:jj]) > (
+                         self.radii[ii] + self.radii[jj] + threshold)]
+        self.pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+
+    @staticmethod
+    def closest_points(p1, q1, p2, q2):
+        """ Finds the closest points between pairs of line segments
+
+        Returns the fraction of the way along each segment of the closest
+        points, from (Ericson, 2005), vectorized over all pairs
+
+        Parameters
+        ----------
+        p1, q1 : np.array
+            the (x, y, z) start and end-points of the first segments
+        p2, q2 : np.array
+            the (x, y, z) start and end-points of the second segments
+        """
+        eps = 1e-12
+        d1 = q1 - p1
+        d2 = q2 - p2
+        r = p1 - p2
+        a = np.sum(d1 * d1, axis=-1)
+        e = np.sum(d2 * d2, axis=-1)
+        f = np.sum(d2 * r, axis=-1)
+        c = np.sum(d1 * r, axis=-1)
+        b = np.sum(d1 * d2, axis=-1)
+        denom = a * e - b * b
+
+        a_safe = np.where(a > eps, a, 1.0)
+        e_safe = np.where(e > eps, e, 1.0)
+
+        # closest point on the infinite lines, clamped to the first segment,
+        # if the lines are parallel pick the start of the first segment
+        s = np.where(denom > eps,
+                     np.clip((b * f - c * e) / np.where(
+                         denom > eps, denom, 1.0), 0, 1),
+                     0.0)
+        t = (b * s + f) / e_safe
+        # if the closest point is past the end of the second segment,
+        # clamp it and recompute the closest point on the first segment
+        s = np.where(t < 0, np.clip(-c / a_safe, 0, 1), s)
+        s = np.where(t > 1, np.clip((b - c) / a_safe, 0, 1), s)
+        t = np.clip(t, 0, 1)
+
+        # segments that are only a point
+        s = np.where(a <= eps, 0.0, s)
+        t = np.where(a <= eps, np.clip(f / e_safe, 0, 1), t)
+        s = np.where(e <= eps, np.clip(-c / a_safe, 0, 1), s)
+        t = np.where(e <= eps, 0.0, t)
+        s = np.where((a <= eps) & (e <= eps), 0.0, s)
+
+        return s, t
+
+    def generate(self, q):
+        """ Generates the control signal
+
+        Parameters
+        ----------
+        q : np.array
+            the current joint angles [radians]
+        """
+
+        u_psp = np.zeros(self.robot_config.N_JOINTS, dtype='float32')
+        if len(self.pairs) == 0:
+            return u_psp
+
+        # the start and end-points of each arm segment
+        joints = self._joint_positions(q)
+        starts = joints[:-1]
+        vec_line = joints[1:] - starts
+
+        first, second = self.pairs.T
+        s, t = self.closest_points(
+            starts[first], joints[1:][first],
+            starts[second], joints[1:][second])
+        closest1 = starts[first] + s[:, None] * vec_line[first]
+        closest2 = starts[second] + t[:, None] * vec_line[second]
+        # from each closest point on the first segment towards the second,
+        # _project_forces pushes the first point against this direction
+        vec = closest2 - closest1
+        dist = np.sqrt(np.sum(vec**2, axis=1))
+        # account for the size of the capsules
+        # also set a minimum distance so the control signal
+        # doesn't grow unbounded, value chosen empirically
+        rho = np.maximum(dist - self.radii[first] - self.radii[second],
+                         self.threshold/50)
+
+        close = np.nonzero(rho < self.threshold)[0]
+        if len(close) == 0:
+            return u_psp
+
+        rho = rho[close][:, None]
+        drhodx = vec[close] / np.maximum(dist[close], 1e-8)[:, None]
+        eta = .02
+        Fpsp = (eta * (1.0/rho - 1.0/self.threshold) *
+                1.0/rho**1.5 * drhodx)
+
+        # push each closest point away from the other
+        M_inv = np.linalg.inv(self.robot_config.M(q))
+        u_psp += self._project_forces(
+            q, np.hstack([first[close], second[close]]),
+            np.vstack([closest1[close], closest2[close]]),
+            np.vstack([Fpsp, -Fpsp]), M_inv)
+
+        return u_psp
@@ -1,14 +1,18 @@
-import glob
+import collections
+import hashlib
 import logging
 import os
-import struct
+import time
 
-import redis
 import numpy as np
 import scipy.special
 
-# import abr_control.utils.os_utils
+import abr_control.utils.os_utils
+from abr_control.utils import checkpoints
 from abr_control.utils.paths import cache_dir
+from abr_control.utils.spike_publisher import SpikePublisher
+from abr_control.utils.weight_telemetry import WeightTelemetry
+from .numpy_engine import NumpyEngine
 
 try:
     import nengo
@@ -21,8 +25,6 @@ except ImportError:
     raise Exception('Nengo_extras module needs to be installed to ' +
                     'bootstrap learning.')
 
-r = redis.StrictRedis(host='127.0.0.1')
-
 
 class DynamicsAdaptation():
     """ An implementation of nonlinear dynamics adaptation using Nengo,
@@ -52,7 +54,9 @@ class DynamicsAdaptation():
     weights_file : string, optional (Default: None)
         path to file where learned weights are saved
     backend : string, optional (Default: nengo)
-        {'nengo', 'nengo_ocl', 'nengo_spinnaker'}
+        {'nengo', 'nengo_ocl', 'nengo_spinnaker', 'numpy'}
+        'numpy' builds the Nengo model once, and then runs the ensembles
+        and learning rule directly with NumPy instead of a Nengo simulator
     session: int, optional (Default: None)
         if doing multiple sessions of n runs to average over.
         if set to None it will search for the most recent session
@@ -73,13 +77,39 @@ class DynamicsAdaptation():
         the function that nengo will try to approximate to bootstrap learning.
         This provides nengo with a starting point for adaptation instead of
         learning from zeros
-    send_redis_spikes: boolean, optional (Default: False)
+    send_redis_spikes: boolean or dict, optional (Default: False)
         True to send spiking information to redis for display purposes (mainly
-        used with vrep_display.py)
-    probe_weights: boolean, optional (Default: False)
-        True to get decoders
+        used with vrep_display.py), from a background thread so the control
+        loop is never delayed, or a dict of parameters for the
+        SpikePublisher, such as host and encoding
+    probe_weights: boolean or dict, optional (Default: False)
+        True to record the learned weights in weights_telemetry, sampled
+        every 100 steps and keeping the last 100 samples, or a dict of
+        parameters for the WeightTelemetry, such as sample_every,
+        buffer_size, and filename
     debug_print: boolean optional (Default: False)
         True to display debug print statements
+    sparse: boolean, optional (Default: False)
+        True to only decode from and train the weights of the currently
+        active neurons each step, numpy backend only. The neurons are
+        still all simulated, so this only helps when decoding and
+        learning are a large part of each step, with many outputs or
+        many neurons, see NumpyEngine
+    n_workers: int, optional (Default: 1)
+        number of threads to run the ensembles in parallel with, numpy
+        backend only. Each thread runs n_ensembles / n_workers ensembles
+        and their outputs are summed
+    weights_dtype: string, optional (Default: 'float64')
+        {'float64', 'float32', 'int16'} how the learned weights are stored
+        and updated, numpy backend only. 'int16' stores each row of
+        weights as integers with a shared scale, and stochastically rounds
+        the learning updates, see NumpyEngine. Weights are saved by
+        save_weights in the same format
+    cache_build: boolean, optional (Default: True)
+        True to save the encoders, gains, and biases of the adaptive
+        ensembles, and the solved decoders, in the cache folder, so that
+        creating the same network with the same seed again doesn't
+        need to generate or solve for them. Only used if seed is set
     """
 
     def __init__(self, n_input, n_output, n_neurons=1000, n_ensembles=1,
@@ -87,7 +117,17 @@ class DynamicsAdaptation():
                  weights_file=None, backend='nengo', session=None,
                  run=None, test_name='test', autoload=False,
                  function=None, send_redis_spikes=False, encoders=None,
-                 probe_weights=False, debug_print=False, **kwargs):
+                 probe_weights=False, debug_print=False, sparse=False,
+                 n_workers=1, weights_dtype='float64', cache_build=True,
+                 **kwargs):
+
+        if sparse and backend != 'numpy':
+            raise Exception('Sparse updates require the numpy backend')
+        if n_workers > 1 and backend != 'numpy':
+            raise Exception('Parallel ensembles require the numpy backend')
+        if weights_dtype != 'float64' and backend != 'numpy':
+            raise Exception('Low precision weights require the numpy '
+                            'backend')
 
         self.input_signal = np.zeros(n_input)
         self.training_signal = np.zeros(n_output)
@@ -102,11 +142,23 @@ class DynamicsAdaptation():
         if weights_file is None:
             weights_file = ''
 
+        # load the neuron parameters found the last time this network
+        # was built, if they were saved
+        build_file = None
+        cached = None
+        if cache_build and seed is not None and backend != 'nengo_spinnaker':
+            build_file = self.build_cache_location(
+                n_input, n_neurons, n_ensembles, seed, encoders, kwargs)
+            if os.path.isfile(build_file):
+                print('Loading cached neuron parameters from %s'
+                      % build_file)
+                cached = np.load(build_file)
+
         self.nengo_model = nengo.Network(seed=seed)
         self.nengo_model.config[nengo.Connection].synapse = None
 
         # Set the nerual model to use
-        if backend == 'nengo':
+        if backend in ('nengo', 'numpy'):
             self.nengo_model.config[nengo.Ensemble].neuron_type = nengo.LIF()
         elif backend == 'nengo_spinnaker':
             self.nengo_model.config[nengo.Ensemble].neuron_type = nengo.LIF()
@@ -140,29 +192,45 @@ class DynamicsAdaptation():
             self.conn_learn = []
 
             for ii in range(n_ensembles):
+                if cached is not None:
+                    # setting the gain and bias skips finding them
+                    # from the intercepts and maximum firing rates, the
+                    # encoders are already normalized and are used as is
+                    # so that the decoder cache finds the same key
+                    ens_params = {'encoders': cached['encoders'][ii],
+                                  'normalize_encoders': False,
+                                  'gain': cached['gain'][ii],
+                                  'bias': cached['bias'][ii]}
+                else:
+                    ens_params = {'intercepts': intercepts}
+                ens_params.update(kwargs)
                 self.adapt_ens.append(
                     nengo.Ensemble(
                         n_neurons=n_neurons,
                         dimensions=n_input,
-                        intercepts=intercepts,
                         radius=np.sqrt(n_input),
-                        **kwargs))
+                        **ens_params))
                 print('*** ENSEMBLE %i ***' % ii)
 
-                try:
-                    # if the NengoLib is installed, use it
-                    # to optimize encoder placement
-                    import nengolib
-                    if encoders is None:
-                        self.adapt_ens[ii].encoders = (
-                            nengolib.stats.ScatteredHypersphere(surface=True))
-                        print('NengoLib used to optimize encoders placement')
-                    else:
-                        self.adapt_ens[ii].encoders = encoders
-                        print('Using user defined encoder values')
-                except ImportError:
-                    print('Nengo lib not installed, encoder ' +
-                          'placement will be sub-optimal.')
+                if cached is not None:
+                    print('Using cached encoder values')
+                else:
+                    try:
+                        # if the NengoLib is installed, use it
+                        # to optimize encoder placement
+                        import nengolib
+                        if encoders is None:
+                            self.adapt_ens[ii].encoders = (
+                                nengolib.stats.ScatteredHypersphere(
+                                    surface=True))
+                            print('NengoLib used to optimize encoders '
+                                  'placement')
+                        else:
+                            self.adapt_ens[ii].encoders = encoders
+                            print('Using user defined encoder values')
+                    except ImportError:
+                        print('Nengo lib not installed, encoder ' +
+                              'placement will be sub-optimal.')
 
                 # hook up input signal to adaptive population for context
                 nengo.Connection(input_signals, self.adapt_ens[ii])
@@ -196,12 +264,12 @@ class DynamicsAdaptation():
                 else:
                     if backend == 'nengo_spinnaker':
                         if os.path.isfile('%s' % weights_file):
+                            weights = checkpoints.load_checkpoint(
+                                weights_file)
                             if n_ensembles == 1:
-                                transform = np.squeeze(
-                                    np.load(weights_file)['weights']).T
+                                transform = np.squeeze(weights).T
                             else:
-                                transform = np.squeeze(
-                                    np.load(weights_file)['weights'])[ii].T
+                                transform = np.squeeze(weights)[ii].T
                             print('Loading weights: \n', transform)
                             print('Loaded weights all zeros: ',
                                   np.allclose(transform, 0))
@@ -220,11 +288,12 @@ class DynamicsAdaptation():
                     else:
 
                         if os.path.isfile('%s' % weights_file):
+                            weights = checkpoints.load_checkpoint(
+                                weights_file)
                             if n_ensembles == 1:
-                                transform = np.load(weights_file)['weights']
+                                transform = np.array(weights)
                             else:
-                                transform = (
-                                    np.load(weights_file)['weights'][ii])
+                                transform = np.array(weights[ii])
                             # remove third dimension if present
                             if len(transform.shape) > 2:
                                 transform = np.squeeze(transform)
@@ -247,15 +316,16 @@ class DynamicsAdaptation():
 
 
 
+            self.spike_publisher = None
             if backend != 'nengo_spinnaker' and send_redis_spikes:
-                # Send spikes via redis
+                # Send spikes via redis, the publisher connects the first
+                # time spikes are sent
+                self.spike_publisher = SpikePublisher(
+                    **(send_redis_spikes if isinstance(
+                        send_redis_spikes, dict) else {}))
+
                 def send_spikes(t, x):
-                    v = np.where(x != 0)[0]
-                    if len(v) > 0:
-                        msg = struct.pack('%dI' % len(v), *v)
-                    else:
-                        msg = ''
-                    r.set('spikes', msg)
+                    self.spike_publisher.publish(x)
                     self.activity = x
                 source_node = nengo.Node(send_spikes, size_in=n_neurons)
                 nengo.Connection(
@@ -265,19 +335,39 @@ class DynamicsAdaptation():
             def save_x(t, x):
                 self.x = x
             x_node = nengo.Node(save_x, size_in=n_input)
-            nengo.Connection(self.adapt_ens[0], x_node, synapse=None)
+            self.conn_x = nengo.Connection(
+                self.adapt_ens[0], x_node, synapse=None)
 
-            if backend == 'nengo' and probe_weights:
-                self.nengo_model.weights_probe = nengo.Probe(
-                    self.conn_learn[0], 'weights', synapse=None)
+            self.weights_telemetry = None
+            if probe_weights:
+                # sample the weights at a fixed rate into a fixed size
+                # buffer, rather than probing them every step
+                telemetry_kwargs = (
+                    probe_weights if isinstance(probe_weights, dict) else {})
+                self.weights_telemetry = WeightTelemetry(
+                    (n_ensembles, n_output, n_neurons), **telemetry_kwargs)
 
 
 
 
 
-        nengo.cache.DecoderCache().invalidate()
+        # the Nengo decoder cache saves solved decoders to file, keyed by
+        # the neuron parameters, evaluation points, and function
         if backend == 'nengo':
             self.sim = nengo.Simulator(self.nengo_model, dt=.001)
+            params = self.sim.data
+        elif backend == 'numpy':
+            self.sim = None
+            model = nengo.builder.Model(
+                dt=.001, decoder_cache=nengo.cache.get_default_decoder_cache())
+            model.build(self.nengo_model)
+            params = model.params
+            self.engine = NumpyEngine.from_model(
+                model, self.adapt_ens, self.conn_learn, pes_learning_rate,
+                sparse=sparse, n_workers=n_workers,
+                weights_dtype=weights_dtype, seed=seed)
+            # decoders for the represented value of the first ensemble
+            self.decoders_x = model.params[self.conn_x].weights
         elif backend == 'nengo_ocl':
             try:
                 import nengo_ocl
@@ -289,6 +379,7 @@ class DynamicsAdaptation():
             ctx = cl.Context(cl.get_platforms()[0].get_devices())
             self.sim = nengo_ocl.Simulator(self.nengo_model,
                                            context=ctx, dt=.001)
+            params = self.sim.data
         elif backend == 'nengo_spinnaker':
             try:
                 import nengo_spinnaker
@@ -307,6 +398,9 @@ class DynamicsAdaptation():
             raise Exception('Invalid backend specified')
         self.backend = backend
 
+        if build_file is not None and cached is None:
+            self.save_build_cache(build_file, params)
+
     def generate(self, input_signal, training_signal):
         """ Generates the control signal
 
@@ -329,11 +423,89 @@ class DynamicsAdaptation():
         elif self.backend == 'nengo_spinnaker':
             # update spinnaker inputs
             self.sim.async_update()
+        elif self.backend == 'numpy':
+            self.output = np.copy(self.engine.step(
+                self.input_signal, self.training_signal))
+            activity = self.engine.activities[0]
+            self.x = np.dot(self.decoders_x, activity)
+            if self.spike_publisher is not None:
+                self.spike_publisher.publish(activity)
+                self.activity = np.copy(activity)
         else:
             self.sim.run(time_in_seconds=.001)
 
+        if (self.weights_telemetry is not None and
+                self.weights_telemetry.tick()):
+            self.weights_telemetry.record(self.get_weights())
+
         return self.output
 
+    @staticmethod
+    def build_cache_location(n_input, n_neurons, n_ensembles, seed,
+                             encoders=None, ensemble_kwargs=None):
+        """ Returns the file the neuron parameters of the adaptive
+        ensembles are cached in, named by a hash of everything used to
+        generate them
+
+        Parameters
+        ----------
+        n_input : int
+            the number of inputs going into the adaptive population
+        n_neurons : int
+            number of neurons per adaptive population
+        n_ensembles : int
+            number of ensembles of n_neurons number of neurons
+        seed : int
+            the seed used for random number generation
+        encoders : np.array, optional (Default: None)
+            user defined encoders
+        ensemble_kwargs : dict, optional (Default: None)
+            the extra parameters passed to each nengo.Ensemble
+        """
+        try:
+            import nengolib  # noqa: F401
+            has_nengolib = True
+        except ImportError:
+            has_nengolib = False
+
+        def fingerprint(value):
+            # the repr of large arrays is shortened, so hash the values
+            if isinstance(value, np.ndarray):
+                return hashlib.sha1(np.ascontiguousarray(value)).hexdigest()
+            return repr(value)
+
+        ensemble_kwargs = {} if ensemble_kwargs is None else ensemble_kwargs
+        key = hashlib.sha1(repr((
+            nengo.__version__, n_input, n_neurons, n_ensembles, seed,
+            has_nengolib, fingerprint(encoders),
+            sorted((name, fingerprint(value))
+                   for name, value in ensemble_kwargs.items()))).encode())
+
+        return os.path.join(cache_dir, 'adaptive_ensembles',
+                            '%s.npz' % key.hexdigest())
+
+    def save_build_cache(self, build_file, params):
+        """ Saves the encoders, gains, and biases of the adaptive
+        ensembles once the network is built
+
+        Parameters
+        ----------
+        build_file : string
+            the file to save to
+        params : dict
+            the built parameters of each object in the network
+        """
+        abr_control.utils.os_utils.makedirs(os.path.dirname(build_file))
+        # write to a temporary file and rename when done, so that
+        # interrupted saves aren't loaded in later
+        tmp_file = build_file[:-4] + '.tmp.npz'
+        np.savez(
+            tmp_file,
+            encoders=[params[ens].encoders for ens in self.adapt_ens],
+            gain=[params[ens].gain for ens in self.adapt_ens],
+            bias=[params[ens].bias for ens in self.adapt_ens])
+        os.rename(tmp_file, build_file)
+
     def weights_location(self, session=None, run=None, test_name='test'):
         """ Search for most recent saved weights
 
@@ -357,21 +529,13 @@ class DynamicsAdaptation():
             the test name to save the weights under
         """
 
-        test_name = cache_dir + '/saved_weights/' + test_name
+        test_folder = cache_dir + '/saved_weights/' + test_name
 
-        # if session is not None, then user has specified what session
-        # to save the current weights in
-        if session is not None:
-            test_name += '/session%i' % session
-        # If no session is specified, check if there is already one created,
-        # if not then save the run to 'session0'
-        else:
-            prev_sessions = glob.glob(test_name + '/session*')
-            run_cache = []
-            if prev_sessions:
-                test_name = max(prev_sessions)
-            else:
-                test_name += '/session0'
+        # the index lists every saved session and run, if session is None
+        # use the highest numbered session, or 'session0' if none exist
+        runs = checkpoints.read_index(test_folder)
+        session, run_num = checkpoints.latest_run(runs, session)
+        test_name = test_folder + '/session%i' % session
 
         # check if the provided test_name exists, if not, create it
         if not os.path.exists(test_name):
@@ -379,38 +543,18 @@ class DynamicsAdaptation():
                   % test_name)
             os.makedirs(test_name)
 
-        # if no run is specified, check what the most recent run saved is and
-        # save as the next one in the series. If no run exists then save it as
-        # 'run0' if saving, if loading throw an error no weights file exists
-        if run is None:
-            prev_runs = glob.glob(test_name + '/*.npz')
-            run_cache = []
-            if prev_runs:
-                for val in prev_runs:
-                    run_cache.append(
-                        int(val[val.rfind('/')+4:val.find('.npz')]))
-                run_num = max(run_cache)
-            else:
-                run_num = -1
-        else:
+        # if no run is specified, use the most recent run saved, so that
+        # saving uses the next one in the series. If no run exists this is
+        # -1, so it is saved as 'run0', or no weights file is loaded
+        if run is not None:
             # save as the run specified by the user
             run_num = run
 
         return [test_name, run_num]
 
-    def save_weights(self, **kwargs):
-        """ Save the current weights to the specified test_name folder
-
-        Save weights for individual runs. A group of runs is
-        classified as a session. Multiple sessions can then be used
-        to average over a set of learned runs. If session or run are set to None
-        then the test_name location will be searched for the highest numbered
-        folder and file respectively
-        """
+    def get_weights(self):
+        """ Returns the current weights of each adaptive ensemble """
 
-        [test_name, run_num] = self.weights_location(**kwargs)
-
-        print('saving weights as run%i'% (run_num+1))
         if self.backend == 'nengo_spinnaker':
             import nengo_spinnaker.utils.learning
             # Need to power cycle spinnaker for repeated runs, so sim.close and
@@ -418,20 +562,94 @@ class DynamicsAdaptation():
             # ethernet connections, then can uncomment the following two lines
             #self.sim.close()
             #time.sleep(5)
-            print('save location: ', test_name + '/run%i' % (run_num +1))
-            np.savez_compressed(
-                test_name + '/run%i' % (run_num + 1),
-                weights=([
-                    nengo_spinnaker.utils.learning.get_learnt_decoders(
-                        self.sim, ens) for ens in self.adapt_ens]))
+            return [nengo_spinnaker.utils.learning.get_learnt_decoders(
+                self.sim, ens) for ens in self.adapt_ens]
+
+        elif self.backend == 'numpy':
+            return list(self.engine.weights)
 
         else:
+            return [self.sim.signals[self.sim.model.sig[conn]['weights']]
+                    for conn in self.conn_learn]
+
+    def save_weights(self, weights=None, **kwargs):
+        """ Save the current weights to the specified test_name folder
+
+        Save weights for individual runs. A group of runs is
+        classified as a session. Multiple sessions can then be used
+        to average over a set of learned runs. If session or run are set to None
+        then the test_name location will be searched for the highest numbered
+        folder and file respectively
+
+        Parameters
+        ----------
+        weights: list of np.array, optional (Default: None)
+            the weights of each ensemble to save, such as from
+            OfflineTrainer, if None the current weights are saved
+        """
+        saved = {'weights': weights}
+        if weights is None and self.backend == 'numpy':
+            # keep the precision the weights are stored with
+            if self.engine.quantized:
+                saved = {'weights': self.engine.quantized_weights,
+                         'scale': self.engine.scale}
+            else:
+                saved['weights'] = np.array(self.engine.weights)
+        elif weights is None:
+            saved['weights'] = self.get_weights()
+
+        # write any checkpoints still being saved, so they are numbered
+        # before this run
+        if getattr(self, 'checkpoints', None) is not None:
+            self.checkpoints.flush()
+
+        test_folder = (cache_dir + '/saved_weights/' +
+                       kwargs.get('test_name', 'test'))
+        # choose the run number and add it to the index without any
+        # other run being saved in between
+        with checkpoints.index_lock(test_folder):
+            [test_name, run_num] = self.weights_location(**kwargs)
+
+            print('saving weights as run%i'% (run_num+1))
             print('save location: ', test_name + '/run%i' % (run_num +1))
             np.savez_compressed(
-                test_name + '/run%i' % (run_num + 1),
-                weights=([
-                    self.sim.signals[self.sim.model.sig[conn]['weights']]
-                    for conn in self.conn_learn]))
+                test_name + '/run%i' % (run_num + 1), **saved)
+
+            session_folder = os.path.basename(test_name)
+            checkpoints.add_to_index(test_folder, {
+                'session': int(session_folder[len('session'):]),
+                'run': run_num + 1,
+                'file': os.path.join(session_folder,
+                                     'run%i.npz' % (run_num + 1)),
+                'time': time.time()})
+
+    def checkpoint(self, test_name='test', session=None, deltas=False):
+        """ Saves the current weights in the background, without waiting
+        for them to be written to file, see CheckpointStore
+
+        Returns the run number they are saved as. The weights can be
+        loaded with load_weights, or by passing the file as weights_file.
+
+        Parameters
+        ----------
+        test_name: string, optional (Default: 'test')
+            the test name to save the weights under
+        session: int, optional (Default: None)
+            the session to save to, if None the highest numbered
+            session, or 'session0' if none exist
+        deltas: boolean, optional (Default: False)
+            True to only save the weights that changed since the
+            last checkpoint
+        """
+        key = (test_name, session, deltas)
+        if getattr(self, '_checkpoint_key', None) != key:
+            if getattr(self, 'checkpoints', None) is not None:
+                self.checkpoints.close()
+            self.checkpoints = checkpoints.CheckpointStore(
+                cache_dir + '/saved_weights/' + test_name,
+                session=session, deltas=deltas)
+            self._checkpoint_key = key
+        return self.checkpoints.save(self.get_weights())
 
     def load_weights(self, **kwargs):
         """ Loads the most recently saved weights unless otherwise specified
@@ -447,7 +665,12 @@ class DynamicsAdaptation():
             print('No weights found in the specified directory...')
             weights_file = None
         else:
+            test_folder, session_folder = os.path.split(test_name)
             weights_file = test_name + '/run%i.npz' % run_num
+            for entry in checkpoints.read_index(test_folder):
+                if (entry['run'] == run_num and
+                        os.path.dirname(entry['file']) == session_folder):
+                    weights_file = os.path.join(test_folder, entry['file'])
         return weights_file
 
 class DummySolver(nengo.solvers.Solver):
@@ -464,10 +687,21 @@ class DummySolver(nengo.solvers.Solver):
 class AreaIntercepts(nengo.dists.Distribution):
     """ Generate an optimally distributed set of intercepts in
     high-dimensional space.
+
+    The transformed samples are kept for the last few sets of samples
+    drawn from the base distribution, so building the same network again
+    only needs to draw from the base distribution. The base samples are
+    always drawn, so the random number generator is left in the same
+    state either way.
     """
     dimensions = nengo.params.NumberParam('dimensions')
     base = nengo.dists.DistributionParam('base')
 
+    # transformed samples, keyed by the dimensions, base distribution,
+    # and a hash of the base samples
+    _cache = collections.OrderedDict()
+    cache_size = 8
+
     def __init__(self, dimensions, base=nengo.dists.Uniform(-1, 1)):
         super(AreaIntercepts, self).__init__()
         self.dimensions = dimensions
@@ -478,26 +712,32 @@ class AreaIntercepts(nengo.dists.Distribution):
                 (self.dimensions, self.base))
 
     def transform(self, x):
-        sign = 1
-        if x > 0:
-            x = -x
-            sign = -1
+        x = np.asarray(x, dtype='float')
+        sign = np.where(x > 0, -1.0, 1.0)
         return sign * np.sqrt(1 - scipy.special.betaincinv(
-            (self.dimensions + 1) / 2.0, 0.5, x + 1))
+            (self.dimensions + 1) / 2.0, 0.5, 1 - np.abs(x)))
 
     def sample(self, n, d=None, rng=np.random):
-        s = self.base.sample(n=n, d=d, rng=rng)
-        for ii, ss in enumerate(s):
-            s[ii] = self.transform(ss)
-        return s
+        s = np.asarray(self.base.sample(n=n, d=d, rng=rng), dtype='float')
+        key = (self.dimensions, repr(self.base), s.shape,
+               hashlib.sha1(np.ascontiguousarray(s)).hexdigest())
+        cache = AreaIntercepts._cache
+        if key in cache:
+            # move to the end, so the least recently used are dropped
+            cache[key] = cache.pop(key)
+        else:
+            cache[key] = self.transform(s)
+            while len(cache) > self.cache_size:
+                cache.popitem(last=False)
+        return np.array(cache[key])
 
 class Triangular(nengo.dists.Distribution):
     """ Generate an optimally distributed set of intercepts in
     high-dimensional space using a triangular distribution.
     """
-    left = nengo.params.NumberParam('dimensions')
-    right = nengo.params.NumberParam('dimensions')
-    mode = nengo.params.NumberParam('dimensions')
+    left = nengo.params.NumberParam('left')
+    right = nengo.params.NumberParam('right')
+    mode = nengo.params.NumberParam('mode')
 
     def __init__(self, left, mode, right):
         super(Triangular, self).__init__()
@@ -510,8 +750,5 @@ class Triangular(nengo.dists.Distribution):
                 (self.left, self.mode, self.right))
 
     def sample(self, n, d=None, rng=np.random):
-        if d is None:
-            return rng.triangular(self.left, self.mode, self.right, size=n)
-        else:
-            return rng.triangular(self.left, self.mode,
-                                  self.right, size=(n, d))
+        return rng.triangular(self.left, self.mode, self.right,
+                              size=n if d is None else (n, d))
@@ -0,0 +1,139 @@
+import numpy as np
+
+
+class FeatureAdaptation():
+    """ Nonlinear dynamics adaptation with a fixed set of basis functions
+    and a linear learning rule, in place of a neural population
+
+    The input is mapped to either random Fourier features (Rahimi and
+    Recht, 2007), which approximate a Gaussian kernel, or to Gaussian
+    radial basis functions centered at random points. The output is a
+    learned weighted sum of the features. Has the same generate function
+    as DynamicsAdaptation, so it can be used in its place, at a fraction
+    of the cost per step.
+
+    As with the PES rule used by DynamicsAdaptation, the training signal
+    is the direction the output should change in. The weights can be
+    learned with normalized least mean squares, which is O(n_features)
+    per step, or recursive least squares, which converges in far fewer
+    steps but is O(n_features**2) per step.
+
+    Parameters
+    ----------
+    n_input : int
+        the number of inputs, expected to be in the range [-1, 1]
+    n_output : int
+        the number of outputs
+    n_features : int, optional (Default: 200)
+        the number of basis functions
+    features : string, optional (Default: 'rff')
+        {'rff', 'rbf'} random Fourier features or radial basis functions
+    bandwidth : float, optional (Default: 0.5)
+        the width of the Gaussian kernel or radial basis functions,
+        larger values give smoother outputs
+    update : string, optional (Default: 'nlms')
+        {'nlms', 'rls'} the learning rule
+    learning_rate : float, optional (Default: 1e-3)
+        scales the training signal, the fraction of the training signal
+        removed on each step with 'nlms'
+    forgetting : float, optional (Default: 1.0)
+        the forgetting factor of 'rls', values below 1 weight recent
+        samples more, letting the weights track changing dynamics
+    rls_delta : float, optional (Default: 1.0)
+        'rls' starts with an inverse correlation matrix of I / rls_delta
+    seed : int, optional (Default: None)
+        the seed used for random number generation
+    """
+
+    def __init__(self, n_input, n_output, n_features=200, features='rff',
+                 bandwidth=0.5, update='nlms', learning_rate=1e-3,
+                 forgetting=1.0, rls_delta=1.0, seed=None):
+
+        if features not in ('rff', 'rbf'):
+            raise Exception('Invalid features %s' % features)
+        if update not in ('nlms', 'rls'):
+            raise Exception('Invalid update %s' % update)
+
+        self.n_input = n_input
+        self.n_output = n_output
+        self.n_features = n_features
+        self.features = features
+        self.update = update
+        self.learning_rate = learning_rate
+        self.forgetting = forgetting
+
+        rng = np.random.RandomState(seed)
+        if features == 'rff':
+            self.frequencies = rng.normal(
+                0, 1.0 / bandwidth, (n_features, n_input))
+            self.phases = rng.uniform(0, 2 * np.pi, n_features)
+            self._scale = np.sqrt(2.0 / n_features)
+        else:
+            self.centers = rng.uniform(-1, 1, (n_features, n_input))
+            self._centers_sq = np.sum(self.centers**2, axis=1)
+            self._gamma = 1.0 / (2 * bandwidth**2)
+
+        self.weights = np.zeros((n_output, n_features))
+        # the inverse correlation matrix of the features, for 'rls'
+        self.P = (np.eye(n_features) / rls_delta if update == 'rls'
+                  else None)
+
+        self.output = np.zeros(n_output)
+        self.activities = np.zeros(n_features)
+        self._Pphi = np.zeros(n_features)
+
+    def transform(self, input_signal):
+        """ Returns the features of an input
+
+        Parameters
+        ----------
+        input_signal : numpy.array
+            the input to the features
+        """
+        if self.features == 'rff':
+            phi = np.dot(self.frequencies, input_signal)
+            phi += self.phases
+            np.cos(phi, out=phi)
+            phi *= self._scale
+            return phi
+
+        # squared distance to each center, without making the
+        # (n_features, n_input) differences
+        sq_dist = self._centers_sq - 2 * np.dot(self.centers, input_signal)
+        sq_dist += np.dot(input_signal, input_signal)
+        sq_dist *= -self._gamma
+        return np.exp(sq_dist, out=sq_dist)
+
+    def generate(self, input_signal, training_signal):
+        """ Generates the control signal
+
+        The weights are updated after finding the output, so that the
+        training signal affects the output from the next step on.
+
+        Parameters
+        ----------
+        input_signal : numpy.array
+            the current desired input signal, typical joint positions and
+            velocities in [rad] and [rad/sec] respectively, scaled to
+            be in the range [-1, 1]
+        training_signal : numpy.array
+            the learning signal to drive adaptation
+        """
+        phi = self.transform(np.asarray(input_signal, dtype='float'))
+        self.activities = phi
+        np.dot(self.weights, phi, out=self.output)
+        error = self.learning_rate * np.asarray(training_signal)
+
+        if self.update == 'nlms':
+            self.weights += np.outer(error / (np.dot(phi, phi) + 1e-8), phi)
+        else:
+            P = self.P
+            Pphi = np.dot(P, phi, out=self._Pphi)
+            gain = Pphi / (self.forgetting + np.dot(phi, Pphi))
+            self.weights += np.outer(error, gain)
+            # P is symmetric, so phi^T P = (P phi)^T
+            P -= np.outer(gain, Pphi)
+            if self.forgetting != 1.0:
+                P /= self.forgetting
+
+        return np.copy(self.output)
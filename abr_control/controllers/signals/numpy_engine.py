@@ -0,0 +1,723 @@
+import numpy as np
+from scipy.linalg import blas
+
+try:
+    import nengo
+except ImportError:
+    raise Exception('Nengo module needs to be installed to ' +
+                    'use adaptive dynamics.')
+
+WEIGHTS_DTYPES = ('float64', 'float32', 'int16')
+INT16_MAX = 32767
+
+
+class NumpyEngine():
+    """ Runs adaptive ensembles with PES learning directly in NumPy
+
+    Implements the same neuron, decoding, and learning equations as the
+    Nengo reference simulator for a network of ensembles that each feed
+    their neural activities through learned weights into a shared output,
+    without the overhead of stepping a full Nengo simulator. The model
+    parameters are read from an already built Nengo model, so the engine
+    gives the same results as the Nengo backend.
+
+    All ensembles must have the same number of neurons, and use either
+    nengo.LIF or nengo.LIFRate neurons.
+
+    Parameters
+    ----------
+    scaled_encoders : np.array
+        (n_ensembles, n_neurons, n_input) encoders multiplied by the
+        neuron gains and divided by the ensemble radius
+    bias : np.array
+        (n_ensembles, n_neurons) bias current of each neuron
+    weights : np.array
+        (n_ensembles, n_output, n_neurons) initial learned weights
+    neuron_type : nengo.LIF or nengo.LIFRate
+        the neuron model to use
+    learning_rate : float
+        the PES learning rate
+    pre_tau : float, optional (Default: 0.005)
+        time constant of the lowpass filter on the activities used
+        for learning, matches the nengo.PES default pre_synapse
+    dt : float, optional (Default: 0.001)
+        the time step of the simulation [seconds]
+    voltage : np.array, optional (Default: None)
+        (n_ensembles, n_neurons) initial membrane voltages of spiking
+        neurons, if None all start at 0
+    refractory_time : np.array, optional (Default: None)
+        (n_ensembles, n_neurons) initial refractory times of spiking
+        neurons, if None all start at 0
+    sparse : boolean, optional (Default: False)
+        if True, decoding and learning only use the weights of neurons
+        that are active, or were recently, instead of the whole weight
+        matrix. The weights of these neurons are kept together in a
+        working set, which neurons join when they become active and leave
+        once their filtered activity decays away. The input current and
+        voltage of every neuron are still found each step, so this only
+        saves the cost of decoding and learning, which grows with
+        n_output. With the default intercepts about 1 in 5 neurons are in
+        the working set, and with 2 outputs sparse mode is no faster than
+        dense at 2e4 neurons and about 20% faster at 1e5, with 20 outputs
+        it is 1.8 to 2 times faster. Worth using when there are many
+        outputs, or many neurons with few of them active
+    active_tol : float, optional (Default: 0.1)
+        in sparse mode, filtered activities below this are set to 0 and
+        the neuron no longer takes part in learning until active again
+    n_workers : int, optional (Default: 1)
+        if above 1, the ensembles are split into this many groups, which
+        are run in parallel by a pool of threads and their outputs summed.
+        NumPy and BLAS release the GIL while working on large arrays, so
+        this helps when each group has many neurons and there are cores
+        free. Can't be used with sparse
+    weights_dtype : string, optional (Default: 'float64')
+        {'float64', 'float32', 'int16'} how the weights are stored.
+        'int16' stores each row of the weights as integers times a scale,
+        the largest weight in the row over 32767. Changes in the weights
+        are stochastically rounded, so that on average they are applied
+        in full even when much smaller than the scale. In dense mode the
+        weights are updated in blocks of neurons, so only the int16
+        weights are read from and written to memory each step. In sparse
+        mode each row holds the weights of one neuron, and the working
+        set is kept in float64, so the weights are only rounded when a
+        neuron leaves it. 'int16' can't be used in parallel
+    seed : int, optional (Default: None)
+        the seed of the random numbers used for stochastic rounding
+
+    Attributes
+    ----------
+    weights : np.array
+        (n_ensembles, n_output, n_neurons) view of the learned weights,
+        a copy for 'int16' weights
+    activities : np.array
+        (n_ensembles, n_neurons) the neural activities on the last step
+    filtered : np.array
+        (n_ensembles, n_neurons) the filtered activities used for learning,
+        only kept up to date when not in sparse mode
+    """
+
+    def __init__(self, scaled_encoders, bias, weights, neuron_type,
+                 learning_rate, pre_tau=0.005, dt=0.001, voltage=None,
+                 refractory_time=None, sparse=False, active_tol=0.1,
+                 n_workers=1, weights_dtype='float64', seed=None):
+
+        if type(neuron_type) not in (nengo.LIF, nengo.LIFRate):
+            raise Exception('Neuron type %s not supported by the numpy '
+                            'backend' % neuron_type)
+
+        self.scaled_encoders = np.asarray(scaled_encoders, dtype='float')
+        self.bias = np.asarray(bias, dtype='float')
+        self.n_ensembles, self.n_neurons, self.n_input = (
+            self.scaled_encoders.shape)
+        weights = np.asarray(weights, dtype='float')
+        self.n_output = weights.shape[1]
+        self.sparse = sparse
+        self.active_tol = active_tol
+        self.n_workers = min(n_workers, self.n_ensembles)
+        if sparse and self.n_workers > 1:
+            raise Exception('Sparse updates can not be run in parallel')
+        if weights_dtype not in WEIGHTS_DTYPES:
+            raise Exception('Invalid weights dtype %s' % weights_dtype)
+        if weights_dtype == 'int16' and self.n_workers > 1:
+            raise Exception('int16 weights can not be run in parallel')
+        self.weights_dtype = weights_dtype
+        self.quantized = weights_dtype == 'int16'
+        if self.n_workers > 1:
+            # stored by ensemble, so that each group of ensembles
+            # updates its own contiguous weights
+            self._weights = np.array(weights)
+        elif sparse:
+            # stored by neuron, so that the weights of a neuron are a row
+            # that can be copied in and out of the working set
+            self._weights = np.ascontiguousarray(
+                weights.transpose(0, 2, 1)).reshape(-1, self.n_output)
+        else:
+            # the weights of all ensembles are stored side by side, so that
+            # decoding and learning are each a single matrix operation
+            self._weights = np.ascontiguousarray(
+                weights.transpose(1, 0, 2)).reshape(self.n_output, -1)
+
+        if self.quantized:
+            # uniform random numbers for stochastic rounding, see _round
+            self._rng = np.random.RandomState(seed)
+            self._dither = self._rng.random_sample(2**17)
+        # the scale of each row of int16 weights, kept as a column
+        # so that it broadcasts along the rows
+        self._scale = np.zeros((self._weights.shape[0], 1))
+        if self.quantized:
+            self._weights = self._store_rows(self._weights)
+        else:
+            self._weights = self._weights.astype(weights_dtype, copy=False)
+        self._weights_view = self._view(self._weights)
+        # single precision weights are updated with single precision BLAS
+        self._ger = blas.sger if weights_dtype == 'float32' else blas.dger
+        # in dense mode int16 weights are updated in blocks of neurons,
+        # converted to float64 in a buffer small enough to stay in cache
+        n_total = self.n_ensembles * self.n_neurons
+        block_size = max(256, 2**15 // self.n_output)
+        self._blocks = [slice(ii, min(ii + block_size, n_total))
+                        for ii in range(0, n_total, block_size)]
+        self._block = np.zeros(
+            self.n_output * block_size if self.quantized and not sparse
+            else 0)
+
+        self.neuron_type = neuron_type
+        self.spiking = isinstance(neuron_type, nengo.LIF)
+        self.dt = dt
+        self.learning_rate = learning_rate
+        self.pre_tau = pre_tau
+        # PES weight change is learning_rate * dt / n_neurons * error * a
+        self.alpha = learning_rate * dt / self.n_neurons
+        self.decay = np.exp(-dt / pre_tau)
+
+        shape = (self.n_ensembles, self.n_neurons)
+        self.voltage = (np.zeros(shape) if voltage is None
+                        else np.array(voltage, dtype='float'))
+        self.refractory_time = (
+            np.zeros(shape) if refractory_time is None
+            else np.array(refractory_time, dtype='float'))
+
+        # preallocated arrays for each step
+        self.J = np.zeros(shape)
+        self.activities = np.zeros(shape)
+        self.filtered = np.zeros(shape)
+        self.output = np.zeros(self.n_output)
+        # the training signal from the previous step, see step
+        self._training_signal = np.zeros(self.n_output)
+        # the working set in sparse mode, the first _n_working rows of
+        # _working_weights hold the weights of the neurons in
+        # _working_neurons, whose filtered activities are in
+        # _working_filtered. _slot is the row of each neuron, or -1
+        n_total = self.n_ensembles * self.n_neurons
+        self._n_working = 0
+        self._slot = np.full(n_total, -1, dtype=int)
+        self._resize_working_set(64 if sparse else 0)
+        # look up the neuron parameters once
+        self._tau_rc = neuron_type.tau_rc
+        self._tau_ref = neuron_type.tau_ref
+        self._amplitude = neuron_type.amplitude
+        self._min_voltage = getattr(neuron_type, 'min_voltage', 0)
+        self._full_step_decay = np.expm1(-dt / self._tau_rc)
+        self._voltage_decay = np.full(
+            self.n_ensembles * self.n_neurons, self._full_step_decay)
+        self._tmp = np.zeros(self.n_ensembles * self.n_neurons)
+        # flattened views, the neurons of all ensembles are updated at once
+        self._encoders_T = np.ascontiguousarray(
+            self.scaled_encoders.reshape(-1, self.n_input).T)
+        self._J = self.J.reshape(-1)
+        self._activities = self.activities.reshape(-1)
+        self._filtered = self.filtered.reshape(-1)
+        self._voltage = self.voltage.reshape(-1)
+        self._refractory_time = self.refractory_time.reshape(-1)
+
+        self._pool = None
+        if self.n_workers > 1:
+            import concurrent.futures
+            self._pool = concurrent.futures.ThreadPoolExecutor(
+                self.n_workers)
+            # each group of ensembles, and its range of neurons
+            self._groups = [
+                (group, slice(group[0] * self.n_neurons,
+                              (group[-1] + 1) * self.n_neurons))
+                for group in np.array_split(
+                    np.arange(self.n_ensembles), self.n_workers)]
+
+    @classmethod
+    def from_model(cls, model, ensembles, connections, learning_rate,
+                   **kwargs):
+        """ Creates an engine from a built Nengo model
+
+        Parameters
+        ----------
+        model : nengo.builder.Model
+            the built model
+        ensembles : list of nengo.Ensemble
+            the adaptive ensembles
+        connections : list of nengo.Connection
+            the learned connection out of each ensemble
+        learning_rate : float
+            the PES learning rate
+        """
+        scaled_encoders = np.array(
+            [model.params[ens].scaled_encoders for ens in ensembles])
+        bias = np.array([model.params[ens].bias for ens in ensembles])
+        weights = np.array([
+            model.sig[conn]['weights'].initial_value for conn in connections])
+        neuron_type = ensembles[0].neuron_type
+        if isinstance(neuron_type, nengo.LIF):
+            kwargs.setdefault('voltage', np.array([
+                model.sig[ens.neurons]['voltage'].initial_value
+                for ens in ensembles]))
+            kwargs.setdefault('refractory_time', np.array([
+                model.sig[ens.neurons]['refractory_time'].initial_value
+                for ens in ensembles]))
+        pre_synapse = connections[0].learning_rule_type.pre_synapse
+        if pre_synapse is not None:
+            kwargs.setdefault('pre_tau', pre_synapse.tau)
+
+        return cls(scaled_encoders, bias, weights, neuron_type,
+                   learning_rate, dt=model.dt, **kwargs)
+
+    @property
+    def weights(self):
+        self._flush_working_set()
+        if self.quantized:
+            return self._weights_view * self.scale
+        return self._weights_view
+
+    @property
+    def scale(self):
+        """ The scale of int16 weights, which broadcasts against the
+        (n_ensembles, n_output, n_neurons) weights, with one value for each
+        output in dense mode and for each neuron in sparse mode """
+        if self.sparse:
+            return self._scale.reshape(self.n_ensembles, 1, self.n_neurons)
+        return self._scale.reshape(1, self.n_output, 1)
+
+    @property
+    def quantized_weights(self):
+        """ The (n_ensembles, n_output, n_neurons) int16 weights, or
+        None if the weights are not stored as int16 """
+        if not self.quantized:
+            return None
+        self._flush_working_set()
+        return self._weights_view
+
+    def _flush_working_set(self):
+        """ Copies the weights learned in the working set back """
+        if self._n_working > 0:
+            neurons = self._working_neurons[:self._n_working]
+            self._write_rows(neurons, self._working_weights[:self._n_working])
+
+    def _view(self, data):
+        """ Returns an (n_ensembles, n_output, n_neurons) view of data
+        stored in the same layout as the weights
+
+        Parameters
+        ----------
+        data : np.array
+            the data to view
+        """
+        if self.n_workers > 1:
+            return data
+        if self.sparse:
+            return data.reshape(
+                self.n_ensembles, self.n_neurons,
+                self.n_output).transpose(0, 2, 1)
+        return data.reshape(
+            self.n_output, self.n_ensembles,
+            self.n_neurons).transpose(1, 0, 2)
+
+    def _round(self, values):
+        """ Rounds values in place, up with probability equal to their
+        fractional part and down otherwise, so that the rounded values
+        are on average equal to the values
+
+        Small arrays use a random slice of a table of random numbers,
+        which is much faster than generating new ones each time.
+
+        Parameters
+        ----------
+        values : np.array
+            the values to round
+        """
+        size = values.size
+        if size <= len(self._dither) // 2:
+            offset = self._rng.randint(len(self._dither) - size)
+            values += self._dither[offset:offset + size].reshape(
+                values.shape)
+        else:
+            values += self._rng.random_sample(values.shape)
+        return np.floor(values, out=values)
+
+    def _store_rows(self, values, rows=slice(None)):
+        """ Returns rows of weights as int16, setting the scale of each
+        row so that its largest weight is stored as 32767
+
+        Parameters
+        ----------
+        values : np.array
+            the weights, one row for each row stored
+        rows : np.array, optional (Default: all rows)
+            the indices of the rows
+        """
+        scale = np.max(np.abs(values), axis=1, keepdims=True) / INT16_MAX
+        self._scale[rows] = scale
+        values = np.divide(values, scale, out=np.zeros(values.shape),
+                           where=scale > 0)
+        return self._round(values).astype('int16')
+
+    def _store_block(self, values, block):
+        """ Stores a block of neurons' weights as int16, in dense mode,
+        and sets values to the rounded weights
+
+        If a weight is too large for its row's scale, the scale is
+        increased to leave room for the row to grow, and the rest of the
+        row is rescaled.
+
+        Parameters
+        ----------
+        values : np.array
+            the (n_output, block size) weights
+        block : slice
+            the range of neurons in the block
+        """
+        peak = np.max(np.abs(values), axis=1)
+        grow = np.flatnonzero(peak > INT16_MAX * self._scale[:, 0])
+        if len(grow) > 0:
+            scale = 2 * peak[grow, None] / INT16_MAX
+            self._weights[grow] = self._round(
+                self._weights[grow] * (self._scale[grow] / scale))
+            self._scale[grow] = scale
+        np.divide(values, self._scale, out=values, where=self._scale > 0)
+        self._weights[:, block] = self._round(values)
+        values *= self._scale
+
+    def _write_rows(self, rows, values):
+        """ Copies the weights of neurons from the working set back
+        to storage, in sparse mode
+
+        Parameters
+        ----------
+        rows : np.array
+            the neurons
+        values : np.array
+            the (len(rows), n_output) weights of the neurons
+        """
+        if self.quantized:
+            self._weights[rows] = self._store_rows(values, rows)
+        else:
+            self._weights[rows] = values
+
+    def _resize_working_set(self, size):
+        """ Changes the number of rows available in the working set
+
+        Parameters
+        ----------
+        size : int
+            the new number of rows
+        """
+        n = self._n_working
+        working_weights = np.zeros((size, self.n_output))
+        working_filtered = np.zeros(size)
+        working_neurons = np.zeros(size, dtype=int)
+        if n > 0:
+            working_weights[:n] = self._working_weights[:n]
+            working_filtered[:n] = self._working_filtered[:n]
+            working_neurons[:n] = self._working_neurons[:n]
+        self._working_weights = working_weights
+        self._working_filtered = working_filtered
+        self._working_neurons = working_neurons
+
+    def _neurons(self, J, output, neurons=slice(None)):
+        """ Finds the neural activities for input currents J, updating
+        the membrane voltage and refractory time of spiking neurons in
+        place, as in nengo.LIF.step and nengo.LIFRate.step
+
+        Parameters
+        ----------
+        J : np.array
+            the flattened input current to each neuron
+        output : np.array
+            the flattened array to write the activities into
+        neurons : slice, optional (Default: all neurons)
+            the range of neurons J and output are for
+
+        Returns the indices of the neurons with non-zero activity
+        """
+        tau_rc = self._tau_rc
+        amplitude = self._amplitude
+
+        if not self.spiking:
+            active = np.flatnonzero(J > 1)
+            output.fill(0)
+            output[active] = amplitude / (
+                self._tau_ref + tau_rc * np.log1p(1.0 / (J[active] - 1)))
+            return active
+
+        dt = self.dt
+        voltage = self._voltage[neurons]
+        refractory_time = self._refractory_time[neurons]
+        decay = self._voltage_decay[neurons]
+        tmp = self._tmp[neurons]
+
+        refractory_time -= dt
+        # only neurons still refractory for part of this step need their
+        # own voltage decay, the rest integrate for the whole time step
+        refractory = np.flatnonzero(refractory_time > 0)
+        if len(refractory) > 0:
+            decay[refractory] = np.expm1(-np.maximum(
+                dt - refractory_time[refractory], 0) / tau_rc)
+        np.subtract(J, voltage, out=tmp)
+        tmp *= decay
+        voltage -= tmp
+        if len(refractory) > 0:
+            decay[refractory] = self._full_step_decay
+
+        spiked = np.flatnonzero(voltage > 1)
+        output.fill(0)
+        np.maximum(voltage, self._min_voltage, out=voltage)
+        if len(spiked) > 0:
+            output[spiked] = amplitude / dt
+            t_spike = dt + tau_rc * np.log1p(
+                -(voltage[spiked] - 1) / (J[spiked] - 1))
+            voltage[spiked] = 0
+            refractory_time[spiked] = self._tau_ref + t_spike
+        return spiked
+
+    def step(self, input_signal, training_signal):
+        """ Runs the network for one time step
+
+        As in Nengo, the weight change found on each step is applied at
+        the start of the next step, so the output is found with the
+        weights learned up to the previous step.
+
+        Parameters
+        ----------
+        input_signal : np.array
+            the input to the ensembles
+        training_signal : np.array
+            the learning signal, the weights change to increase the
+            output along this direction
+        """
+        if self.sparse:
+            return self._step_sparse(input_signal, training_signal)
+        if self._pool is not None:
+            return self._step_parallel(input_signal, training_signal)
+        if self.quantized:
+            return self._step_quantized(input_signal, training_signal)
+
+        # apply the weight change from the previous step, as a rank one
+        # update of the weights in place, without building the outer product
+        self._ger(self.alpha, self._learning_activities(self._filtered),
+                  self._training_signal, a=self._weights.T,
+                  overwrite_a=True)
+
+        # input current to each neuron
+        np.dot(input_signal, self._encoders_T, out=self._J)
+        self.J += self.bias
+        self._neurons(self._J, self._activities)
+
+        # decode the output of each ensemble and sum
+        if self.weights_dtype == 'float64':
+            np.dot(self._weights, self._activities, out=self.output)
+        else:
+            self.output[:] = np.dot(
+                self._weights, self._activities.astype(self._weights.dtype))
+
+        # lowpass filter the activities for learning
+        self._filtered *= self.decay
+        np.multiply(self._activities, 1 - self.decay, out=self._tmp)
+        self._filtered += self._tmp
+        # the PES update, with error = -training_signal, is applied
+        # on the next step
+        self._training_signal[:] = training_signal
+
+        return self.output
+
+    def _learning_activities(self, filtered):
+        """ Returns the filtered activities in the precision of the
+        weights, for the rank one weight update
+
+        Parameters
+        ----------
+        filtered : np.array
+            the filtered activities
+        """
+        if self.weights_dtype != 'float32':
+            return filtered
+        # filtered activities decay below the smallest normal float32
+        # long after a neuron stops firing, and BLAS is much slower
+        # with the subnormal numbers they would be stored as
+        filtered = filtered.astype('float32')
+        filtered[filtered < np.finfo('float32').tiny] = 0
+        return filtered
+
+    def _step_quantized(self, input_signal, training_signal):
+        """ Runs the network for one time step with int16 weights,
+        updating and decoding from the weights one block of neurons at a
+        time
+
+        Parameters
+        ----------
+        input_signal : np.array
+            the input to the ensembles
+        training_signal : np.array
+            the learning signal
+        """
+        # input current to each neuron
+        np.dot(input_signal, self._encoders_T, out=self._J)
+        self.J += self.bias
+        self._neurons(self._J, self._activities)
+
+        self.output.fill(0)
+        for block in self._blocks:
+            weights = self._block[:self.n_output * (
+                block.stop - block.start)].reshape(self.n_output, -1)
+            np.multiply(self._weights[:, block], self._scale, out=weights)
+            # apply the weight change from the previous step
+            blas.dger(self.alpha, self._filtered[block],
+                      self._training_signal, a=weights.T, overwrite_a=True)
+            # decode from the rounded weights
+            self._store_block(weights, block)
+            self.output += np.dot(weights, self._activities[block])
+
+        # lowpass filter the activities for learning
+        self._filtered *= self.decay
+        np.multiply(self._activities, 1 - self.decay, out=self._tmp)
+        self._filtered += self._tmp
+        self._training_signal[:] = training_signal
+
+        return self.output
+
+    def _step_sparse(self, input_signal, training_signal):
+        """ Runs the network for one time step, only decoding from and
+        updating the weights of the neurons in the working set
+
+        Parameters
+        ----------
+        input_signal : np.array
+            the input to the ensembles
+        training_signal : np.array
+            the learning signal
+        """
+        n = self._n_working
+        # apply the weight change from the previous step
+        if n > 0:
+            blas.dger(self.alpha, self._training_signal,
+                      self._working_filtered[:n],
+                      a=self._working_weights[:n].T, overwrite_a=True)
+
+        # input current to each neuron
+        np.dot(input_signal, self._encoders_T, out=self._J)
+        self.J += self.bias
+        active = self._neurons(self._J, self._activities)
+
+        # add newly active neurons to the working set
+        entering = active[self._slot[active] < 0]
+        if len(entering) > 0:
+            if n + len(entering) > len(self._working_neurons):
+                self._resize_working_set(2 * (n + len(entering)))
+            slots = np.arange(n, n + len(entering))
+            self._working_weights[slots] = np.take(
+                self._weights, entering, axis=0)
+            if self.quantized:
+                self._working_weights[slots] *= np.take(
+                    self._scale, entering, axis=0)
+            self._working_filtered[slots] = 0
+            self._working_neurons[slots] = entering
+            self._slot[entering] = slots
+            n += len(entering)
+        self._n_working = n
+
+        # decode the output from the working set
+        neurons = self._working_neurons[:n]
+        activities = np.take(self._activities, neurons)
+        weights = self._working_weights[:n]
+        np.dot(activities, weights, out=self.output)
+
+        # lowpass filter the activities of the working set
+        filtered = self._working_filtered[:n]
+        filtered *= self.decay
+        activities *= 1 - self.decay
+        filtered += activities
+
+        # neurons whose activity has decayed away leave the working set,
+        # their weights are copied back and the last rows fill the gaps
+        leaving = np.flatnonzero(filtered <= self.active_tol)
+        if len(leaving) > 0:
+            self._write_rows(neurons[leaving], weights[leaving])
+            self._slot[neurons[leaving]] = -1
+            n -= len(leaving)
+            holes = leaving[leaving < n]
+            moving = np.arange(n, self._n_working)
+            moving = moving[filtered[moving] > self.active_tol]
+            weights[holes] = weights[moving]
+            filtered[holes] = filtered[moving]
+            neurons[holes] = neurons[moving]
+            self._slot[neurons[holes]] = holes
+            self._n_working = n
+
+        self._training_signal[:] = training_signal
+
+        return self.output
+
+    def _step_group(self, group, neurons, input_signal):
+        """ Runs a group of ensembles for one time step, returns the
+        sum of their outputs
+
+        Parameters
+        ----------
+        group : np.array
+            the indices of the ensembles
+        neurons : slice
+            the range of neurons in the group
+        input_signal : np.array
+            the input to the ensembles
+        """
+        for ii in group:
+            self._ger(self.alpha,
+                      self._learning_activities(self.filtered[ii]),
+                      self._training_signal, a=self._weights[ii].T,
+                      overwrite_a=True)
+
+        J = self._J[neurons]
+        activities = self._activities[neurons]
+        np.dot(input_signal, self._encoders_T[:, neurons], out=J)
+        J += self.bias.reshape(-1)[neurons]
+        self._neurons(J, activities, neurons)
+
+        output = np.zeros(self.n_output)
+        for ii in group:
+            output += np.dot(self._weights[ii], np.asarray(
+                self.activities[ii], dtype=self._weights.dtype))
+
+        filtered = self._filtered[neurons]
+        tmp = self._tmp[neurons]
+        filtered *= self.decay
+        np.multiply(activities, 1 - self.decay, out=tmp)
+        filtered += tmp
+        return output
+
+    def _step_parallel(self, input_signal, training_signal):
+        """ Runs the network for one time step, with each group of
+        ensembles run in parallel
+
+        Parameters
+        ----------
+        input_signal : np.array
+            the input to the ensembles
+        training_signal : np.array
+            the learning signal
+        """
+        input_signal = np.asarray(input_signal, dtype='float')
+        futures = [self._pool.submit(self._step_group, group, neurons,
+                                     input_signal)
+                   for group, neurons in self._groups]
+        self.output[:] = 0
+        for future in futures:
+            self.output += future.result()
+        self._training_signal[:] = training_signal
+
+        return self.output
+
+    def reset_learning(self):
+        """ Clears the filtered activities and the weight change waiting
+        to be applied, so that when the engine is run again after a
+        pause it doesn't learn from the activities before the pause
+
+        In sparse mode the working set is emptied, copying its weights
+        back first.
+        """
+        self._training_signal.fill(0)
+        self._filtered.fill(0)
+        if self._n_working > 0:
+            self._flush_working_set()
+            self._slot[self._working_neurons[:self._n_working]] = -1
+            self._working_filtered[:self._n_working] = 0
+            self._n_working = 0
+
+    def close(self):
+        """ Stops the worker threads """
+        if self._pool is not None:
+            self._pool.shutdown()
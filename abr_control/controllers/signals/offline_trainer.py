@@ -0,0 +1,244 @@
+import multiprocessing
+
+import numpy as np
+import scipy.linalg
+import scipy.signal
+
+try:
+    import nengo
+except ImportError:
+    raise Exception('Nengo module needs to be installed to ' +
+                    'use adaptive dynamics.')
+
+# the network parameters in each worker process, see _init_worker
+_worker_params = None
+
+
+def _init_worker(params):
+    """ Stores the network parameters once in each worker process """
+    global _worker_params  # pylint: disable=global-statement
+    _worker_params = params
+
+
+def _activities(params, inputs):
+    """ Returns the (n_samples, n_ensembles * n_neurons) firing rates
+    of all neurons for a batch of inputs
+
+    Parameters
+    ----------
+    params : dict
+        the network parameters, see OfflineTrainer
+    inputs : np.array
+        the (n_samples, n_input) input signals
+    """
+    J = np.dot(inputs, params['encoders_T'])
+    n = J.shape[1]
+    return params['neuron_type'].rates(J, np.ones(n), params['bias'])
+
+
+def _pes_batch(batch):
+    """ Returns the PES weight change for a batch of samples, found with
+    the filtered activities starting from zero, and what is needed to
+    correct for the actual filter state at the start of the batch
+
+    Parameters
+    ----------
+    batch : tuple
+        the (n_samples, n_input) input signals and
+        (n_samples, n_output) training signals
+    """
+    inputs, training_signals = batch
+    params = _worker_params
+    decay = params['decay']
+
+    activities = _activities(params, inputs)
+    # lowpass filter the activities, as the PES pre_synapse does
+    filtered = scipy.signal.lfilter(
+        [1 - decay], [1, -decay], activities, axis=0)
+    delta = np.dot(training_signals.T, filtered)
+    # the filter state f0 at the start of the batch adds
+    # decay**(t+1) * f0 to the filtered activities on step t
+    powers = decay ** np.arange(1, len(inputs) + 1)
+    return (delta, filtered[-1], np.dot(powers, training_signals),
+            powers[-1])
+
+
+def _gram_batch(batch):
+    """ Returns A^T A and A^T Y for a batch, where A are the activities
+    and Y the targets, and the largest activity
+
+    Parameters
+    ----------
+    batch : tuple
+        the (n_samples, n_input) input signals and
+        (n_samples, n_output) targets
+    """
+    inputs, targets = batch
+    activities = _activities(_worker_params, inputs)
+    return (np.dot(activities.T, activities), np.dot(activities.T, targets),
+            np.max(activities))
+
+
+class OfflineTrainer():
+    """ Trains the weights of an adaptive network from recorded signals
+
+    Rather than learning one time step at a time through generate, the
+    firing rates of all neurons for a whole batch of logged inputs are
+    found at once, and the weights are updated with matrix products
+    over the batch. Batches can be split between processes.
+
+    Rate neurons are used, so networks of spiking neurons learn the
+    weights their rate equivalents would.
+
+    Parameters
+    ----------
+    adaptation : DynamicsAdaptation
+        the adaptive network to train, training starts from its
+        current weights
+    batch_size : int, optional (Default: 1000)
+        the number of samples processed at once, the activities of all
+        neurons for a batch are kept in memory
+    n_processes : int, optional (Default: 1)
+        the number of processes to split the batches between
+    """
+
+    def __init__(self, adaptation, batch_size=1000, n_processes=1):
+        self.adaptation = adaptation
+        self.batch_size = batch_size
+        self.n_processes = n_processes
+
+        if adaptation.backend == 'numpy':
+            engine = adaptation.engine
+            scaled_encoders = engine.scaled_encoders
+            bias = engine.bias
+            self.alpha = engine.alpha
+            decay = engine.decay
+        else:
+            model = nengo.builder.Model(
+                dt=.001, decoder_cache=nengo.cache.get_default_decoder_cache())
+            model.build(adaptation.nengo_model)
+            scaled_encoders = np.array([model.params[ens].scaled_encoders
+                                        for ens in adaptation.adapt_ens])
+            bias = np.array([model.params[ens].bias
+                             for ens in adaptation.adapt_ens])
+            rule = adaptation.conn_learn[0].learning_rule_type
+            dt = model.dt
+            self.alpha = (rule.learning_rate * dt /
+                          adaptation.adapt_ens[0].n_neurons)
+            decay = (0 if rule.pre_synapse is None
+                     else np.exp(-dt / rule.pre_synapse.tau))
+
+        self.weights = np.array(adaptation.get_weights(), dtype='float')
+        self.n_ensembles, self.n_output, self.n_neurons = self.weights.shape
+        n_input = scaled_encoders.shape[2]
+        self._params = {
+            'encoders_T': np.ascontiguousarray(
+                scaled_encoders.reshape(-1, n_input).T),
+            'bias': bias.reshape(-1),
+            # the rates of spiking neurons are found analytically
+            'neuron_type': adaptation.adapt_ens[0].neuron_type,
+            'decay': decay}
+
+    def _map(self, function, signals):
+        """ Applies function to each batch of signals in order, using a
+        pool of processes if n_processes > 1
+
+        Parameters
+        ----------
+        function : function
+            the function to apply
+        signals : list of np.array
+            the signals to split into batches, each with one row per sample
+        """
+        n_samples = len(signals[0])
+        batches = [tuple(np.asarray(signal[ii:ii + self.batch_size],
+                                    dtype='float') for signal in signals)
+                   for ii in range(0, n_samples, self.batch_size)]
+        if self.n_processes > 1:
+            pool = multiprocessing.Pool(
+                self.n_processes, initializer=_init_worker,
+                initargs=(self._params,))
+            try:
+                return pool.map(function, batches)
+            finally:
+                pool.close()
+                pool.join()
+        _init_worker(self._params)
+        return [function(batch) for batch in batches]
+
+    def activities(self, inputs):
+        """ Returns the (n_samples, n_ensembles, n_neurons) firing rates
+        of the neurons for each input
+
+        Parameters
+        ----------
+        inputs : np.array
+            the (n_samples, n_input) input signals
+        """
+        activities = _activities(self._params, np.asarray(inputs))
+        return activities.reshape(-1, self.n_ensembles, self.n_neurons)
+
+    def train(self, input_signals, training_signals):
+        """ Applies the PES updates for a recording of the
+        input and training signals passed to generate
+
+        The training signals don't depend on the weights, so the update
+        from each batch is found independently and summed, giving the
+        same weights as learning online one step at a time.
+
+        Parameters
+        ----------
+        input_signals : np.array
+            the (n_samples, n_input) recorded input signals
+        training_signals : np.array
+            the (n_samples, n_output) recorded training signals
+        """
+        results = self._map(_pes_batch, [input_signals, training_signals])
+
+        delta = np.zeros((self.n_output, self.n_ensembles * self.n_neurons))
+        # the filtered activities at the start of each batch
+        filtered = np.zeros(self.n_ensembles * self.n_neurons)
+        for batch_delta, batch_filtered, training_sum, decay in results:
+            delta += batch_delta
+            delta += np.outer(training_sum, filtered)
+            filtered = batch_filtered + decay * filtered
+
+        self.weights += self.alpha * delta.reshape(
+            self.n_output, self.n_ensembles,
+            self.n_neurons).transpose(1, 0, 2)
+        return self.weights
+
+    def fit(self, input_signals, targets, reg=0.1):
+        """ Replaces the weights with the regularized least squares
+        solution, so the summed output of the ensembles best matches the
+        targets, using the same regularization as nengo.solvers.LstsqL2
+
+        Parameters
+        ----------
+        input_signals : np.array
+            the (n_samples, n_input) recorded input signals
+        targets : np.array
+            the (n_samples, n_output) desired adaptive output
+        reg : float, optional (Default: 0.1)
+            amount of regularization, as a fraction of the
+            largest firing rate
+        """
+        results = self._map(_gram_batch, [input_signals, targets])
+
+        gram = sum(result[0] for result in results)
+        rhs = sum(result[1] for result in results)
+        sigma = reg * max(result[2] for result in results)
+        gram[np.diag_indices_from(gram)] += len(targets) * sigma**2
+        weights = scipy.linalg.solve(gram, rhs, assume_a='pos').T
+
+        self.weights = weights.reshape(
+            self.n_output, self.n_ensembles,
+            self.n_neurons).transpose(1, 0, 2).copy()
+        return self.weights
+
+    def save_weights(self, **kwargs):
+        """ Saves the trained weights in the same format and location as
+        DynamicsAdaptation.save_weights, so they can be loaded with
+        load_weights, taking the same parameters
+        """
+        self.adaptation.save_weights(weights=list(self.weights), **kwargs)
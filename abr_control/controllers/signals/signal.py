@@ -1,3 +1,9 @@
+import numpy as np
+import sympy as sp
+
+from abr_control.arms.base_config import BaseConfig
+
+
 class Signal:
     """ Base class for additive control signals
 
@@ -11,6 +17,8 @@ class Signal:
     def __init__(self, robot_config):
 
         self.robot_config = robot_config
+        # finds the position of every joint at once, see _joint_positions
+        self._joint_positions_function = None
 
     def generate(self, q):
         """ Generates the control signal
@@ -19,3 +27,87 @@ class Signal:
           the current joint angles [radians]
         """
         raise NotImplementedError
+
+    def _joint_positions(self, q):
+        """ Returns the position of each joint and the end-effector,
+        stacked in order so that rows ii and ii+1 are the start and end
+        points of arm segment ii
+
+        Parameters
+        ----------
+        q : np.array
+            the current joint angles [radians]
+        """
+        if self._joint_positions_function is None:
+            self._joint_positions_function = self._calc_joint_positions()
+        return self._joint_positions_function(q)
+
+    def _calc_joint_positions(self):
+        """ Generates the function returning the position of each joint
+        and the end-effector
+
+        The transforms of all frames are lambdified together, so that
+        the terms they share are only evaluated once per call. Configs
+        that don't build their transforms with Sympy, such as a
+        TabulatedConfig, fall back to calling Tx for each frame.
+        """
+        robot_config = self.robot_config
+        names = ['joint%i' % ii for ii in range(robot_config.N_JOINTS)]
+        names.append('EE')
+
+        if not isinstance(robot_config, BaseConfig):
+            return lambda q: np.array(
+                [robot_config.Tx(name, q=q) for name in names],
+                dtype='float')
+
+        Tx = sp.Matrix([
+            list(robot_config._calc_Tx(
+                name, x=robot_config.x_zeros, lambdify=False)[:3])
+            for name in names])
+        function = sp.lambdify(robot_config.q, Tx, 'numpy', cse=True)
+        return lambda q: np.array(function(*q), dtype='float')
+
+    def _project_forces(self, q, segments, points, forces, M_inv):
+        """ Converts Cartesian forces applied to points on the arm into
+        joint torques, as in (Khatib, 1987)
+
+        Parameters
+        ----------
+        q : np.array
+            the current joint angles [radians]
+        segments : list of ints
+            the arm segment each point lies on, segment ii runs from
+            joint ii to joint ii+1 (or the end-effector)
+        points : np.array
+            the (x, y, z) position of each point in world space [meters]
+        forces : np.array
+            the (x, y, z) force applied at each point
+        M_inv : np.array
+            the inverse of the joint space inertia matrix
+        """
+        u = np.zeros(self.robot_config.N_JOINTS)
+        if len(segments) == 0:
+            return u
+
+        T_invs = {}
+        J = np.zeros((len(segments), 3, self.robot_config.N_JOINTS))
+        for jj, (ii, point) in enumerate(zip(segments, points)):
+            # NOTE: the relevant link is ii+1, because the configuration
+            # scripts are set up so link 0 is from origin to joint 0
+            link = 'link%i' % (ii + 1)
+            if link not in T_invs:
+                T_invs[link] = self.robot_config.T_inv(link, q=q)
+            # get offset of the point from the link's reference frame
+            m = np.dot(T_invs[link], np.hstack([point, [1]]))[:-1]
+            # calculate the Jacobian for this point
+            J[jj] = self.robot_config.J(link, x=m, q=q)[:3]
+
+        # calculate the inertia matrix for each point in task space
+        Mx_inv = np.matmul(J, np.matmul(M_inv, J.transpose(0, 2, 1)))
+        # using the rcond to set singular values < thresh to 0
+        # is slightly faster than doing it manually with svd
+        Mx = np.linalg.pinv(Mx_inv, rcond=.01)
+
+        Fx = np.matmul(Mx, np.asarray(forces)[:, :, None])
+        u -= np.sum(np.matmul(J.transpose(0, 2, 1), Fx), axis=0)[:, 0]
+        return u
@@ -0,0 +1,222 @@
+import itertools
+
+import numpy as np
+
+from .dynamics_adaptation import DynamicsAdaptation
+from .numpy_engine import NumpyEngine
+
+
+class TiledAdaptation():
+    """ Nonlinear dynamics adaptation with a mixture of small adaptive
+    networks, each covering one region of the input space
+
+    The input space is split into a grid of tiles, and each tile has its
+    own adaptive ensembles. Each step only the ensembles of the tiles
+    containing the current input are run and trained, so the number of
+    neurons, and the detail that can be learned, grows with the number of
+    tiles while the cost of each step stays the same. The ensembles of a
+    tile are created the first time the input enters it.
+
+    The input to each tile's ensembles is rescaled so that the tile
+    spans [-1, 1], so the tiles all share the neuron parameters of a
+    single network, built once with the numpy backend of
+    DynamicsAdaptation. The neurons of inactive tiles are not run, so
+    their filtered activities and membrane voltages are held until the
+    input returns.
+
+    With overlap, neighbouring tiles share a band around their common
+    border, where both are run and their outputs are blended with
+    weights that change linearly across the band, so the output changes
+    smoothly from one tile to the next. Each tile is trained with the
+    training signal scaled by its blending weight. Up to 2**len(tile_dims)
+    tiles are run on steps where the input is near a corner, so with many
+    tiled dimensions keep the overlap small.
+
+    When the input leaves a tile, the tile's filtered activities and the
+    weight change it had yet to apply are cleared, so that it doesn't
+    learn from its last visit when the input returns.
+
+    Parameters
+    ----------
+    n_input : int
+        the number of inputs, expected to be in the range [-1, 1], such
+        as the joint angles after robot_config.scaledown
+    n_output : int
+        the number of outputs
+    n_tiles : int or list of ints, optional (Default: 2)
+        the number of tiles along each tiled dimension, or a list with
+        the number for each tiled dimension
+    tile_dims : list of ints, optional (Default: None)
+        the input dimensions split into tiles, if None all of them.
+        Inputs that are not tiled, such as velocities, are passed to the
+        ensembles of every tile unchanged
+    overlap : float, optional (Default: 0.0)
+        the width of the band shared by neighbouring tiles, as a fraction
+        of the width of a tile, in the range [0, 0.5]
+    n_neurons : int, optional (Default: 200)
+        the number of neurons per ensemble of each tile
+    kwargs : dict
+        the parameters of the DynamicsAdaptation network used as the
+        template for the ensembles of each tile, such as n_ensembles,
+        seed, pes_learning_rate, intercepts, sparse, n_workers, and
+        weights_dtype
+
+    Attributes
+    ----------
+    active : list of tuples
+        the index of each tile run on the last step
+    blend : np.array
+        the blending weight of each active tile on the last step
+    """
+
+    def __init__(self, n_input, n_output, n_tiles=2, tile_dims=None,
+                 overlap=0.0, n_neurons=200, **kwargs):
+
+        if not 0 <= overlap <= 0.5:
+            raise Exception('Overlap must be between 0 and 0.5')
+        kwargs.setdefault('backend', 'numpy')
+        if kwargs['backend'] != 'numpy':
+            raise Exception('Tiled adaptation requires the numpy backend')
+
+        self.n_input = n_input
+        self.n_output = n_output
+        self.tile_dims = (np.arange(n_input) if tile_dims is None
+                          else np.asarray(tile_dims, dtype=int))
+        self.n_tiles = np.broadcast_to(
+            np.asarray(n_tiles, dtype=int), self.tile_dims.shape).copy()
+        self.overlap = overlap
+        # the width of each tile, along each tiled dimension
+        self.width = 2.0 / self.n_tiles
+
+        self.template = DynamicsAdaptation(
+            n_input, n_output, n_neurons=n_neurons, **kwargs)
+        self.engines = {}
+        # the seed of each tile's engine, drawn from the template seed
+        seed = kwargs.get('seed', None)
+        self._seeds = (
+            np.full(self.n_tiles, None) if seed is None else
+            np.random.RandomState(seed).randint(2**31, size=self.n_tiles))
+
+        self.active = []
+        self.blend = np.zeros(0)
+        self.output = np.zeros(n_output)
+        self._local = np.zeros(n_input)
+
+    def _engine(self, tile):
+        """ Returns the engine running the ensembles of a tile, creating
+        it if the tile has not been visited before
+
+        Parameters
+        ----------
+        tile : tuple of ints
+            the index of the tile along each tiled dimension
+        """
+        engine = self.engines.get(tile, None)
+        if engine is None:
+            template = self.template.engine
+            engine = NumpyEngine(
+                template.scaled_encoders, template.bias,
+                np.zeros((template.n_ensembles, self.n_output,
+                          template.n_neurons)),
+                template.neuron_type, template.learning_rate,
+                pre_tau=template.pre_tau, dt=template.dt,
+                voltage=template.voltage,
+                refractory_time=template.refractory_time,
+                sparse=template.sparse, active_tol=template.active_tol,
+                n_workers=template.n_workers,
+                weights_dtype=template.weights_dtype,
+                seed=self._seeds[tile])
+            self.engines[tile] = engine
+        return engine
+
+    def _memberships(self, x):
+        """ Returns the tiles along each tiled dimension containing the
+        input, and the blending weight of each
+
+        Parameters
+        ----------
+        x : np.array
+            the input along the tiled dimensions
+        """
+        x = np.clip(x, -1, 1)
+        indices = []
+        weights = []
+        for xi, n, width in zip(x, self.n_tiles, self.width):
+            # the tile containing xi, and the position within it
+            ii = min(int((xi + 1) / width), n - 1)
+            offset = (xi + 1) / width - ii - 0.5
+            band = self.overlap
+            if band > 0 and offset > 0.5 - band and ii < n - 1:
+                weight = (offset - 0.5 + band) / (2 * band)
+                indices.append((ii, ii + 1))
+                weights.append((1 - weight, weight))
+            elif band > 0 and offset < band - 0.5 and ii > 0:
+                weight = (band - 0.5 - offset) / (2 * band)
+                indices.append((ii - 1, ii))
+                weights.append((weight, 1 - weight))
+            else:
+                indices.append((ii,))
+                weights.append((1.0,))
+        return indices, weights
+
+    def local_input(self, input_signal, tile):
+        """ Returns the input rescaled so that the tile and the bands it
+        shares with its neighbours span [-1, 1]
+
+        Parameters
+        ----------
+        input_signal : np.array
+            the input signal
+        tile : tuple of ints
+            the index of the tile along each tiled dimension
+        """
+        local = np.array(input_signal, dtype='float')
+        center = -1 + (np.asarray(tile) + 0.5) * self.width
+        half_width = self.width * (0.5 + self.overlap)
+        local[self.tile_dims] = (
+            local[self.tile_dims] - center) / half_width
+        return local
+
+    def generate(self, input_signal, training_signal):
+        """ Generates the control signal
+
+        Parameters
+        ----------
+        input_signal : numpy.array
+            the current desired input signal, typical joint positions and
+            velocities in [rad] and [rad/sec] respectively, scaled to
+            be in the range [-1, 1]
+        training_signal : numpy.array
+            the learning signal to drive adaptation
+        """
+        input_signal = np.asarray(input_signal, dtype='float')
+        training_signal = np.asarray(training_signal, dtype='float')
+        indices, weights = self._memberships(input_signal[self.tile_dims])
+
+        previous = self.active
+        self.active = list(itertools.product(*indices))
+        for tile in previous:
+            if tile not in self.active:
+                self.engines[tile].reset_learning()
+        self.blend = np.array([np.prod(blend) for blend in
+                               itertools.product(*weights)])
+        self.output.fill(0)
+        for tile, blend in zip(self.active, self.blend):
+            engine = self._engine(tile)
+            self.output += blend * engine.step(
+                self.local_input(input_signal, tile),
+                blend * training_signal)
+
+        return np.copy(self.output)
+
+    def get_weights(self):
+        """ Returns the learned weights of each visited tile, as a dict of
+        (n_ensembles, n_output, n_neurons) arrays keyed by tile index """
+        return dict((tile, np.array(engine.weights))
+                    for tile, engine in self.engines.items())
+
+    def close(self):
+        """ Stops the worker threads of the template and tile engines """
+        self.template.engine.close()
+        for engine in self.engines.values():
+            engine.close()
@@ -19,17 +19,23 @@ class Sliding(controller.Controller):
     cartesian : boolean, optional (Default: True)
         if True transforms control from Cartesian into joint space
         if False control assumed to be entirely in joint space
+    damping : float, optional (Default: 0.01)
+        damping term of the least-squares Jacobian inverse, bounds the
+        joint space reference signals near singularities
 
     """
     def __init__(self, robot_config,
                  kd=160.0, lamb=30.0,
-                 cartesian=True):
+                 cartesian=True, damping=0.01):
 
         super(Sliding, self).__init__(robot_config)
 
         self.kd = kd
         self.lamb = lamb
         self.cartesian = cartesian
+        self.damping = damping
+
+        self.DAMPING_3 = np.eye(3) * self.damping**2
 
     def generate(self, q, dq,
                  target_pos, target_vel=None, target_acc=None,
@@ -67,7 +73,11 @@ class Sliding(controller.Controller):
             xyz = self.robot_config.Tx(ref_frame, q, x=offset)
             dxyz = np.dot(J, dq)
 
-            J_inv = np.linalg.pinv(J)
+            # damped least-squares inverse, J^T (J J^T + damping^2 I)^-1,
+            # a 3x3 solve instead of the SVD in pinv, reused for both the
+            # reference velocity and acceleration
+            J_inv = np.linalg.solve(
+                np.dot(J, J.T) + self.DAMPING_3, J).T
             dJ = self.robot_config.dJ(ref_frame, q, dq, x=offset)[:3]
 
             dq_ref = np.dot(
@@ -0,0 +1,33 @@
+import pytest
+
+from abr_control.arms import base_config
+
+
+@pytest.fixture(scope='session')
+def session_cache_dir(tmp_path_factory):
+    """ A folder shared by all tests for the caches that are slow to fill,
+    such as the functions generated for each robot config """
+    return tmp_path_factory.mktemp('cache')
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, session_cache_dir, monkeypatch):
+    """ Points the caches written by the robot configs, the adaptive
+    signals, and Nengo at temporary folders, so running the tests doesn't
+    fill the user's cache
+    """
+    # the generated functions, and the TabulatedConfig and iLQR files
+    # saved in each robot config's folder
+    monkeypatch.setattr(base_config, 'cache_dir', str(session_cache_dir))
+    try:
+        import nengo
+        from abr_control.controllers.signals import (
+            avoid_distance_field, dynamics_adaptation)
+    except Exception:
+        # nengo isn't installed, the tests using the signals are skipped
+        return tmp_path
+    monkeypatch.setitem(nengo.rc['decoder_cache'], 'path',
+                        str(session_cache_dir / 'nengo'))
+    monkeypatch.setattr(avoid_distance_field, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(dynamics_adaptation, 'cache_dir', str(tmp_path))
+    return tmp_path
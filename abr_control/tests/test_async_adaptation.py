@@ -0,0 +1,67 @@
+import time
+
+import numpy as np
+
+from abr_control.controllers.signals.async_adaptation import (
+    AsyncAdaptation, SharedSlot)
+
+
+class SlowAdaptation():
+    """ Returns the sum of the input and training signal, slowly """
+    def __init__(self, delay):
+        self.delay = delay
+        self.n_calls = 0
+
+    def generate(self, input_signal, training_signal):
+        time.sleep(self.delay)
+        self.n_calls += 1
+        return input_signal + training_signal
+
+
+def test_shared_slot():
+    slot = SharedSlot(3)
+    values, sequence = slot.read()
+    assert sequence == 0 and np.allclose(values, 0)
+    slot.write([1, 2, 3])
+    slot.write([4, 5, 6])
+    values, sequence = slot.read()
+    assert sequence == 2 and np.allclose(values, [4, 5, 6])
+
+    # a slot in memory shared with another slot
+    buffer = bytearray(8 * 4)
+    SharedSlot(3, buffer=buffer).write([7, 8, 9])
+    values, sequence = SharedSlot(3, buffer=buffer).read()
+    assert sequence == 1 and np.allclose(values, [7, 8, 9])
+
+
+def test_async_adaptation():
+    adaptation = SlowAdaptation(delay=.02)
+    adapt = AsyncAdaptation(adaptation, n_input=2, n_output=2)
+    try:
+        assert np.isnan(adapt.age)
+        start = time.time()
+        for ii in range(20):
+            output = adapt.generate(np.ones(2) * ii, np.ones(2))
+        # generate doesn't wait for the slow adaptation
+        assert time.time() - start < .2
+        assert adapt.staleness > 0
+        # the worker skips to the newest input instead of queuing them
+        time.sleep(.2)
+        output = adapt.generate(np.ones(2) * 19, np.ones(2))
+        assert np.allclose(output, 20)
+        assert adaptation.n_calls < 20
+    finally:
+        adapt.stop()
+
+    def fail(input_signal, training_signal):
+        raise ValueError('failed')
+    adaptation.generate = fail
+    # errors in the worker are raised in the control loop
+    adapt.start()
+    time.sleep(.05)
+    try:
+        adapt.generate(np.zeros(2), np.zeros(2))
+        assert False
+    except Exception as e:
+        assert 'failed' in str(e)
+    adapt.stop()
@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+
+from abr_control.arms import threejoint as arm
+from abr_control.controllers import signals
+
+
+def test_lookup():
+    robot_config = arm.Config()
+    rng = np.random.RandomState(0)
+    origin = np.array([-2.0, -2.0, -.5])
+    voxel_size = .05
+    obstacle = np.array([.5, 1.0, 0.0])
+
+    avoid = signals.AvoidDistanceField(
+        robot_config, shape=(81, 81, 21), origin=origin,
+        voxel_size=voxel_size, points=[obstacle])
+
+    # away from the obstacle the field is the distance to its voxel
+    points = obstacle + rng.uniform(-.5, .5, (100, 3))
+    points[:, 2] = rng.uniform(-.2, .2, 100)
+    distance, gradient = avoid.lookup(points)
+    exact = np.sqrt(np.sum((points - obstacle)**2, axis=1))
+    far = exact > .2
+    assert np.allclose(distance[far], exact[far], atol=voxel_size)
+    direction = (points - obstacle) / exact[:, None]
+    unit = gradient / np.sqrt(np.sum(gradient**2, axis=1))[:, None]
+    assert np.all(np.sum(unit[far] * direction[far], axis=1) > .9)
+
+    # points outside the grid are far from everything
+    distance, _ = avoid.lookup([[10, 10, 10]])
+    assert np.isinf(distance[0])
+
+
+def test_add_points():
+    robot_config = arm.Config()
+    rng = np.random.RandomState(1)
+    kwargs = {'shape': (61, 61, 11), 'origin': [-1.5, -1.5, -.25],
+              'voxel_size': .05, 'threshold': .3}
+
+    points = rng.uniform(-1.5, 1.5, (20, 3))
+    points[:, 2] = 0
+    new_points = rng.uniform(-1, 1, (5, 3))
+    new_points[:, 2] = 0
+
+    avoid = signals.AvoidDistanceField(robot_config, points=points, **kwargs)
+    avoid.add_points(new_points)
+    rebuilt = signals.AvoidDistanceField(
+        robot_config, points=np.vstack([points, new_points]), **kwargs)
+
+    # the updated field matches a rebuilt one wherever forces are applied
+    free = ~rebuilt.occupancy
+    near = free & (rebuilt.field[..., 0] < kwargs['threshold'])
+    assert np.all(avoid.field[..., 0][free] >= rebuilt.field[..., 0][free])
+    assert np.allclose(avoid.field[near], rebuilt.field[near], atol=1e-5)
+
+    # the arm is pushed away from a nearby obstacle
+    q = np.array([0.0, 0.0, 0.0])
+    ee = robot_config.Tx('EE', q)
+    kwargs['origin'] = ee - [1.5, 1.5, .25]
+    avoid = signals.AvoidDistanceField(robot_config, **kwargs)
+    assert np.allclose(avoid.generate(q), 0)
+    obstacle = ee + [0, .15, 0]
+    avoid.add_points([obstacle])
+    u = avoid.generate(q)
+    assert np.any(u != 0)
+    # the end-effector accelerates away from the obstacle, as it does
+    # with AvoidObstacles
+    ddq = np.dot(np.linalg.inv(robot_config.M(q)), u)
+    ddx = np.dot(robot_config.J('EE', q)[:3], ddq)
+    assert np.dot(ddx, ee - obstacle) > 0
+    u_obstacles = signals.AvoidObstacles(
+        robot_config, obstacles=[list(obstacle) + [0]],
+        threshold=kwargs['threshold']).generate(q)
+    ddx_obstacles = np.dot(robot_config.J('EE', q)[:3], np.dot(
+        np.linalg.inv(robot_config.M(q)), u_obstacles))
+    assert np.dot(ddx, ddx_obstacles) > 0
+
+
+def test_lookup_boundary():
+    robot_config = arm.Config()
+    avoid = signals.AvoidDistanceField(
+        robot_config, shape=(11, 11, 5), voxel_size=.1, points=[[.5, .5, .2]])
+
+    # the upper faces of the grid are inside, and match the last voxels
+    corner = np.array([1.0, 1.0, .4])
+    distance, gradient = avoid.lookup(corner)
+    assert np.isclose(distance[0], avoid.field[-1, -1, -1, 0])
+    assert np.allclose(gradient[0], avoid.field[-1, -1, -1, 1:])
+    distance, _ = avoid.lookup([[1.0, .5, .2], [.5, 1.0, .2], [0, 0, 0]])
+    assert np.all(np.isfinite(distance))
+    distance, _ = avoid.lookup(corner + [1e-6, 0, 0])
+    assert np.isinf(distance[0])
+
+
+def test_cache(cache_dir):
+    robot_config = arm.Config()
+    folder = os.path.join(str(cache_dir), 'distance_fields')
+    kwargs = {'shape': (11, 11, 5), 'voxel_size': .1, 'n_cached': 2}
+
+    for ii in range(4):
+        signals.AvoidDistanceField(
+            robot_config, points=[[ii * .1, .5, .2]], **kwargs)
+        assert len(os.listdir(folder)) == min(ii + 1, 2)
+
+    # not saved to file
+    avoid = signals.AvoidDistanceField(
+        robot_config, points=[[.9, .5, .2]], **dict(kwargs, n_cached=0))
+    assert len(os.listdir(folder)) == 2
+    saved = signals.AvoidDistanceField(
+        robot_config, points=[[.9, .5, .2]], **kwargs)
+    assert np.allclose(avoid.field, saved.field)
@@ -0,0 +1,86 @@
+import numpy as np
+
+from abr_control.arms import threejoint as arm
+from abr_control.controllers import signals
+
+
+def reference_generate(robot_config, obstacles, threshold, q):
+    """ The original loop over each obstacle and arm segment """
+    u_psp = np.zeros(robot_config.N_JOINTS)
+    M = robot_config.M(q)
+    for obstacle in obstacles:
+        v = np.array(obstacle[:3])
+        for ii in range(robot_config.N_JOINTS):
+            p1 = robot_config.Tx('joint%i' % ii, q=q)
+            if ii == robot_config.N_JOINTS - 1:
+                p2 = robot_config.Tx('EE', q=q)
+            else:
+                p2 = robot_config.Tx('joint%i' % (ii + 1), q=q)
+
+            vec_line = p2 - p1
+            projection = (np.dot(v - p1, vec_line) / np.sum(vec_line**2))
+            if projection < 0:
+                closest = p1
+            elif projection > 1:
+                closest = p2
+            else:
+                closest = p1 + projection * vec_line
+            dist = np.sqrt(np.sum((v - closest)**2))
+            rho = max(dist - obstacle[3], threshold/50)
+
+            if rho < threshold:
+                drhodx = (v - closest) / rho
+                Fpsp = (.02 * (1.0/rho - 1.0/threshold) *
+                        1.0/rho**1.5 * drhodx)
+                T_inv = robot_config.T_inv('link%i' % (ii+1), q=q)
+                m = np.dot(T_inv, np.hstack([closest, [1]]))[:-1]
+                Jpsp = robot_config.J('link%i' % (ii+1), x=m, q=q)[:3]
+                Mxpsp_inv = np.dot(Jpsp, np.dot(np.linalg.inv(M), Jpsp.T))
+                Mxpsp = np.linalg.pinv(Mxpsp_inv, rcond=.01)
+                u_psp += -np.dot(Jpsp.T, np.dot(Mxpsp, Fpsp))
+    return u_psp
+
+
+def test_generate():
+    robot_config = arm.Config(dtype='float64')
+    rng = np.random.RandomState(0)
+    threshold = .5
+
+    avoid = signals.AvoidObstacles(robot_config, threshold=threshold)
+    assert np.allclose(avoid.generate(np.zeros(3)), 0)
+
+    for n_obstacles in [1, 5, 50]:
+        obstacles = np.hstack([rng.uniform(-3, 3, (n_obstacles, 3)),
+                               rng.uniform(.05, .5, (n_obstacles, 1))])
+        obstacles[:, 2] = 0  # keep the obstacles in the plane of the arm
+        avoid.set_obstacles(obstacles)
+
+        for q in rng.uniform(-np.pi, np.pi, (10, 3)):
+            u = avoid.generate(q)
+            u_ref = reference_generate(robot_config, obstacles, threshold, q)
+            assert np.allclose(u, u_ref, rtol=1e-3, atol=1e-3)
+
+
+def test_broadphase():
+    robot_config = arm.Config(dtype='float64')
+    rng = np.random.RandomState(1)
+    threshold = .3
+
+    obstacles = np.hstack([rng.uniform(-3, 3, (2000, 3)),
+                           rng.uniform(.01, .1, (2000, 1))])
+    obstacles[:, 2] = rng.uniform(-.5, .5, 2000)
+    avoid = signals.AvoidObstacles(
+        robot_config, obstacles, threshold=threshold)
+    avoid_grid = signals.AvoidObstacles(
+        robot_config, obstacles, threshold=threshold, broadphase=True)
+
+    for q in rng.uniform(-np.pi, np.pi, (10, 3)):
+        assert np.allclose(avoid_grid.generate(q), avoid.generate(q),
+                           rtol=1e-5, atol=1e-5)
+
+        # move some of the obstacles, some into new grid cells
+        indices = rng.choice(len(obstacles), 100, replace=False)
+        moved = obstacles[indices] + np.hstack([
+            rng.uniform(-.5, .5, (100, 3)), np.zeros((100, 1))])
+        avoid.update_obstacles(indices, moved)
+        avoid_grid.update_obstacles(indices, moved)
@@ -0,0 +1,56 @@
+import numpy as np
+
+from abr_control.arms import threejoint as arm
+from abr_control.controllers import signals
+
+
+def test_closest_points():
+    rng = np.random.RandomState(0)
+    p1, q1, p2, q2 = rng.uniform(-1, 1, (4, 200, 3))
+    # include segments that are a single point and parallel segments
+    q1[:10] = p1[:10]
+    q2[5:15] = p2[5:15]
+    q2[20:30] = p2[20:30] + (q1[20:30] - p1[20:30])
+
+    s, t = signals.AvoidSelfCollision.closest_points(p1, q1, p2, q2)
+    dist = np.sqrt(np.sum(
+        (p1 + s[:, None] * (q1 - p1) - p2 - t[:, None] * (q2 - p2))**2,
+        axis=1))
+
+    # compare against the distance between densely sampled points
+    samples = np.linspace(0, 1, 201)[:, None, None]
+    for ii in range(200):
+        points1 = p1[ii] + samples[:, 0] * (q1[ii] - p1[ii])
+        points2 = p2[ii] + samples[:, 0] * (q2[ii] - p2[ii])
+        brute = np.min(np.sqrt(np.sum(
+            (points1[:, None] - points2[None])**2, axis=2)))
+        assert dist[ii] <= brute + 1e-9
+        assert dist[ii] > brute - 1e-2
+
+
+def test_generate():
+    robot_config = arm.Config()
+    avoid = signals.AvoidSelfCollision(robot_config, threshold=.2)
+    # only the first and last segments can collide
+    assert np.array_equal(avoid.pairs, [[0, 2]])
+
+    # stretched out, no collisions
+    assert np.allclose(avoid.generate(np.zeros(3)), 0)
+
+    # folded back so the last segment is near the first
+    q = np.array([0, 2.6, 2.8])
+    u = avoid.generate(q)
+    assert np.any(u != 0)
+
+    def separation(q):
+        joints = avoid._joint_positions(q)
+        s, t = avoid.closest_points(
+            joints[0], joints[1], joints[2], joints[3])
+        return np.sqrt(np.sum(
+            (joints[0] + s * (joints[1] - joints[0]) -
+             joints[2] - t * (joints[3] - joints[2]))**2))
+
+    # the segments move apart along the acceleration caused by u
+    ddq = np.dot(np.linalg.inv(robot_config.M(q)), u)
+    ddq /= np.linalg.norm(ddq)
+    assert separation(q + 1e-3 * ddq) > separation(q)
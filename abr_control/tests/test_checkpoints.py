@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+
+from abr_control.utils import checkpoints
+
+
+def test_checkpoint_store(tmp_path):
+    folder = str(tmp_path)
+    rng = np.random.RandomState(0)
+    weights = rng.randn(2, 3, 50)
+
+    store = checkpoints.CheckpointStore(folder, deltas=True, full_every=3)
+    saved = []
+    for ii in range(5):
+        # only change the weights of some neurons
+        weights[:, :, rng.randint(50, size=5)] += rng.randn(2, 3, 5)
+        assert store.save(weights) == ii
+        saved.append(np.copy(weights))
+    store.close()
+
+    files = [entry['file'] for entry in checkpoints.read_index(folder)]
+    assert files == [os.path.join('session0', name) for name in [
+        'run0.npy', 'run1.delta.npy', 'run2.delta.npy', 'run3.npy',
+        'run4.delta.npy']]
+
+    # a new store finds the saved runs in the index
+    store = checkpoints.CheckpointStore(folder)
+    assert checkpoints.latest_run(store.runs) == (0, 4)
+    for ii in range(5):
+        assert np.array_equal(store.load(ii), saved[ii])
+    assert np.array_equal(checkpoints.load_checkpoint(
+        os.path.join(folder, 'session0', 'run2.delta.npy')), saved[2])
+    full = checkpoints.load_checkpoint(
+        os.path.join(folder, 'session0', 'run3.npy'))
+    assert isinstance(full, np.memmap)
+    assert np.array_equal(full, saved[3])
+
+    # runs saved in a new session
+    store = checkpoints.CheckpointStore(folder, session=1)
+    assert store.save(weights) == 0
+    store.flush()
+    assert checkpoints.latest_run(checkpoints.read_index(folder)) == (1, 0)
+
+
+def test_index_existing_runs(tmp_path):
+    folder = str(tmp_path)
+    for session, run in [(0, 0), (0, 1), (1, 0), (1, 10), (1, 2)]:
+        os.makedirs(os.path.join(folder, 'session%i' % session),
+                    exist_ok=True)
+        np.savez_compressed(
+            os.path.join(folder, 'session%i' % session, 'run%i' % run),
+            weights=[np.ones((2, 3)) * run])
+
+    runs = checkpoints.read_index(folder)
+    # only written while holding the lock, along with the next run
+    assert not os.path.isfile(os.path.join(folder, checkpoints.INDEX_FILE))
+    assert len(runs) == 5
+    assert checkpoints.latest_run(runs) == (1, 10)
+    assert checkpoints.latest_run(runs, session=0) == (0, 1)
+    assert np.allclose(checkpoints.load_checkpoint(
+        os.path.join(folder, 'session1', 'run10.npz')), 10)
+
+    with checkpoints.index_lock(folder):
+        checkpoints.add_to_index(
+            folder, {'session': 1, 'run': 11, 'time': 0,
+                     'file': os.path.join('session1', 'run11.npz')})
+    assert os.path.isfile(os.path.join(folder, checkpoints.INDEX_FILE))
+    assert len(checkpoints.read_index(folder)) == 6
+
+
+def test_run_taken_before_write(tmp_path):
+    folder = str(tmp_path)
+    store = checkpoints.CheckpointStore(folder)
+    assert store.save(np.zeros(3)) == 0
+    store.flush()
+
+    with checkpoints.index_lock(folder):
+        # the store chooses run 1, but can't write it until the lock is
+        # released, by which time another writer has saved run 1
+        assert store.save(np.ones(3)) == 1
+        np.save(os.path.join(folder, 'session0', 'run1.npy'), np.zeros(3))
+        checkpoints.add_to_index(folder, {
+            'session': 0, 'run': 1, 'time': 0,
+            'file': os.path.join('session0', 'run1.npy')})
+    store.close()
+
+    assert [entry['run'] for entry in store.runs] == [0, 1, 2]
+    assert np.array_equal(store.load(1), np.zeros(3))
+    assert np.array_equal(store.load(2), np.ones(3))
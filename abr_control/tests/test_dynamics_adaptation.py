@@ -0,0 +1,238 @@
+import os
+
+import numpy as np
+import pytest
+
+nengo = pytest.importorskip('nengo')
+
+from abr_control.controllers import signals  # noqa: E402
+from abr_control.utils import checkpoints  # noqa: E402
+
+
+@pytest.mark.parametrize('neuron_type', [nengo.LIF(), nengo.LIFRate()])
+def test_numpy_backend(neuron_type):
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 100,
+              'n_ensembles': 2, 'seed': 0, 'pes_learning_rate': 1e-2,
+              'neuron_type': neuron_type}
+    adapt_nengo = signals.DynamicsAdaptation(backend='nengo', **kwargs)
+    adapt_numpy = signals.DynamicsAdaptation(backend='numpy', **kwargs)
+
+    rng = np.random.RandomState(0)
+    for ii in range(200):
+        input_signal = np.sin(ii / 50.0 + np.array([0, 1]))
+        training_signal = rng.randn(2)
+        output_nengo = np.copy(
+            adapt_nengo.generate(input_signal, training_signal))
+        output_numpy = adapt_numpy.generate(input_signal, training_signal)
+        assert np.allclose(output_nengo, output_numpy, atol=1e-12)
+    assert np.allclose(adapt_nengo.x, adapt_numpy.x)
+
+    weights = [adapt_nengo.sim.signals[adapt_nengo.sim.model.sig[conn][
+        'weights']] for conn in adapt_nengo.conn_learn]
+    assert np.allclose(weights, adapt_numpy.engine.weights, atol=1e-15)
+
+
+@pytest.mark.parametrize('neuron_type', [nengo.LIF(), nengo.LIFRate()])
+def test_sparse(neuron_type):
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 500,
+              'n_ensembles': 2, 'seed': 0, 'pes_learning_rate': 1e-3,
+              'neuron_type': neuron_type, 'backend': 'numpy'}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    adapt_sparse = signals.DynamicsAdaptation(sparse=True, **kwargs)
+
+    outputs = []
+    outputs_sparse = []
+    for ii in range(1000):
+        # a smoothly changing input, as in a control loop
+        input_signal = np.sin(ii / 200.0 + np.array([0, 1]))
+        training_signal = np.cos(ii / 100.0 + np.array([0, 2]))
+        outputs.append(np.copy(adapt.generate(
+            input_signal, training_signal)))
+        outputs_sparse.append(np.copy(adapt_sparse.generate(
+            input_signal, training_signal)))
+
+    outputs = np.array(outputs)
+    outputs_sparse = np.array(outputs_sparse)
+    assert np.max(np.abs(outputs)) > 0.1
+    assert np.allclose(outputs_sparse, outputs,
+                       atol=1e-3 * np.max(np.abs(outputs)))
+    assert np.allclose(adapt_sparse.engine.weights, adapt.engine.weights,
+                       atol=1e-3 * np.max(np.abs(adapt.engine.weights)))
+
+
+def test_build_cache(tmp_path):
+    kwargs = {'n_input': 3, 'n_output': 2, 'n_neurons': 200,
+              'n_ensembles': 2, 'seed': 1, 'backend': 'numpy'}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    build_file = adapt.build_cache_location(3, 200, 2, 1)
+    assert build_file.startswith(str(tmp_path))
+    assert os.path.isfile(build_file)
+
+    # a second network with the same parameters is built from the cache
+    adapt_cached = signals.DynamicsAdaptation(**kwargs)
+    assert np.array_equal(adapt_cached.engine.scaled_encoders,
+                          adapt.engine.scaled_encoders)
+    assert np.array_equal(adapt_cached.engine.bias, adapt.engine.bias)
+    assert np.array_equal(adapt_cached.decoders_x, adapt.decoders_x)
+
+    # a different seed doesn't use the cached parameters
+    kwargs['seed'] = 2
+    adapt_seed = signals.DynamicsAdaptation(**kwargs)
+    assert not np.allclose(adapt_seed.engine.bias, adapt.engine.bias)
+
+
+def test_checkpoint():
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 100,
+              'n_ensembles': 2, 'seed': 0, 'pes_learning_rate': 1e-2,
+              'backend': 'numpy', 'cache_build': False}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    adapt.save_weights(test_name='checkpoint')
+    for ii in range(100):
+        adapt.generate(np.sin(ii / 50.0 + np.array([0, 1])), np.ones(2))
+    assert adapt.checkpoint(test_name='checkpoint', deltas=True) == 1
+    adapt.checkpoints.flush()
+
+    # the latest checkpoint is found from the index
+    weights_file = adapt.load_weights(test_name='checkpoint')
+    assert weights_file.endswith('run1.npy')
+    adapt_loaded = signals.DynamicsAdaptation(
+        weights_file=weights_file, **kwargs)
+    assert np.allclose(adapt_loaded.engine.weights, adapt.engine.weights)
+
+
+def test_probe_weights():
+    adapt = signals.DynamicsAdaptation(
+        n_input=2, n_output=2, n_neurons=100, n_ensembles=2, seed=0,
+        pes_learning_rate=1e-2, backend='numpy',
+        probe_weights={'sample_every': 10, 'buffer_size': 5})
+    for ii in range(100):
+        adapt.generate(np.sin(ii / 50.0 + np.array([0, 1])), np.ones(2))
+    assert adapt.weights_telemetry.weights.shape == (5, 2, 2, 100)
+    assert np.allclose(adapt.weights_telemetry.weights[-1],
+                       adapt.engine.weights, atol=1e-3)
+
+
+@pytest.mark.parametrize('neuron_type', [nengo.LIF(), nengo.LIFRate()])
+def test_parallel(neuron_type):
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 100,
+              'n_ensembles': 5, 'seed': 0, 'pes_learning_rate': 1e-2,
+              'neuron_type': neuron_type, 'backend': 'numpy'}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    adapt_parallel = signals.DynamicsAdaptation(n_workers=2, **kwargs)
+
+    rng = np.random.RandomState(0)
+    for ii in range(200):
+        input_signal = np.sin(ii / 50.0 + np.array([0, 1]))
+        training_signal = rng.randn(2)
+        output = np.copy(adapt.generate(input_signal, training_signal))
+        output_parallel = adapt_parallel.generate(
+            input_signal, training_signal)
+        assert np.allclose(output, output_parallel, atol=1e-12)
+    assert np.allclose(adapt_parallel.x, adapt.x)
+    assert np.allclose(adapt_parallel.engine.weights, adapt.engine.weights,
+                       atol=1e-12)
+    adapt_parallel.engine.close()
+
+
+def test_parallel_float32():
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 100,
+              'n_ensembles': 4, 'seed': 0, 'pes_learning_rate': 1e-2,
+              'backend': 'numpy', 'weights_dtype': 'float32'}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    adapt_parallel = signals.DynamicsAdaptation(n_workers=2, **kwargs)
+
+    rng = np.random.RandomState(0)
+    for ii in range(200):
+        input_signal = np.sin(ii / 50.0 + np.array([0, 1]))
+        training_signal = rng.randn(2)
+        output = np.copy(adapt.generate(input_signal, training_signal))
+        output_parallel = adapt_parallel.generate(
+            input_signal, training_signal)
+        assert np.allclose(output, output_parallel, atol=1e-5)
+    # the serial and parallel updates flush the same small activities
+    assert np.allclose(adapt_parallel.engine.weights, adapt.engine.weights,
+                       atol=1e-6)
+    adapt_parallel.engine.close()
+
+
+@pytest.mark.parametrize('weights_dtype, sparse', [
+    ('float32', False), ('float32', True), ('int16', False),
+    ('int16', True)])
+def test_weights_dtype(weights_dtype, sparse):
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 500,
+              'n_ensembles': 2, 'seed': 0, 'pes_learning_rate': 1e-3,
+              'backend': 'numpy', 'sparse': sparse}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    adapt_low = signals.DynamicsAdaptation(
+        weights_dtype=weights_dtype, **kwargs)
+
+    rng = np.random.RandomState(0)
+    for ii in range(500):
+        input_signal = np.sin(ii / 50.0 + np.array([0, 1]))
+        training_signal = rng.randn(2)
+        output = np.copy(adapt.generate(input_signal, training_signal))
+        output_low = adapt_low.generate(input_signal, training_signal)
+        assert np.allclose(output, output_low,
+                           atol=1e-3 * np.max(np.abs(output)) + 1e-6)
+    weights = np.array(adapt.get_weights())
+    assert np.allclose(adapt_low.get_weights(), weights,
+                       atol=1e-3 * np.max(np.abs(weights)))
+
+    # weights are saved with the precision they are stored with
+    adapt_low.save_weights(test_name='low')
+    weights_file = adapt_low.load_weights(test_name='low')
+    saved = np.load(weights_file)
+    assert saved['weights'].dtype == weights_dtype
+    adapt_loaded = signals.DynamicsAdaptation(
+        weights_file=weights_file, **kwargs)
+    assert np.allclose(adapt_loaded.get_weights(), adapt_low.get_weights())
+
+
+def test_area_intercepts():
+    from abr_control.controllers.signals.dynamics_adaptation import (
+        AreaIntercepts, Triangular)
+    dist = AreaIntercepts(dimensions=4, base=Triangular(-0.9, -0.9, 0.0))
+    rng = np.random.RandomState(0)
+    intercepts = dist.sample(1000, rng=rng)
+    state = rng.randn()
+
+    # the same as transforming each sample on its own
+    base = Triangular(-0.9, -0.9, 0.0).sample(
+        1000, rng=np.random.RandomState(0))
+    assert np.allclose(intercepts, [dist.transform(x) for x in base])
+    assert np.allclose(dist.transform([0.3, -0.3]),
+                       [-dist.transform(-0.3), dist.transform(-0.3)])
+
+    # cached samples are copies, and leave the rng in the same state
+    intercepts[:] = 0
+    rng = np.random.RandomState(0)
+    assert np.allclose(dist.sample(1000, rng=rng),
+                       [dist.transform(x) for x in base])
+    assert rng.randn() == state
+
+
+def test_checkpoint_and_save_weights(tmp_path):
+    adapt = signals.DynamicsAdaptation(
+        n_input=2, n_output=2, n_neurons=100, n_ensembles=2, seed=0,
+        pes_learning_rate=1e-2, backend='numpy', cache_build=False)
+    saved = []
+    for ii in range(3):
+        for jj in range(20):
+            adapt.generate(np.sin(jj / 50.0 + np.array([0, 1])), np.ones(2))
+        saved.append(np.array(adapt.get_weights()))
+        if ii == 1:
+            adapt.save_weights(test_name='mixed')
+        else:
+            assert adapt.checkpoint(test_name='mixed') == ii
+    adapt.checkpoints.close()
+
+    # each save gets its own run, and all of them are in the index
+    folder = os.path.join(str(tmp_path), 'saved_weights', 'mixed')
+    assert sorted(os.listdir(os.path.join(folder, 'session0'))) == [
+        'run0.npy', 'run1.npz', 'run2.npy']
+    for ii in range(3):
+        weights_file = adapt.load_weights(test_name='mixed', run=ii)
+        assert os.path.isfile(weights_file)
+        assert np.allclose(
+            checkpoints.load_checkpoint(weights_file),
+            saved[ii])
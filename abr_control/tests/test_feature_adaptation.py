@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from abr_control.controllers.signals.feature_adaptation import (
+    FeatureAdaptation)
+
+
+@pytest.mark.parametrize('features, update, learning_rate', [
+    ('rff', 'nlms', .5), ('rbf', 'nlms', .5), ('rff', 'rls', 1.0),
+    ('rbf', 'rls', 1.0)])
+def test_learns_function(features, update, learning_rate):
+    adapt = FeatureAdaptation(
+        n_input=2, n_output=2, n_features=100, features=features,
+        update=update, learning_rate=learning_rate, seed=0)
+
+    def target(x):
+        return np.array([np.sin(2 * x[0]), x[0] * x[1]])
+
+    rng = np.random.RandomState(0)
+    errors = []
+    for ii in range(2000):
+        x = rng.uniform(-1, 1, 2)
+        # the training signal is the direction the output should change
+        output = np.dot(adapt.weights, adapt.transform(x))
+        error = target(x) - output
+        assert np.allclose(adapt.generate(x, error), output)
+        errors.append(np.sqrt(np.sum(error**2)))
+    assert np.mean(errors[-200:]) < .1
+    assert np.mean(errors[-200:]) < .5 * np.mean(errors[:200])
@@ -0,0 +1,77 @@
+import numpy as np
+
+from abr_control.arms import twojoint as arm
+from abr_control.controllers import ILQR
+
+
+def test_dynamics():
+    robot_config = arm.Config()
+    ctrl = ILQR(robot_config)
+
+    rng = np.random.RandomState(0)
+    q = rng.uniform(-np.pi, np.pi, (10, 2))
+    dq = rng.uniform(-2, 2, (10, 2))
+    M, h, dM, dhdq, dhddq = ctrl._dynamics(q, dq, derivatives=True)
+
+    for ii in range(q.shape[0]):
+        assert np.allclose(M[ii], robot_config.M(q[ii]))
+        assert np.allclose(
+            h[ii], np.dot(robot_config.C(q[ii], dq[ii]), dq[ii]) -
+            robot_config.g(q[ii]))
+
+    # central differences of M and h wrt each joint angle and velocity
+    eps = 1e-6
+    for kk in range(2):
+        step = np.zeros(2)
+        step[kk] = eps
+        M_plus, h_plus = ctrl._dynamics(q + step, dq)
+        M_minus, h_minus = ctrl._dynamics(q - step, dq)
+        assert np.allclose(dM[:, kk], (M_plus - M_minus) / (2 * eps),
+                           atol=1e-6)
+        assert np.allclose(dhdq[:, :, kk], (h_plus - h_minus) / (2 * eps),
+                           atol=1e-6)
+        _, h_plus = ctrl._dynamics(q, dq + step)
+        _, h_minus = ctrl._dynamics(q, dq - step)
+        assert np.allclose(dhddq[:, :, kk], (h_plus - h_minus) / (2 * eps),
+                           atol=1e-6)
+
+
+def test_linearize():
+    robot_config = arm.Config()
+    ctrl = ILQR(robot_config, horizon=10)
+
+    rng = np.random.RandomState(1)
+    X = np.hstack([rng.uniform(-np.pi, np.pi, (11, 2)),
+                   rng.uniform(-2, 2, (11, 2))])
+    U = rng.uniform(-5, 5, (10, 2))
+    A, B = ctrl._linearize(X, U)
+
+    # central differences of the discrete dynamics
+    eps = 1e-6
+    for kk in range(4):
+        step = np.zeros(4)
+        step[kk] = eps
+        dx = (ctrl._step(X[:-1] + step, U) -
+              ctrl._step(X[:-1] - step, U)) / (2 * eps)
+        assert np.allclose(A[:, :, kk], dx, atol=1e-6)
+    for kk in range(2):
+        step = np.zeros(2)
+        step[kk] = eps
+        dx = (ctrl._step(X[:-1], U + step) -
+              ctrl._step(X[:-1], U - step)) / (2 * eps)
+        assert np.allclose(B[:, :, kk], dx, atol=1e-6)
+
+
+def test_reach_target():
+    robot_config = arm.Config()
+    dt = 0.005
+    ctrl = ILQR(robot_config, horizon=50, dt=0.01, control_dt=dt)
+    arm_sim = arm.ArmSim(robot_config, dt=dt, q_init=np.array([0.5, 1.0]))
+    target = np.array([1.0, 1.5])
+
+    for ii in range(300):
+        u = ctrl.generate(arm_sim.q, arm_sim.dq, target)
+        arm_sim.send_forces(u)
+
+    assert np.allclose(arm_sim.q, target, atol=1e-2)
+    assert np.allclose(arm_sim.dq, 0, atol=5e-2)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+nengo = pytest.importorskip('nengo')
+
+from abr_control.controllers import signals  # noqa: E402
+
+
+def test_train():
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 100,
+              'n_ensembles': 2, 'seed': 0, 'pes_learning_rate': 1e-2,
+              'neuron_type': nengo.LIFRate(), 'backend': 'numpy'}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    trainer = signals.OfflineTrainer(
+        signals.DynamicsAdaptation(**kwargs), batch_size=70)
+
+    rng = np.random.RandomState(0)
+    input_signals = np.sin(np.arange(500)[:, None] / 50.0 + np.array([0, 1]))
+    training_signals = rng.randn(500, 2)
+    for input_signal, training_signal in zip(input_signals,
+                                             training_signals):
+        adapt.generate(input_signal, training_signal)
+    # online, the update from the last step is applied on the next step
+    adapt.generate(input_signals[-1], np.zeros(2))
+
+    weights = trainer.train(input_signals, training_signals)
+    assert np.allclose(weights, adapt.engine.weights, atol=1e-12)
+
+    # splitting the batches between processes gives the same weights
+    trainer.n_processes = 2
+    trainer.weights[...] = 0
+    assert np.allclose(trainer.train(input_signals, training_signals),
+                       adapt.engine.weights, atol=1e-12)
+
+
+def test_fit():
+    adapt = signals.DynamicsAdaptation(
+        n_input=2, n_output=2, n_neurons=200, n_ensembles=2, seed=0,
+        backend='numpy')
+    trainer = signals.OfflineTrainer(adapt, batch_size=300)
+
+    rng = np.random.RandomState(0)
+    input_signals = rng.uniform(-1, 1, (1000, 2))
+    targets = np.vstack([np.sin(input_signals[:, 0] * 2),
+                         input_signals[:, 0] * input_signals[:, 1]]).T
+    weights = trainer.fit(input_signals, targets, reg=.01)
+
+    activities = trainer.activities(input_signals)
+    output = np.einsum('eon,ten->to', weights, activities)
+    assert np.sqrt(np.mean((output - targets)**2)) < .05
@@ -0,0 +1,91 @@
+import numpy as np
+
+from abr_control.controllers import path_planners
+
+
+def test_linear():
+    state = np.array([0.0, 1.0, -2.0])
+    target = np.array([1.0, -1.0, 3.0])
+    n_timesteps = 200
+    dt = 0.001
+    path_planner = path_planners.Linear()
+    path_planner.generate_path(state, target, n_timesteps=n_timesteps,
+                               dt=dt)
+
+    # the trajectory built with a loop over each dimension
+    trajectory = np.zeros((n_timesteps, 6))
+    for ii in range(3):
+        trajectory[:, ii] = np.linspace(state[ii], target[ii], n_timesteps)
+        trajectory[:-1, ii + 3] = np.diff(trajectory[:, ii]) / dt
+    assert np.allclose(path_planner.trajectory, trajectory)
+    assert np.allclose(list(path_planner.stream()), trajectory)
+    assert np.allclose(path_planner.evaluate(0.05), trajectory[50])
+
+    for ii in range(n_timesteps + 5):
+        assert np.allclose(path_planner.next_target(),
+                           trajectory[min(ii, n_timesteps - 1)])
+
+    # a single time step stays at the start, as with np.linspace
+    path_planner.generate_path(state, target, n_timesteps=1, dt=dt)
+    assert np.allclose(path_planner.trajectory, [np.hstack([state, 0, 0, 0])])
+    for ii in range(3):
+        assert np.allclose(path_planner.next_target(),
+                           np.hstack([state, 0, 0, 0]))
+
+
+def test_second_order():
+    rng = np.random.RandomState(0)
+    for threshold, zeta in [(0.02, 2.0), (0.5, 2.0), (2.0, 2.0),
+                            (0.5, 0.05), (0.5, 0.3)]:
+        path_planner = path_planners.SecondOrder(
+            n_timesteps=1000, threshold=threshold, zeta=zeta)
+        state = rng.randn(6)
+        target = rng.randn(3)
+        path_planner.generate_path(state, target)
+
+        # the path found by stepping the filter one step at a time
+        trajectory = []
+        for ii in range(1000):
+            trajectory.append(np.copy(state))
+            state = path_planner.step(state, target, dt=path_planner.dt)
+        trajectory = np.array(trajectory)
+
+        # points are found without building the whole path
+        steps = rng.randint(1000, size=20)
+        assert np.allclose(path_planner.evaluate(steps * path_planner.dt),
+                           trajectory[steps], atol=1e-12)
+        assert np.allclose(path_planner.evaluate(0.1), trajectory[100])
+        assert np.allclose(list(path_planner.stream()), trajectory,
+                           atol=1e-12)
+        assert path_planner._trajectory is None
+        assert np.allclose(path_planner.trajectory, trajectory, atol=1e-12)
+
+
+def test_generate_paths(tmp_path):
+    rng = np.random.RandomState(0)
+    states = rng.randn(10, 6)
+    targets = rng.randn(10, 3)
+    for path_planner, kwargs in [
+            (path_planners.Linear(), {'n_timesteps': 100}),
+            (path_planners.SecondOrder(n_timesteps=100, zeta=0.3,
+                                       threshold=0.5), {})]:
+        if isinstance(path_planner, path_planners.Linear):
+            starts = states[:, :3]
+        else:
+            starts = states
+        paths = path_planner.generate_paths(starts, targets, **kwargs)
+        assert paths.shape == (10, 100, 6)
+        for start, target, path in zip(starts, targets, paths):
+            path_planner.generate_path(start, target, **kwargs)
+            assert np.allclose(path, path_planner.trajectory, atol=1e-12)
+
+        # written to file a few paths at a time
+        filename = str(tmp_path / 'paths' / 'paths.npy')
+        paths_file = path_planner.generate_paths(
+            starts, targets, filename=filename, batch_size=3, **kwargs)
+        assert np.allclose(np.load(filename), paths)
+        assert np.allclose(paths_file, paths)
+
+    # SecondOrder paths from positions start at rest
+    paths = path_planner.generate_paths(states[:, :3], targets)
+    assert np.allclose(paths[:, 0, 3:], 0)
@@ -0,0 +1,101 @@
+import threading
+import time
+
+import numpy as np
+
+from abr_control.utils.spike_publisher import SpikePublisher
+
+
+class FakeRedis():
+    """ Stands in for a Redis client, optionally slow or failing """
+    def __init__(self, delay=0, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.data = {}
+        self.n_requests = 0
+        self.lock = threading.Lock()
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline():
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+
+    def set(self, key, value):
+        self.commands.append(('set', key, value))
+
+    def lpush(self, key, *values):
+        self.commands.append(('lpush', key, values))
+
+    def ltrim(self, key, start, end):
+        self.commands.append(('ltrim', key, start, end))
+
+    def execute(self):
+        time.sleep(self.client.delay)
+        if self.client.fail:
+            raise ConnectionError('no server')
+        data = self.client.data
+        with self.client.lock:
+            self.client.n_requests += 1
+            for command in self.commands:
+                if command[0] == 'set':
+                    data[command[1]] = command[2]
+                elif command[0] == 'lpush':
+                    data[command[1]] = (list(reversed(command[2])) +
+                                        data.get(command[1], []))
+                else:
+                    data[command[1]] = data[command[1]][
+                        command[2]:command[3] + 1]
+
+
+def test_encoding():
+    rng = np.random.RandomState(0)
+    activity = rng.randn(50) * (rng.rand(50) > .7)
+    for encoding in ['bitset', 'indices']:
+        publisher = SpikePublisher(encoding=encoding)
+        message = publisher.encode(activity != 0)
+        assert np.array_equal(
+            SpikePublisher.decode(message, 50, encoding), activity != 0)
+    # the uint32 index of each neuron by default, as in earlier versions
+    assert SpikePublisher().encode(activity != 0) == np.flatnonzero(
+        activity).astype('uint32').tobytes()
+    # one bit per neuron
+    assert len(SpikePublisher(encoding='bitset').encode(activity != 0)) == 7
+
+
+def test_publish():
+    client = FakeRedis(delay=.01)
+    publisher = SpikePublisher(client=client, history=3, max_pending=5)
+    rng = np.random.RandomState(0)
+
+    start = time.time()
+    for ii in range(100):
+        activity = rng.rand(20) > .5
+        publisher.publish(activity)
+    # publishing never waits for the slow server
+    assert time.time() - start < .1
+    publisher.stop()
+
+    # samples are sent in batches, dropping any that fall behind
+    assert client.n_requests < 100
+    assert publisher.n_dropped > 0
+    assert publisher.n_published + publisher.n_dropped == 100
+    assert np.array_equal(
+        SpikePublisher.decode(client.data['spikes'], 20), activity)
+    assert len(client.data['spikes_history']) == 3
+    assert client.data['spikes_history'][0] == client.data['spikes']
+
+
+def test_server_errors():
+    client = FakeRedis(fail=True)
+    publisher = SpikePublisher(client=client, retry_time=.01)
+    for ii in range(10):
+        publisher.publish(np.ones(5))
+        time.sleep(.002)
+    publisher.stop()
+    assert publisher.n_published == 0
+    assert publisher.n_dropped == 10
+    assert publisher.n_errors > 0
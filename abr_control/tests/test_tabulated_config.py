@@ -0,0 +1,38 @@
+import numpy as np
+
+from abr_control.arms import twojoint as arm
+from abr_control.arms.tabulated_config import TabulatedConfig
+
+
+def test_interpolation():
+    robot_config = arm.Config()
+
+    for interpolation, tolerance in (('linear', 1e-2), ('cubic', 1e-3)):
+        tabulated = TabulatedConfig(
+            robot_config, resolution=64, interpolation=interpolation,
+            seed=0)
+
+        q_vals = np.random.RandomState(1).uniform(-np.pi, 3*np.pi, (50, 2))
+        for q in q_vals:
+            assert np.allclose(
+                tabulated.M(q), robot_config.M(q), atol=tolerance)
+            assert np.allclose(
+                tabulated.g(q), robot_config.g(q), atol=tolerance)
+            assert np.allclose(
+                tabulated.J('EE', q), robot_config.J('EE', q), atol=tolerance)
+            assert np.allclose(
+                tabulated.Tx('EE', q), robot_config.Tx('EE', q),
+                atol=tolerance)
+            # frames that aren't tabulated are passed through
+            assert np.allclose(
+                tabulated.Tx('joint1', q), robot_config.Tx('joint1', q))
+
+
+def test_error_bound():
+    robot_config = arm.Config()
+
+    tabulated = TabulatedConfig(
+        robot_config, resolution=16, error_bound=1e-3, seed=0)
+    assert tabulated.resolution > 16
+    assert max(tabulated.max_error.values()) <= 1e-3
+    assert tabulated.N_JOINTS == robot_config.N_JOINTS
@@ -0,0 +1,118 @@
+import numpy as np
+import pytest
+
+nengo = pytest.importorskip('nengo')
+
+from abr_control.controllers import signals  # noqa: E402
+
+
+def test_single_tile():
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_neurons': 100,
+              'n_ensembles': 2, 'seed': 0, 'pes_learning_rate': 1e-2,
+              'backend': 'numpy'}
+    adapt = signals.DynamicsAdaptation(**kwargs)
+    adapt_tiled = signals.TiledAdaptation(n_tiles=1, **kwargs)
+
+    rng = np.random.RandomState(0)
+    for ii in range(200):
+        input_signal = np.sin(ii / 50.0 + np.array([0, 1]))
+        training_signal = rng.randn(2)
+        output = np.copy(adapt.generate(input_signal, training_signal))
+        assert np.allclose(
+            adapt_tiled.generate(input_signal, training_signal), output,
+            atol=1e-12)
+    assert np.allclose(adapt_tiled.get_weights()[(0, 0)],
+                       adapt.get_weights())
+
+
+@pytest.mark.parametrize('overlap', [0.0, 0.2])
+def test_tiles(overlap):
+    adapt = signals.TiledAdaptation(
+        n_input=3, n_output=2, n_tiles=[4, 2], tile_dims=[0, 2],
+        overlap=overlap, n_neurons=50, seed=0, pes_learning_rate=1e-2)
+
+    adapt.generate([-0.9, 0.3, -0.8], np.ones(2))
+    assert adapt.active == [(0, 0)]
+    assert list(adapt.engines) == [(0, 0)]
+    # the corner of 4 tiles
+    adapt.generate([0.0, 0.3, 0.0], np.ones(2))
+    if overlap == 0:
+        assert adapt.active == [(2, 1)]
+    else:
+        assert adapt.active == [(1, 0), (1, 1), (2, 0), (2, 1)]
+        assert np.allclose(adapt.blend, 0.25)
+        # the tile and its shared bands span [-1, 1]
+        local = adapt.local_input([0.0, 0.3, 0.0], (1, 0))
+        assert np.allclose(local, [0.5 / 0.7, 0.3, 1 / 1.4])
+
+    rng = np.random.RandomState(0)
+    for ii in range(500):
+        x = rng.uniform(-1, 1, 3)
+        adapt.generate(x, rng.randn(2))
+        assert np.isclose(np.sum(adapt.blend), 1)
+        assert len(adapt.active) <= (4 if overlap > 0 else 1)
+    assert sorted(adapt.engines) == [
+        (ii, jj) for ii in range(4) for jj in range(2)]
+
+
+def test_tile_seeds():
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_tiles': 2, 'n_neurons': 50,
+              'seed': 0, 'pes_learning_rate': 1e-2, 'weights_dtype': 'int16'}
+    adapt = signals.TiledAdaptation(**kwargs)
+    adapt_same = signals.TiledAdaptation(**kwargs)
+
+    rng = np.random.RandomState(0)
+    for ii in range(200):
+        x = rng.uniform(-1, 1, 2)
+        training_signal = rng.randn(2)
+        assert np.allclose(adapt.generate(x, training_signal),
+                           adapt_same.generate(x, training_signal))
+    weights = adapt.get_weights()
+    weights_same = adapt_same.get_weights()
+    for tile in weights:
+        assert np.allclose(weights[tile], weights_same[tile])
+
+    # each tile rounds with its own random numbers
+    dither = [engine._dither for engine in adapt.engines.values()]
+    assert len(dither) == 4
+    assert not np.allclose(dither[0], dither[1])
+    # the random numbers are only allocated for int16 weights
+    kwargs['weights_dtype'] = 'float64'
+    adapt = signals.TiledAdaptation(**kwargs)
+    adapt.generate(np.zeros(2), np.ones(2))
+    assert not hasattr(adapt.engines[(1, 1)], '_dither')
+
+
+@pytest.mark.parametrize('sparse', [False, True])
+def test_reenter_tile(sparse):
+    adapt = signals.TiledAdaptation(
+        n_input=1, n_output=2, n_tiles=2, n_neurons=100, seed=0,
+        pes_learning_rate=1e-2, sparse=sparse)
+
+    for ii in range(50):
+        adapt.generate([-0.5 + 0.1 * np.sin(ii / 10.0)], np.ones(2))
+    for ii in range(10):
+        adapt.generate([0.5], np.ones(2))
+    weights = adapt.get_weights()[(0,)]
+    # the tile left behind doesn't apply the change from its last step
+    # when the input returns
+    adapt.generate([-0.5], np.zeros(2))
+    assert np.array_equal(adapt.get_weights()[(0,)], weights)
+
+
+def test_tile_workers():
+    kwargs = {'n_input': 2, 'n_output': 2, 'n_tiles': 2, 'n_neurons': 50,
+              'n_ensembles': 2, 'seed': 0, 'pes_learning_rate': 1e-2}
+    adapt = signals.TiledAdaptation(**kwargs)
+    adapt_parallel = signals.TiledAdaptation(n_workers=2, **kwargs)
+
+    rng = np.random.RandomState(0)
+    for ii in range(100):
+        x = rng.uniform(-1, 1, 2)
+        training_signal = rng.randn(2)
+        assert np.allclose(adapt.generate(x, training_signal),
+                           adapt_parallel.generate(x, training_signal),
+                           atol=1e-12)
+    assert all(engine.n_workers == 2
+               for engine in adapt_parallel.engines.values())
+    adapt_parallel.close()
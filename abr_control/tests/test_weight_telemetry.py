@@ -0,0 +1,35 @@
+import numpy as np
+
+from abr_control.utils.weight_telemetry import WeightTelemetry
+
+
+def test_weight_telemetry(tmp_path):
+    shape = (2, 3, 10)
+    filename = str(tmp_path / 'weights.npy')
+    telemetry = WeightTelemetry(shape, sample_every=10, buffer_size=4,
+                                filename=filename, spill_size=6)
+
+    rng = np.random.RandomState(0)
+    weights = np.zeros(shape)
+    samples = []
+    for ii in range(100):
+        weights += rng.randn(*shape) * .01
+        if telemetry.tick():
+            telemetry.record(weights)
+            samples.append(np.copy(weights))
+    samples = np.array(samples)
+    assert telemetry.n_samples == len(samples) == 10
+
+    # only the most recent samples are kept
+    assert np.allclose(telemetry.times, [.06, .07, .08, .09])
+    assert np.allclose(telemetry.weights, samples[-4:])
+    assert np.allclose(telemetry.norm, np.sqrt(
+        np.sum(samples[-4:]**2, axis=(2, 3))))
+    assert np.allclose(telemetry.change, np.sqrt(np.sum(
+        (samples[-4:] - samples[-5:-1])**2, axis=(1, 3))))
+
+    # the file wraps around once full
+    telemetry.flush()
+    spill = np.load(filename)
+    assert np.allclose(spill[:4], samples[6:])
+    assert np.allclose(spill[4:], samples[4:6])
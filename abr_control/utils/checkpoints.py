@@ -0,0 +1,373 @@
+import contextlib
+import glob
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import numpy as np
+
+import abr_control.utils.os_utils
+
+INDEX_FILE = 'index.json'
+LOCK_FILE = 'index.lock'
+DELTA_DTYPE = np.dtype([('index', 'int64'), ('value', 'float64')])
+# used in place of file locks where fcntl isn't available
+_index_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def index_lock(folder):
+    """ Holds a lock on the index of a test folder, so that runs saved
+    by other threads and processes can't be given the same run number
+
+    Parameters
+    ----------
+    folder : string
+        the test folder
+    """
+    abr_control.utils.os_utils.makedirs(folder)
+    if fcntl is None:
+        with _index_lock:
+            yield
+        return
+    with open(os.path.join(folder, LOCK_FILE), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def read_index(folder):
+    """ Returns the list of saved runs in the index of a test folder
+
+    Each run is a dictionary with the session and run number, the file
+    name relative to the test folder, the time it was saved, and for
+    delta checkpoints the run number of the checkpoint it changes.
+
+    If the folder has no index, it is built from the saved files found
+    in the session folders. It isn't written to file here, since the
+    index_lock may not be held, it is saved with the next add_to_index.
+
+    Parameters
+    ----------
+    folder : string
+        the test folder
+    """
+    filename = os.path.join(folder, INDEX_FILE)
+    if os.path.isfile(filename):
+        with open(filename) as f:
+            return json.load(f)['runs']
+
+    runs = []
+    pattern = re.compile(r'session(\d+)/run(\d+)(\.delta)?\.np[yz]$')
+    for path in sorted(glob.glob(os.path.join(folder, 'session*', 'run*'))):
+        relative = os.path.relpath(path, folder).replace(os.sep, '/')
+        match = pattern.match(relative)
+        if match is None or match.group(3) is not None:
+            # deltas can't be used without the index
+            continue
+        runs.append({'session': int(match.group(1)),
+                     'run': int(match.group(2)),
+                     'file': os.path.join(*relative.split('/')),
+                     'time': os.path.getmtime(path)})
+    return runs
+
+
+def add_to_index(folder, entry, runs=None):
+    """ Adds a saved run to the index of a test folder, should be called
+    with the index_lock held, after choosing the run number
+
+    Parameters
+    ----------
+    folder : string
+        the test folder
+    entry : dict
+        the saved run, see read_index
+    runs : list, optional (Default: None)
+        the runs already in the index, read from file while holding the
+        index_lock, if None they are read from file
+    """
+    if runs is None:
+        runs = read_index(folder)
+    runs = [run for run in runs
+            if (run['session'], run['run']) !=
+            (entry['session'], entry['run'])]
+    runs.append(entry)
+
+    abr_control.utils.os_utils.makedirs(folder)
+    filename = os.path.join(folder, INDEX_FILE)
+    # write to a temporary file and rename when done, so that
+    # the index is never left half written
+    with open(filename + '.tmp', 'w') as f:
+        json.dump({'runs': runs}, f)
+    os.rename(filename + '.tmp', filename)
+    return runs
+
+
+def latest_run(runs, session=None):
+    """ Returns the latest session and run number in an index,
+    the run is -1 if there are none
+
+    Parameters
+    ----------
+    runs : list
+        the saved runs, see read_index
+    session : int, optional (Default: None)
+        the session to look in, if None the highest numbered session
+    """
+    if session is None:
+        session = max([run['session'] for run in runs] or [0])
+    run_num = max([run['run'] for run in runs
+                   if run['session'] == session] or [-1])
+    return session, run_num
+
+
+def load_checkpoint(filename):
+    """ Loads saved weights from file
+
+    Supports the compressed .npz files written by
+    DynamicsAdaptation.save_weights, and the .npy checkpoints written by
+    CheckpointStore. Full .npy checkpoints are memory-mapped, so nothing
+    is read until it is used. int16 weights saved with their scale are
+    returned as float64.
+
+    Parameters
+    ----------
+    filename : string
+        the saved weights file
+    """
+    if filename.endswith('.npz'):
+        data = np.load(filename)
+        if 'scale' in data:
+            return data['weights'] * data['scale']
+        return data['weights']
+    if filename.endswith('.delta.npy'):
+        # deltas need the checkpoints before them, found in the index
+        session_folder, name = os.path.split(os.path.abspath(filename))
+        folder = os.path.dirname(session_folder)
+        relative = os.path.join(os.path.basename(session_folder), name)
+        for entry in read_index(folder):
+            if entry['file'] == relative:
+                return CheckpointStore(folder, entry['session']).load(
+                    entry['run'])
+        raise Exception('%s is not in the checkpoint index' % filename)
+    return np.load(filename, mmap_mode='r')
+
+
+class CheckpointStore():
+    """ Saves weights in a background thread, so that frequent
+    checkpoints don't delay the control loop
+
+    Checkpoints are saved as .npy files in
+    folder/session<session>/run<run>.npy, and listed in an index file in
+    the test folder, so the latest run can be found without searching
+    the folders. The weights are copied when save is called, and written
+    to file in the order they were saved.
+
+    The run number is chosen from the index on file when the checkpoint
+    is written, while holding the index_lock, so runs saved in the
+    meantime, such as by DynamicsAdaptation.save_weights or another
+    process, are never overwritten.
+
+    With deltas, only the weights that changed since the last checkpoint
+    are saved, as their flattened indices and new values, and a full
+    checkpoint is saved every full_every checkpoints. When learning only
+    changes the weights of some neurons, such as with sparse adaptation,
+    this is much smaller than saving all of the weights.
+
+    Parameters
+    ----------
+    folder : string
+        the test folder, such as cache_dir/saved_weights/test_name
+    session : int, optional (Default: None)
+        the session to save to, if None the highest numbered session
+        in the index, or 0 if there are none
+    deltas : boolean, optional (Default: False)
+        True to save only the weights that changed
+    full_every : int, optional (Default: 10)
+        with deltas, the number of checkpoints between full checkpoints,
+        which bounds the number of files read to load a checkpoint
+    """
+
+    def __init__(self, folder, session=None, deltas=False, full_every=10):
+        self.folder = folder
+        self.deltas = deltas
+        self.full_every = full_every
+
+        self._runs = read_index(folder)
+        self.session, self._last_run = latest_run(self._runs, session)
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._error = None
+        # the last weights written, and the number of deltas since the
+        # last full checkpoint
+        self._previous = None
+        self._previous_run = None
+        self._n_deltas = 0
+
+    @property
+    def runs(self):
+        """ The saved runs in this session, read from the index """
+        return [entry for entry in read_index(self.folder)
+                if entry['session'] == self.session]
+
+    def save(self, weights, run=None):
+        """ Copies the weights, and saves them in the background
+        Returns the run number they will be saved as, which is only
+        changed if another run is saved with that number before they
+        are written
+
+        Parameters
+        ----------
+        weights : np.array
+            the weights to save
+        run : int, optional (Default: None)
+            the run number to save as, if None one more than the last run
+        """
+        if self._error is not None:
+            raise Exception('Saving checkpoint failed: %s' % self._error)
+        fixed = run is not None
+        if run is None:
+            # runs saved since this store was created are in the index
+            latest = latest_run(read_index(self.folder), self.session)[1]
+            run = max(self._last_run, latest) + 1
+        self._last_run = max(self._last_run, run)
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run)
+            self._thread.daemon = True
+            self._thread.start()
+        self._queue.put((run, fixed, np.array(weights, dtype='float64')))
+        return run
+
+    def flush(self):
+        """ Waits until all saved checkpoints are written to file """
+        self._queue.join()
+        if self._error is not None:
+            raise Exception('Saving checkpoint failed: %s' % self._error)
+
+    def close(self):
+        """ Writes any remaining checkpoints and stops the thread """
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            raise Exception('Saving checkpoint failed: %s' % self._error)
+
+    def _run(self):
+        """ Writes checkpoints to file until closed """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                if self._error is None:
+                    self._write(*item)
+            except Exception as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _write(self, run, fixed, weights):
+        """ Writes a checkpoint, and adds it to the index
+
+        Parameters
+        ----------
+        run : int
+            the run number
+        fixed : boolean
+            False if the run number was chosen by save, in which case the
+            next free run number is used if it has been taken since
+        weights : np.array
+            the weights to save
+        """
+        with index_lock(self.folder):
+            self._runs = read_index(self.folder)
+            if not fixed:
+                latest = latest_run(self._runs, self.session)[1]
+                run = max(run, latest + 1)
+                self._last_run = max(self._last_run, run)
+            self._write_run(run, weights)
+
+    def _write_run(self, run, weights):
+        """ Writes a checkpoint while holding the index_lock
+
+        Parameters
+        ----------
+        run : int
+            the run number
+        weights : np.array
+            the weights to save
+        """
+        session_folder = 'session%i' % self.session
+        abr_control.utils.os_utils.makedirs(
+            os.path.join(self.folder, session_folder))
+        entry = {'session': self.session, 'run': run,
+                 'time': time.time(), 'shape': list(weights.shape)}
+
+        if (self.deltas and self._previous is not None and
+                self._previous.shape == weights.shape and
+                self._n_deltas + 1 < self.full_every):
+            changed = np.flatnonzero(weights != self._previous)
+            data = np.zeros(len(changed), dtype=DELTA_DTYPE)
+            data['index'] = changed
+            data['value'] = weights.reshape(-1)[changed]
+            entry['file'] = os.path.join(
+                session_folder, 'run%i.delta.npy' % run)
+            entry['base'] = self._previous_run
+            self._n_deltas += 1
+        else:
+            data = weights
+            entry['file'] = os.path.join(session_folder, 'run%i.npy' % run)
+            self._n_deltas = 0
+
+        filename = os.path.join(self.folder, entry['file'])
+        # write to a temporary file and rename when done, so that
+        # interrupted saves aren't loaded in later
+        np.save(filename + '.tmp.npy', data)
+        os.rename(filename + '.tmp.npy', filename)
+        self._runs = add_to_index(self.folder, entry, self._runs)
+        self._previous = weights
+        self._previous_run = run
+
+    def load(self, run=None, mmap=True):
+        """ Loads the weights saved in a checkpoint
+
+        Parameters
+        ----------
+        run : int, optional (Default: None)
+            the run number to load, if None the latest run
+        mmap : boolean, optional (Default: True)
+            True to memory-map full checkpoints instead of reading them,
+            checkpoints saved as deltas are always read
+        """
+        runs = dict((entry['run'], entry) for entry in self.runs)
+        if run is None:
+            run = max(runs) if runs else -1
+        if run not in runs:
+            raise Exception('No checkpoint saved for run %i of session %i'
+                            % (run, self.session))
+        entry = runs[run]
+        data = np.load(os.path.join(self.folder, entry['file']),
+                       mmap_mode='r' if mmap else None)
+        if 'base' not in entry:
+            return data
+
+        weights = np.array(self.load(entry['base'], mmap=True))
+        weights.reshape(-1)[data['index']] = data['value']
+        return weights
@@ -0,0 +1,128 @@
+import itertools
+
+import numpy as np
+
+
+class SpatialGrid():
+    """ A uniform grid over 3D space for finding nearby spheres quickly
+
+    Each sphere is stored in the cell containing its center. A query for
+    an axis aligned box looks in every occupied cell that could hold a
+    sphere overlapping the box, grown by the largest radius stored, and
+    returns those spheres as candidates. Candidates still need an exact
+    distance check, but most far away spheres are never looked at.
+
+    Spheres can be moved without rebuilding the grid, only the spheres
+    that change cell are touched.
+
+    Parameters
+    ----------
+    cell_size : float
+        the length of each side of a grid cell [meters], works best when
+        similar to the query distances used
+    """
+
+    def __init__(self, cell_size):
+        if cell_size <= 0:
+            raise Exception('Grid cell size must be positive')
+        self.cell_size = float(cell_size)
+        self.build(np.zeros((0, 3)), np.zeros(0))
+
+    def build(self, centers, radii):
+        """ Replaces the contents of the grid
+
+        Parameters
+        ----------
+        centers : np.array
+            the (x, y, z) center of each sphere [meters]
+        radii : np.array
+            the radius of each sphere [meters]
+        """
+        self.centers = np.array(centers, dtype='float').reshape(-1, 3)
+        self.radii = np.array(radii, dtype='float').reshape(-1)
+        self._cell_of = self._cell(self.centers)
+
+        self._cells = {}
+        if len(self.centers) > 0:
+            # group the sphere indices by cell
+            keys, inverse = np.unique(
+                self._cell_of, axis=0, return_inverse=True)
+            order = np.argsort(inverse.reshape(-1), kind='stable')
+            splits = np.cumsum(np.bincount(inverse.reshape(-1)))[:-1]
+            for key, indices in zip(keys, np.split(order, splits)):
+                self._cells[tuple(key)] = set(indices.tolist())
+        self._keys = None
+        self._max_radius = np.max(self.radii) if len(self.radii) else 0.0
+
+    def update(self, indices, centers, radii=None):
+        """ Moves some of the spheres already in the grid
+
+        Parameters
+        ----------
+        indices : list of ints
+            the index of each sphere to move
+        centers : np.array
+            the new (x, y, z) center of each sphere [meters]
+        radii : np.array, optional (Default: None)
+            the new radius of each sphere [meters], if None
+            the radii are unchanged
+        """
+        indices = np.asarray(indices, dtype=int).reshape(-1)
+        centers = np.asarray(centers, dtype='float').reshape(-1, 3)
+        self.centers[indices] = centers
+        if radii is not None:
+            self.radii[indices] = radii
+            self._max_radius = (np.max(self.radii) if len(self.radii)
+                                else 0.0)
+
+        cells = self._cell(centers)
+        moved = np.nonzero(
+            np.any(cells != self._cell_of[indices], axis=1))[0]
+        old_cells = self._cell_of[indices[moved]].tolist()
+        new_cells = cells[moved].tolist()
+        for index, old, new in zip(
+                indices[moved].tolist(), old_cells, new_cells):
+            old = tuple(old)
+            self._cells[old].discard(index)
+            if not self._cells[old]:
+                del self._cells[old]
+                self._keys = None
+            new = tuple(new)
+            if new not in self._cells:
+                self._cells[new] = set()
+                self._keys = None
+            self._cells[new].add(index)
+        self._cell_of[indices[moved]] = cells[moved]
+
+    def query(self, lower, upper):
+        """ Returns the indices of the spheres that may overlap a box
+
+        Parameters
+        ----------
+        lower : np.array
+            the (x, y, z) minimum corner of the box [meters]
+        upper : np.array
+            the (x, y, z) maximum corner of the box [meters]
+        """
+        if not self._cells:
+            return np.zeros(0, dtype=int)
+
+        lower = self._cell(np.asarray(lower) - self._max_radius)
+        upper = self._cell(np.asarray(upper) + self._max_radius)
+        if np.prod(upper - lower + 1) <= len(self._cells):
+            # fewer cells in the box than occupied cells, look each one up
+            cells = [self._cells.get(key, ()) for key in itertools.product(
+                *[range(lo, hi + 1) for lo, hi in zip(lower, upper)])]
+        else:
+            # check every occupied cell against the box
+            if self._keys is None:
+                self._key_list = list(self._cells)
+                self._keys = np.array(self._key_list)
+            inside = np.nonzero(np.all(
+                (self._keys >= lower) & (self._keys <= upper), axis=1))[0]
+            cells = [self._cells[self._key_list[ii]] for ii in inside]
+        # each sphere is in only one cell, so there are no duplicates
+        return np.array(sorted(itertools.chain(*cells)), dtype=int)
+
+    def _cell(self, points):
+        return np.floor(np.asarray(points) / self.cell_size).astype(int)
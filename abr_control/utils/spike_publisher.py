@@ -0,0 +1,222 @@
+import collections
+import struct
+import threading
+import time
+
+import numpy as np
+
+# connection pools shared by all publishers, by host, port, and database
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_connection_pool(host='127.0.0.1', port=6379, db=0):
+    """ Returns a Redis connection pool, shared with any other publisher
+    using the same server
+
+    Parameters
+    ----------
+    host : string, optional (Default: '127.0.0.1')
+        the Redis server address
+    port : int, optional (Default: 6379)
+        the Redis server port
+    db : int, optional (Default: 0)
+        the Redis database number
+    """
+    import redis
+    with _pools_lock:
+        key = (host, port, db)
+        if key not in _pools:
+            _pools[key] = redis.ConnectionPool(host=host, port=port, db=db)
+        return _pools[key]
+
+
+class SpikePublisher():
+    """ Sends neural activity to Redis for display without ever blocking
+    the control loop
+
+    publish only marks which neurons spiked and hands the sample to a
+    background thread, which is started, and connects to Redis, the first
+    time a sample is published. The thread sends all of the samples
+    waiting for it with a single pipelined request. If it falls behind,
+    for example when Redis is slow or not running, the oldest samples are
+    dropped instead of queuing up.
+
+    The key is set to the most recent sample. By default samples are
+    encoded as the uint32 index of each neuron that spiked, as in earlier
+    versions, so existing subscribers keep working. With
+    encoding='bitset' they are sent with one bit per neuron instead,
+    which is smaller when more than 1 in 32 neurons spike, and the
+    subscriber has to decode them with the same encoding, see decode.
+
+    Parameters
+    ----------
+    key : string, optional (Default: 'spikes')
+        the Redis key to set
+    host : string, optional (Default: '127.0.0.1')
+        the Redis server address
+    port : int, optional (Default: 6379)
+        the Redis server port
+    encoding : string, optional (Default: 'indices')
+        {'indices', 'bitset'} how the spikes are encoded
+    max_pending : int, optional (Default: 10)
+        the number of samples that can wait to be sent before the
+        oldest are dropped
+    history : int, optional (Default: 0)
+        if above 0, every sample sent is also pushed to the front of the
+        list key_history, which is trimmed to this length
+    retry_time : float, optional (Default: 1.0)
+        the time to wait before sending again after an error [seconds]
+    client : class instance, optional (Default: None)
+        the Redis client to use, with a pipeline function, if None one is
+        created using the shared connection pool for the server
+    """
+
+    def __init__(self, key='spikes', host='127.0.0.1', port=6379,
+                 encoding='indices', max_pending=10, history=0,
+                 retry_time=1.0, client=None):
+        if encoding not in ('bitset', 'indices'):
+            raise Exception('Invalid spike encoding %s' % encoding)
+
+        self.key = key
+        self.host = host
+        self.port = port
+        self.encoding = encoding
+        self.history = history
+        self.retry_time = retry_time
+        self.client = client
+
+        # appending to a full deque drops the oldest sample
+        self._pending = collections.deque(maxlen=max_pending)
+        # held while checking for and taking samples from _pending, so
+        # that a sample taken by the thread isn't counted as dropped
+        self._pending_lock = threading.Lock()
+        self._new_sample = threading.Event()
+        self._running = False
+        self._thread = None
+
+        self.n_published = 0
+        self.n_errors = 0
+        self.last_error = None
+        # counted separately by the control loop and the thread,
+        # so that neither overwrites the other
+        self._n_overflowed = 0
+        self._n_failed = 0
+
+    @property
+    def n_dropped(self):
+        """ The number of samples that were not sent """
+        return self._n_overflowed + self._n_failed
+
+    def publish(self, activity):
+        """ Queues the neurons that spiked to be sent
+
+        Parameters
+        ----------
+        activity : np.array
+            the activity of each neuron, non-zero if it spiked
+        """
+        spiked = np.asarray(activity) != 0
+        with self._pending_lock:
+            if len(self._pending) == self._pending.maxlen:
+                self._n_overflowed += 1
+            self._pending.append(spiked)
+        if self._thread is None:
+            self.start()
+        self._new_sample.set()
+
+    def encode(self, spiked):
+        """ Returns the message sent for a sample
+
+        Parameters
+        ----------
+        spiked : np.array
+            boolean array, True for each neuron that spiked
+        """
+        if self.encoding == 'bitset':
+            return np.packbits(spiked).tobytes()
+        index = np.flatnonzero(spiked)
+        return struct.pack('%dI' % len(index), *index)
+
+    @staticmethod
+    def decode(message, n_neurons, encoding='indices'):
+        """ Returns the boolean array of which neurons spiked in a message
+
+        Parameters
+        ----------
+        message : bytes
+            the message read from Redis
+        n_neurons : int
+            the number of neurons
+        encoding : string, optional (Default: 'indices')
+            {'indices', 'bitset'} how the spikes were encoded
+        """
+        spiked = np.zeros(n_neurons, dtype=bool)
+        if encoding == 'bitset':
+            bits = np.unpackbits(np.frombuffer(message, dtype=np.uint8))
+            spiked[:] = bits[:n_neurons]
+        else:
+            spiked[np.frombuffer(message, dtype='uint32')] = True
+        return spiked
+
+    def start(self):
+        """ Starts the background thread """
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Sends any waiting samples and stops the background thread """
+        self._running = False
+        self._new_sample.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        """ Sends samples until stopped """
+        while True:
+            self._new_sample.wait()
+            self._new_sample.clear()
+            with self._pending_lock:
+                samples = list(self._pending)
+                self._pending.clear()
+            if samples:
+                self._send(samples)
+            if not self._running and not self._pending:
+                return
+
+    def _send(self, samples):
+        """ Sends samples with a single pipelined request, dropping them
+        if the request fails
+
+        Parameters
+        ----------
+        samples : list of np.array
+            the samples, oldest first
+        """
+        try:
+            if self.client is None:
+                import redis
+                self.client = redis.StrictRedis(
+                    connection_pool=get_connection_pool(
+                        self.host, self.port))
+            messages = [self.encode(spiked) for spiked in samples]
+            pipe = self.client.pipeline(transaction=False)
+            pipe.set(self.key, messages[-1])
+            if self.history > 0:
+                history_key = '%s_history' % self.key
+                pipe.lpush(history_key, *messages)
+                pipe.ltrim(history_key, 0, self.history - 1)
+            pipe.execute()
+            self.n_published += len(samples)
+        except Exception as e:
+            # visualization is not worth stopping the controller for
+            self.n_errors += 1
+            self._n_failed += len(samples)
+            self.last_error = e
+            if self._running:
+                time.sleep(self.retry_time)
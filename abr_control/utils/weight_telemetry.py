@@ -0,0 +1,141 @@
+import os
+
+import numpy as np
+
+import abr_control.utils.os_utils
+
+
+class WeightTelemetry():
+    """ Records learned weights with a fixed memory footprint
+
+    The weights are sampled once every sample_every steps. The most
+    recent buffer_size samples are kept in a ring buffer, along with
+    summary statistics: the norm of the weights of each ensemble, and how
+    much the weights of each output (i.e. each joint) changed since the
+    previous sample. Optionally every sample is also written to a
+    memory-mapped file, which holds the most recent spill_size samples.
+
+    Parameters
+    ----------
+    shape : tuple of ints
+        the (n_ensembles, n_output, n_neurons) shape of the weights
+    sample_every : int, optional (Default: 100)
+        the number of steps between samples
+    buffer_size : int, optional (Default: 100)
+        the number of samples kept in memory
+    store_weights : boolean, optional (Default: True)
+        True to keep the weights of each sample, False to only keep
+        the summary statistics
+    filename : string, optional (Default: None)
+        .npy file to write every sample of the weights to
+    spill_size : int, optional (Default: 10000)
+        the number of samples stored in the file, once full the
+        oldest samples are overwritten
+    dt : float, optional (Default: 0.001)
+        the time step of the control loop [seconds]
+    """
+
+    def __init__(self, shape, sample_every=100, buffer_size=100,
+                 store_weights=True, filename=None, spill_size=10000,
+                 dt=0.001):
+        self.shape = tuple(shape)
+        self.sample_every = sample_every
+        self.buffer_size = buffer_size
+        self.dt = dt
+
+        n_ensembles, n_output = self.shape[:2]
+        self._times = np.zeros(buffer_size)
+        self._norm = np.zeros((buffer_size, n_ensembles))
+        self._change = np.zeros((buffer_size, n_output))
+        self._weights = (np.zeros((buffer_size,) + self.shape)
+                         if store_weights else None)
+        self._previous = None
+        self.n_steps = 0
+        self.n_samples = 0
+
+        self.spill = None
+        if filename is not None:
+            folder = os.path.dirname(filename)
+            if folder:
+                abr_control.utils.os_utils.makedirs(folder)
+            self.spill = np.lib.format.open_memmap(
+                filename, mode='w+', dtype='float32',
+                shape=(spill_size,) + self.shape)
+            self._spill_times = np.lib.format.open_memmap(
+                filename[:-4] + '_times.npy', mode='w+', dtype='float64',
+                shape=(spill_size,))
+            self._spill_times[:] = np.nan
+
+    def tick(self):
+        """ Counts a step, returns True if the weights should be
+        sampled on this step """
+        self.n_steps += 1
+        return (self.n_steps - 1) % self.sample_every == 0
+
+    def record(self, weights):
+        """ Stores a sample of the weights, and their statistics
+
+        Parameters
+        ----------
+        weights : np.array
+            the (n_ensembles, n_output, n_neurons) weights
+        """
+        weights = np.asarray(weights).reshape(self.shape)
+        index = self.n_samples % self.buffer_size
+        t = (self.n_steps - 1) * self.dt
+
+        self._times[index] = t
+        self._norm[index] = np.sqrt(np.sum(weights**2, axis=(1, 2)))
+        if self._previous is None:
+            self._previous = np.array(weights)
+            self._change[index] = 0
+        else:
+            self._previous -= weights
+            self._change[index] = np.sqrt(np.sum(
+                self._previous**2, axis=(0, 2)))
+            self._previous[...] = weights
+        if self._weights is not None:
+            self._weights[index] = weights
+
+        if self.spill is not None:
+            spill_index = self.n_samples % len(self.spill)
+            self.spill[spill_index] = weights
+            self._spill_times[spill_index] = t
+
+        self.n_samples += 1
+
+    def _ordered(self, data):
+        """ Returns the samples in a ring buffer, oldest first """
+        if self.n_samples <= self.buffer_size:
+            return data[:self.n_samples]
+        index = self.n_samples % self.buffer_size
+        return np.concatenate([data[index:], data[:index]])
+
+    @property
+    def times(self):
+        """ The time of each sample kept [seconds] """
+        return self._ordered(self._times)
+
+    @property
+    def norm(self):
+        """ The norm of the weights of each ensemble, for each sample """
+        return self._ordered(self._norm)
+
+    @property
+    def change(self):
+        """ The norm of the change in the weights of each output since the
+        previous sample, summed over the ensembles, for each sample """
+        return self._ordered(self._change)
+
+    @property
+    def weights(self):
+        """ The weights of each sample kept, None if not stored """
+        if self._weights is None:
+            return None
+        return self._ordered(self._weights)
+
+    def flush(self):
+        """ Writes the samples in the memory-mapped file to disk """
+        if self.spill is not None:
+            self.spill.flush()
+            self._spill_times.flush()